@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fuelapp.metrics.server_timing_middleware',
+    'fuelapp.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -153,14 +155,72 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'fuelapp.renderers.TimedJSONRenderer',
     )
 }
 
 GEOCODING_RETRIES = 3
+NOMINATIM_ENDPOINT = "https://nominatim.openstreetmap.org"
+NOMINATIM_USER_AGENT = "fuel_planner"
+GEOCODE_LRU_SIZE = 10000  # in-memory geocodes per worker, warmed from GeocodedLocation
 OSRM_ENDPOINT = "http://router.project-osrm.org"
+# Tried in order until one returns a route: 'osrm', 'local' (ROAD_GRAPH_FILE) or a dotted RoutingBackend path
+ROUTING_BACKENDS = ['osrm', 'local']
+# Road graph written by `manage.py build_road_graph`, used by the 'local' routing backend
+ROAD_GRAPH_FILE = os.environ.get('ROAD_GRAPH_FILE')
+UPSTREAM_THREADS = 8  # thread pool used to overlap geocoding/routing calls under WSGI
+UPSTREAM_STALE_TIMEOUT = 7 * 86400  # how long a last-known-good upstream answer may be served
+# Furthest a request may be from a cached route's endpoints to reuse it; cache keys round coordinates
+# to the finest grid with cells at least this tall (0.25 miles -> 2 decimal places), see key_precision
+ROUTE_CACHE_TOLERANCE_MILES = 0.25
+ROUTE_CACHE_REVERSE = False  # answer B -> A from a cached A -> B route (ignores one-way streets and ramps)
+ROUTE_CACHE_SUBPATHS = False  # answer trips between two points on a recently computed route
+ROUTE_CACHE_SUBPATH_ROUTES = 100  # recent routes per worker searched for sub-paths
+ROUTE_LEASE_TIMEOUT = 20  # seconds a worker waits for another worker computing the same route
+UPSTREAMS = {
+    'osrm': {
+        'timeout': (3.05, 10),  # (connect, read) seconds
+        'retries': 2,
+        'pool_size': 20,
+        'failure_threshold': 5,
+        'reset_timeout': 30,
+    },
+    'nominatim': {
+        'timeout': (3.05, 5),
+        'retries': GEOCODING_RETRIES,
+        'pool_size': 10,
+        'failure_threshold': 5,
+        'reset_timeout': 60,
+        'headers': {'User-Agent': NOMINATIM_USER_AGENT},
+        'min_interval': 1.0,  # seconds between requests; the public Nominatim policy allows 1/s
+    },
+}
 MAX_FUEL_RANGE = 500  # miles
 FUEL_ECONOMY = 10  # mpg
+ROUTE_SIMPLIFY_TOLERANCE_MILES = 0.25  # max deviation of the simplified route used for corridor search
+BATCH_MAX_LANES = 500  # origin/destination pairs accepted by /api/route/batch/
+# Places a batch may send to Nominatim; at its 1 request/s limit more would outlast gunicorn's 30 s timeout
+BATCH_MAX_NEW_PLACES = 20
+
+# Cheapest corridor stations measured per route; 0 disables. Each table request carries two points per
+# station, so this is capped at 50 to stay within OSRM's default limit of 100 points per table
+DETOUR_CANDIDATES = 50
+DETOUR_COST_PER_HOUR = 30.0  # driver time in dollars, added to the detour's fuel in the effective price
+DETOUR_CACHE_TIMEOUT = 24 * 60 * 60  # detours depend only on the route and the station data version
+
+ROUTE_POLYLINE_PRECISION = 5  # decimal places of compact route polylines (5 is about 1 m)
+COMPRESS_MIN_BYTES = 200  # JSON responses smaller than this are sent uncompressed
+BROTLI_QUALITY = 5  # per-response brotli level; the prebuilt station snapshot uses 11
+
+PLACE_INDEX_MAX_AGE = 300  # seconds before the autocomplete index is rebuilt to pick up new geocodes
+
+METRICS_FLUSH_INTERVAL = 5  # seconds between per-worker metric snapshots read by /api/metrics/
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # bearer token for /api/metrics/; otherwise staff only
+
+# Per-process station data (index version stamp, snapshots) written by import_fuel_prices
+STATION_DATA_DIR = os.path.join(BASE_DIR, 'station_data')
+# Offline city/state gazetteer import_fuel_prices uses to place stations, e.g. the Census Gaz_places file
+STATION_GAZETTEER_FILE = os.environ.get('STATION_GAZETTEER_FILE')
 
 CACHES = {
     'default': {
@@ -184,7 +244,4 @@ SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
 
 # Add whitenoise settings
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-
-# OSRM Server Configuration
-OSRM_SERVER = "http://router.project-osrm.org"
\ No newline at end of file
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
\ No newline at end of file
@@ -42,6 +42,8 @@ CORS_ORIGIN_ALLOW_ALL = True
 
 # Development-specific middleware
 MIDDLEWARE = [
+    'fuelapp.metrics.server_timing_middleware',
+    'fuelapp.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import FuelStation, Route, FuelStop
+from .models import FuelStation, Route, FuelStop, GeocodedLocation, FuelPriceHistory, StatePriceDaily
 
 @admin.register(FuelStation)
 class FuelStationAdmin(admin.ModelAdmin):
@@ -14,3 +14,18 @@ class RouteAdmin(admin.ModelAdmin):
 @admin.register(FuelStop)
 class FuelStopAdmin(admin.ModelAdmin):
     list_display = ('route', 'fuel_station', 'stop_number', 'cost')
+
+@admin.register(GeocodedLocation)
+class GeocodedLocationAdmin(admin.ModelAdmin):
+    list_display = ('query_key', 'latitude', 'longitude', 'created_at')
+    search_fields = ('query_key', 'display_name')
+
+@admin.register(FuelPriceHistory)
+class FuelPriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ('station', 'price', 'effective_at')
+    raw_id_fields = ('station',)
+
+@admin.register(StatePriceDaily)
+class StatePriceDailyAdmin(admin.ModelAdmin):
+    list_display = ('state', 'date', 'station_count', 'price_min', 'price_max')
+    list_filter = ('state',)
@@ -0,0 +1,177 @@
+import functools
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+
+from .gazetteer import load_gazetteer
+from .models import FuelStation, GeocodedLocation
+from .utils import STATE_CODES, US_STATES, get_station_data_version, normalize_location
+
+logger = logging.getLogger(__name__)
+
+
+def fold(text):
+    """Lowercase words without punctuation: the form both keys and typed prefixes are compared in."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+# State names and codes in sorted order, so a partly typed state is matched by prefix like a place
+STATE_SEARCH = sorted({(name, code.lower()) for name, code in US_STATES.items()}
+                      | {(code.lower(), code.lower()) for code in US_STATES.values()})
+STATE_SEARCH_KEYS = [entry[0] for entry in STATE_SEARCH]
+STATE_PREFIX_MIN = 3  # letters of a bare state name before it lists that state's places
+
+
+def _prefix_range(search, prefix):
+    lo = bisect_left(search, prefix)
+    return lo, bisect_left(search, prefix + '\uffff', lo)
+
+
+def matching_states(prefix):
+    """Postal codes (lowercase) of the states whose name or code starts with ``prefix``."""
+    return {code for _, code in STATE_SEARCH[slice(*_prefix_range(STATE_SEARCH_KEYS, prefix))]}
+
+
+def place_label(key):
+    """Display form of a ``normalize_location`` key: "oklahoma city, ok" -> "Oklahoma City, OK"."""
+    parts = key.split(", ")
+    return ", ".join(part.upper() if part in STATE_CODES and i else part.title() for i, part in enumerate(parts))
+
+
+class PlaceIndex:
+    """Sorted array of place names answering prefix queries with ``bisect``.
+
+    Places are the distinct city/state pairs of the station table plus the
+    entries of ``STATION_GAZETTEER_FILE``. Other geocodes are never offered,
+    since their keys are users' free-text queries. Matches are ranked by how
+    many stations the place has; coordinates come from the gazetteer or the
+    geocode cache, so a picked suggestion can skip geocoding.
+    """
+
+    def __init__(self, version, places):
+        # places: {key: [stations, latitude, longitude]}
+        self.version = version
+        self.built_at = time.monotonic()
+        entries = sorted((fold(key), key, *values) for key, values in places.items())
+        self.search = [entry[0] for entry in entries]
+        self.keys = [entry[1] for entry in entries]
+        self.stations = np.array([entry[2] for entry in entries], dtype=np.int64)
+        self.coordinates = [(entry[3], entry[4]) for entry in entries]
+
+        # The same places ordered by "state city", for a state typed on its own
+        by_state = sorted(
+            (f"{key.rsplit(', ', 1)[1]} {search}", i) for i, (search, key) in enumerate(zip(self.search, self.keys))
+            if ', ' in key and key.rsplit(', ', 1)[1] in STATE_CODES
+        )
+        self.state_search = [entry[0] for entry in by_state]
+        self.state_positions = np.array([entry[1] for entry in by_state], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_database(cls, version):
+        places = {}
+        for city, state, count in FuelStation.objects.values_list('city', 'state').annotate(count=Count('id')):
+            key = normalize_location(f"{city}, {state}")
+            if key:
+                places.setdefault(key, [0, None, None])[0] += count
+        for key, (latitude, longitude) in _gazetteer(settings.STATION_GAZETTEER_FILE).items():
+            places.setdefault(key, [0, None, None])[1:] = [latitude, longitude]
+
+        # Geocodes only fill in coordinates of places already listed
+        missing = [key for key, values in places.items() if values[1] is None]
+        for start in range(0, len(missing), 500):
+            rows = GeocodedLocation.objects.filter(query_key__in=missing[start:start + 500]).values_list(
+                'query_key', 'latitude', 'longitude'
+            )
+            for key, latitude, longitude in rows:
+                places[key][1:] = [latitude, longitude]
+        return cls(version, places)
+
+    def suggest(self, text, limit=10):
+        """Places starting with ``text``, most stations first, as dicts for the API.
+
+        A partly typed state also matches: "Austin, Tex" finds "Austin, TX",
+        and a bare "Calif" lists places in California.
+        """
+        # "tulsa, oklahoma" only prefixes its key once the state is normalized
+        prefixes = {fold(text), fold(normalize_location(text))} - {''}
+        if not prefixes:
+            return []
+        head, comma, tail = text.rpartition(',')
+        tail = fold(tail)
+        states = matching_states(tail) if tail and (comma or len(tail) >= STATE_PREFIX_MIN) else set()
+        if comma and fold(head):
+            prefixes |= {f"{fold(head)} {code}" for code in states}
+
+        ranges = [np.arange(*_prefix_range(self.search, prefix)) for prefix in prefixes]
+        if not comma:
+            ranges += [self.state_positions[slice(*_prefix_range(self.state_search, f"{code} "))] for code in states]
+        matches = np.unique(np.concatenate(ranges))
+        # Most stations first, then alphabetical
+        matches = matches[np.lexsort((matches, -self.stations[matches]))][:limit]
+
+        results = []
+        for i in matches.tolist():
+            latitude, longitude = self.coordinates[i]
+            results.append({
+                'label': place_label(self.keys[i]),
+                'query': self.keys[i],
+                'stations': int(self.stations[i]),
+                'latitude': latitude,
+                'longitude': longitude,
+            })
+        return results
+
+
+@functools.lru_cache(maxsize=1)
+def _gazetteer(path):
+    """``load_gazetteer`` once per process; an unreadable file only costs the extra places."""
+    if not path:
+        return {}
+    try:
+        return load_gazetteer(path)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load gazetteer {path} for autocomplete: {str(e)}")
+        return {}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_place_index():
+    """Return the process-wide place index.
+
+    It is rebuilt when the station data version changes, and every
+    ``PLACE_INDEX_MAX_AGE`` seconds to pick up new geocodes; during an
+    age-based rebuild other threads keep answering from the old index.
+    """
+    global _index
+    version = get_station_data_version()
+    index = _index
+    if index is not None and index.version == version:
+        if time.monotonic() - index.built_at < settings.PLACE_INDEX_MAX_AGE:
+            return index
+        # Only old: one thread rebuilds while the rest keep answering
+        if not _index_lock.acquire(blocking=False):
+            return index
+        try:
+            if _index is index:
+                _index = PlaceIndex.from_database(version)
+            return _index
+        finally:
+            _index_lock.release()
+
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = PlaceIndex.from_database(version)
+            logger.info(f"Built place index with {len(_index)} places (version {version})")
+        return _index
@@ -0,0 +1,298 @@
+"""Synthetic data, stub upstreams and stage timers for ``manage.py benchmark``."""
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from .geometry import EARTH_RADIUS_MILES
+from .views import RoutePlannerView
+
+# Continental US bounding box used for synthetic cities
+CONUS = {'south': 25.0, 'north': 49.0, 'west': -124.5, 'east': -67.0}
+
+# Benchmark lanes, from a short hop to coast to coast
+PLACES = {
+    'Tulsa, OK': (36.154, -95.993),
+    'Oklahoma City, OK': (35.468, -97.516),
+    'Dallas, TX': (32.777, -96.797),
+    'Kansas City, MO': (39.100, -94.578),
+    'Chicago, IL': (41.878, -87.630),
+    'Denver, CO': (39.739, -104.990),
+    'Los Angeles, CA': (34.052, -118.244),
+    'New York, NY': (40.713, -74.006),
+}
+ROUTES = {
+    'short': ('Tulsa, OK', 'Oklahoma City, OK'),
+    'regional': ('Dallas, TX', 'Kansas City, MO'),
+    'long': ('Chicago, IL', 'Denver, CO'),
+    'coast_to_coast': ('Los Angeles, CA', 'New York, NY'),
+}
+
+
+class StageTimer:
+    """Collects wall-clock samples per named stage."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append((time.perf_counter() - started) * 1000)
+
+    def add(self, name, milliseconds):
+        self.samples[name].append(milliseconds)
+
+    def summary(self):
+        return {name: summarize(values) for name, values in self.samples.items()}
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        'runs': int(len(values)),
+        'median_ms': round(float(np.median(values)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'min_ms': round(float(values.min()), 3),
+    }
+
+
+def route_geometry(start, end, spacing_miles=0.1, seed=0):
+    """A road-like polyline between two ``(lat, lon)`` points.
+
+    Vertices are ``spacing_miles`` apart (OSRM's full overview is similarly
+    dense) and the line meanders a little so it is not a straight segment.
+    """
+    (lat1, lon1), (lat2, lon2) = start, end
+    mean_lat = math.radians((lat1 + lat2) / 2)
+    straight = EARTH_RADIUS_MILES * math.radians(math.hypot(lat2 - lat1, (lon2 - lon1) * math.cos(mean_lat)))
+    n = max(int(straight / spacing_miles), 2)
+    t = np.linspace(0, 1, n)
+    rng = np.random.default_rng(seed)
+    wiggle = 0.15 * np.sin(t * math.pi * rng.uniform(4, 12)) * np.sin(t * math.pi)
+    lats = lat1 + (lat2 - lat1) * t + wiggle
+    lons = lon1 + (lon2 - lon1) * t - wiggle
+    return lats, lons
+
+
+def path_miles(lats, lons):
+    lat = np.radians(lats)
+    dlat = np.diff(lat)
+    dlon = np.diff(np.radians(lons))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    return float(np.sum(2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))))
+
+
+class StubUpstreams:
+    """Local Nominatim ``/search`` and OSRM ``/route`` (and ``/table``) server.
+
+    ``latency`` seconds are added to every response to model network time.
+    """
+
+    def __init__(self, places=PLACES, latency=0.0, spacing_miles=0.1):
+        self.places = {name.lower(): point for name, point in places.items()}
+        self.latency = latency
+        self.spacing_miles = spacing_miles
+        self.calls = defaultdict(int)
+        self.server = None
+
+    def handle(self, path, query):
+        if path == '/search':
+            self.calls['search'] += 1
+            point = self.places.get(query.get('q', [''])[0].lower())
+            if point is None:
+                return []
+            return [{'lat': str(point[0]), 'lon': str(point[1]), 'display_name': query['q'][0]}]
+
+        if path.startswith('/route/v1/driving/'):
+            self.calls['route'] += 1
+            (lon1, lat1), (lon2, lat2) = [map(float, p.split(',')) for p in path.rsplit('/', 1)[1].split(';')]
+            lats, lons = route_geometry((lat1, lon1), (lat2, lon2), self.spacing_miles)
+            meters = path_miles(lats, lons) * 1609.34
+            return {
+                'code': 'Ok',
+                'routes': [{
+                    'geometry': {'type': 'LineString', 'coordinates': np.column_stack([lons, lats]).tolist()},
+                    'distance': meters,
+                    'duration': meters / 26.8,
+                }],
+                'waypoints': [{'location': [lon1, lat1]}, {'location': [lon2, lat2]}],
+            }
+
+        if path.startswith('/table/v1/driving/'):
+            self.calls['table'] += 1
+            points = np.array([list(map(float, p.split(','))) for p in path.rsplit('/', 1)[1].split(';')])
+            everyone = ';'.join(map(str, range(len(points))))
+            sources = [int(i) for i in query.get('sources', [everyone])[0].split(';')]
+            destinations = [int(i) for i in query.get('destinations', [everyone])[0].split(';')]
+            lon, lat = np.radians(points[:, 0]), np.radians(points[:, 1])
+            src, dst = np.array(sources)[:, None], np.array(destinations)[None, :]
+            a = (np.sin((lat[dst] - lat[src]) / 2) ** 2
+                 + np.cos(lat[src]) * np.cos(lat[dst]) * np.sin((lon[dst] - lon[src]) / 2) ** 2)
+            meters = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a)) * 1609.34 * 1.25
+            return {'code': 'Ok', 'distances': meters.tolist(), 'durations': (meters / 26.8).tolist()}
+
+        return None
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                url = urlsplit(self.path)
+                body = stub.handle(url.path, parse_qs(url.query))
+                data = json.dumps(body).encode() if body is not None else b''
+                self.send_response(200 if body is not None else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def synthetic_feed(path, stations, duplicates=0.2, seed=0, state_centroids=None):
+    """Write an OPIS-style price CSV and a matching gazetteer; returns the gazetteer path.
+
+    Stations sit in synthetic cities spread uniformly over the continental
+    US, each city assigned to the state with the nearest centroid.
+    ``duplicates`` is the share of extra rows repeating an OPIS ID with a
+    different price, as in the real feed.
+    """
+    rng = np.random.default_rng(seed)
+    n_cities = max(500, stations // 20)
+    city_lat = rng.uniform(CONUS['south'], CONUS['north'], n_cities)
+    city_lon = rng.uniform(CONUS['west'], CONUS['east'], n_cities)
+    codes = list(state_centroids)
+    centroids = np.array([state_centroids[code] for code in codes])
+    nearest_state = np.argmin(
+        (city_lat[:, None] - centroids[None, :, 0]) ** 2 + (city_lon[:, None] - centroids[None, :, 1]) ** 2,
+        axis=1
+    )
+    city_names = np.array([f"Benchville {i}" for i in range(n_cities)])
+    city_states = np.array(codes)[nearest_state]
+
+    gazetteer_path = f"{path}.gazetteer.csv"
+    pd.DataFrame({
+        'city': city_names, 'state': city_states, 'latitude': city_lat.round(6), 'longitude': city_lon.round(6)
+    }).to_csv(gazetteer_path, index=False)
+
+    opis = np.arange(1, stations + 1)
+    extra = rng.choice(opis, int(stations * duplicates))
+    opis = np.concatenate([opis, extra])
+    city = rng.integers(0, n_cities, stations)
+    city = np.concatenate([city, city[extra - 1]])
+    pd.DataFrame({
+        'OPIS Truckstop ID': opis,
+        'Truckstop Name': [f"BENCH STOP #{i}" for i in opis],
+        'Address': [f"I-{10 + i % 90}, EXIT {i % 400}" for i in opis],
+        'City': city_names[city],
+        'State': city_states[city],
+        'Rack ID': rng.integers(1, 1000, len(opis)),
+        'Retail Price': rng.uniform(2.8, 5.2, len(opis)).round(8),
+    }).to_csv(path, index=False)
+    return gazetteer_path
+
+
+class TimedRoutePlannerView(RoutePlannerView):
+    """``RoutePlannerView`` that reports each pipeline stage to ``timer``."""
+
+    timer = None
+
+    def geocode_endpoints(self, start, end, start_coords=None, end_coords=None):
+        with self.timer.stage('geocode'):
+            return super().geocode_endpoints(start, end, start_coords, end_coords)
+
+    def get_osrm_route(self, *coords):
+        with self.timer.stage('route'):
+            return super().get_osrm_route(*coords)
+
+    def corridor_line(self, route_data):
+        with self.timer.stage('simplify'):
+            return super().corridor_line(route_data)
+
+    def build_route_response(self, *args, **kwargs):
+        with self.timer.stage('build'):
+            return super().build_route_response(*args, **kwargs)
+
+    def corridor_stations(self, *args):
+        with self.timer.stage('stations'):
+            return super().corridor_stations(*args)
+
+    def plan_route(self, *args, **kwargs):
+        with self.timer.stage('plan'):
+            return super().plan_route(*args, **kwargs)
+
+    def route_payload(self, *args, **kwargs):
+        with self.timer.stage('payload'):
+            return super().route_payload(*args, **kwargs)
+
+
+def derive_route_stages(samples):
+    """Turn nested method timings into exclusive pipeline stages."""
+    stages = {
+        name: samples[name] for name in ('total', 'geocode', 'route', 'simplify', 'stations', 'plan')
+        if samples.get(name)
+    }
+    if samples.get('build'):
+        stages['corridor'] = [
+            build - simplify - stations - payload
+            for build, simplify, stations, payload in zip(
+                samples['build'], samples['simplify'], samples['stations'], samples['payload']
+            )
+        ]
+        stages['payload'] = [payload - plan for payload, plan in zip(samples['payload'], samples['plan'])]
+    return {name: summarize(values) for name, values in stages.items()}
+
+
+def flatten(results, prefix=''):
+    """``{'a': {'b': {'median_ms': 1}}}`` -> ``{'a/b': 1}`` for baseline comparison."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict) and 'median_ms' in value:
+            flat[path] = value['median_ms']
+        elif isinstance(value, dict):
+            flat.update(flatten(value, path))
+    return flat
+
+
+def compare(results, baseline, threshold=1.2, floor_ms=0.5):
+    """Metrics slower than ``threshold`` x baseline (ignoring sub-``floor_ms`` noise)."""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for path, value in sorted(current.items()):
+        before = previous.get(path)
+        if before is None or max(value, before) < floor_ms:
+            continue
+        ratio = value / before if before else math.inf
+        if ratio > threshold:
+            regressions.append({'metric': path, 'baseline_ms': before, 'current_ms': value,
+                                'ratio': round(ratio, 2)})
+    return regressions
@@ -0,0 +1,95 @@
+import logging
+import threading
+
+import numpy as np
+
+from .station_index import get_station_index
+
+logger = logging.getLogger(__name__)
+
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+CLUSTER_RADIUS_PX = 60
+TILE_SIZE_PX = 256
+
+
+def _mercator(lat, lon):
+    """Project to the unit Web Mercator square (x to the east, y to the south)."""
+    lat = np.clip(lat, -85.05112878, 85.05112878)
+    x = (lon + 180.0) / 360.0
+    sin_lat = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)
+    return np.clip(x, 0.0, 1.0 - 1e-12), np.clip(y, 0.0, 1.0 - 1e-12)
+
+
+class StationClusters:
+    """Grid clusters of the station index for every map zoom level.
+
+    At zoom ``z`` the world is cut into cells roughly ``CLUSTER_RADIUS_PX``
+    screen pixels wide, so a viewport holds a bounded number of clusters
+    whatever the zoom. Every level is precomputed as flat arrays.
+    """
+
+    def __init__(self, station_index):
+        self.version = station_index.version
+        self.levels = {}
+        x, y = _mercator(station_index.lat, station_index.lon)
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            self.levels[zoom] = self._build_level(station_index, x, y, zoom)
+
+    @staticmethod
+    def _build_level(station_index, x, y, zoom):
+        cells = max(int(2 ** zoom * TILE_SIZE_PX / CLUSTER_RADIUS_PX), 1)
+        keys = np.floor(x * cells).astype(np.int64) * cells + np.floor(y * cells).astype(np.int64)
+        _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+
+        min_price = np.full(len(counts), np.inf)
+        np.minimum.at(min_price, inverse, station_index.price)
+        return {
+            'latitude': np.bincount(inverse, station_index.lat) / counts,
+            'longitude': np.bincount(inverse, station_index.lon) / counts,
+            'count': counts,
+            'min_price': min_price,
+            'avg_price': np.bincount(inverse, station_index.price) / counts,
+            'station_id': np.where(counts == 1, station_index.ids[first], 0),
+        }
+
+    def query(self, zoom, bounds=None):
+        level = self.levels[min(max(zoom, MIN_ZOOM), MAX_ZOOM)]
+        mask = np.ones(len(level['count']), dtype=bool)
+        if bounds:
+            mask = ((level['latitude'] >= bounds['south']) & (level['latitude'] <= bounds['north'])
+                    & (level['longitude'] >= bounds['west']) & (level['longitude'] <= bounds['east']))
+
+        clusters = []
+        for i in np.flatnonzero(mask):
+            cluster = {
+                'latitude': round(float(level['latitude'][i]), 5),
+                'longitude': round(float(level['longitude'][i]), 5),
+                'count': int(level['count'][i]),
+                'min_price': round(float(level['min_price'][i]), 3),
+                'avg_price': round(float(level['avg_price'][i]), 3),
+            }
+            if level['station_id'][i]:
+                cluster['id'] = int(level['station_id'][i])
+            clusters.append(cluster)
+        return clusters
+
+
+_clusters = None
+_clusters_lock = threading.Lock()
+
+
+def get_station_clusters():
+    """Return the cluster hierarchy for the current station index, rebuilding it when the data changes."""
+    global _clusters
+    station_index = get_station_index()
+    clusters = _clusters
+    if clusters is not None and clusters.version == station_index.version:
+        return clusters
+
+    with _clusters_lock:
+        if _clusters is None or _clusters.version != station_index.version:
+            _clusters = StationClusters(station_index)
+            logger.info(f"Built station clusters for zoom {MIN_ZOOM}-{MAX_ZOOM} (version {station_index.version})")
+        return _clusters
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from .metrics import stage
+from .snapshots import _accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip is always available
+    brotli = None
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Brotli or gzip for JSON responses, whichever the client accepts (brotli first).
+
+    Only JSON is compressed: HTML pages carry the CSRF token, and compressing
+    secrets next to reflected input is what BREACH exploits. Responses that
+    are already encoded, such as the station snapshot, are left alone.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0]
+        if not content_type.endswith('json') or response.has_header('Content-Encoding'):
+            return response
+        if response.streaming or len(response.content) < settings.COMPRESS_MIN_BYTES:
+            return response
+
+        with stage('compress'):
+            if brotli is not None and 'br' in _accepted_encodings(request):
+                patch_vary_headers(response, ('Accept-Encoding',))
+                compressed = brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+                if len(compressed) >= len(response.content):
+                    return response
+                response.content = compressed
+                response['Content-Length'] = str(len(compressed))
+                response['Content-Encoding'] = 'br'
+                etag = response.get('ETag')
+                if etag and etag.startswith('"'):
+                    response['ETag'] = 'W/' + etag
+                return response
+            return super().process_response(request, response)
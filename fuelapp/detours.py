@@ -0,0 +1,101 @@
+"""True detour cost of corridor stations from two routing table requests.
+
+A station's detour is the drive from the point of the route nearest to it
+(its mile marker) to the station and back. All candidates are measured with
+one OSRM ``/table`` call each way instead of one route request each, and the
+results are cached per route and station data version.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import cache_result
+from .route_cache import route_cache_key
+from .routing import table_between
+
+METERS_PER_MILE = 1609.344
+# OSRM's default --max-table-size; every table request carries a foot and a station point per candidate
+TABLE_MAX_COORDINATES = 100
+
+
+def detour_candidates(stations, limit):
+    """The ``limit`` cheapest stations, nearest the route first among equal prices."""
+    return sorted(stations, key=lambda s: (s['retail_price'], s['route_distance']))[:limit]
+
+
+def effective_price(price, detour_miles, detour_minutes):
+    """Pump price plus the detour's fuel and driver time spread over a full tank."""
+    tank_gallons = settings.MAX_FUEL_RANGE / settings.FUEL_ECONOMY
+    detour_cost = (detour_miles / settings.FUEL_ECONOMY * price
+                   + detour_minutes / 60 * settings.DETOUR_COST_PER_HOUR)
+    return price + detour_cost / tank_gallons
+
+
+def measure_detours(line, stations):
+    """``{station id: (miles, minutes)}`` for ``stations`` via two table requests; ``None`` if unavailable.
+
+    ``line`` is the ``(lons, lats, marks)`` corridor line the mile markers refer to.
+    """
+    lons, lats, marks = line
+    miles = np.array([s['mile_marker'] for s in stations], dtype=np.float64)
+    feet = np.column_stack([np.interp(miles, marks, lons), np.interp(miles, marks, lats)]).tolist()
+    coordinates = feet + [(s['longitude'], s['latitude']) for s in stations]
+
+    # Only foot i -> station i and back are needed: two directed n x n blocks, not the 2n x 2n matrix
+    count = len(stations)
+    feet_indexes, station_indexes = list(range(count)), list(range(count, 2 * count))
+    outbound = table_between(coordinates, feet_indexes, station_indexes)
+    if outbound is None:
+        return None
+    inbound = table_between(coordinates, station_indexes, feet_indexes)
+    if inbound is None:
+        return None
+    (distances_there, durations_there), (distances_back, durations_back) = outbound, inbound
+
+    detours = {}
+    for i, station in enumerate(stations):
+        there, back = distances_there[i][i], distances_back[i][i]
+        there_time, back_time = durations_there[i][i], durations_back[i][i]
+        if None in (there, back, there_time, back_time):
+            continue
+        detours[station['id']] = ((there + back) / METERS_PER_MILE, (there_time + back_time) / 60)
+    return detours
+
+
+def rank_by_detour(coords, line, stations, station_version):
+    """Annotate the cheapest corridor stations with their detour and effective price.
+
+    ``coords`` are the route's ``(start_lon, start_lat, end_lon, end_lat)``.
+    Measured stations get ``detour_miles``, ``detour_minutes`` and
+    ``effective_price``; when no backend offers distance tables the stations
+    are returned unchanged.
+    """
+    candidates = detour_candidates(stations, min(settings.DETOUR_CANDIDATES, TABLE_MAX_COORDINATES // 2))
+    if not candidates:
+        return stations
+
+    key = f"detours_{station_version}_{route_cache_key(*coords)}"
+    detours = cache.get(key) or {}
+    missing = [s for s in candidates if s['id'] not in detours]
+    if missing:
+        measured = measure_detours(line, missing)
+        cache_result('detours', 'unavailable' if measured is None else 'miss')
+        if measured is None and not detours:
+            return stations
+        detours.update(measured or {})
+        cache.set(key, detours, settings.DETOUR_CACHE_TIMEOUT)
+    else:
+        cache_result('detours', 'hit')
+
+    ranked = []
+    for station in stations:
+        if station['id'] in detours:
+            detour_miles, detour_minutes = detours[station['id']]
+            station = {
+                **station,
+                'detour_miles': round(detour_miles, 1),
+                'detour_minutes': round(detour_minutes, 1),
+                'effective_price': round(effective_price(station['retail_price'], detour_miles, detour_minutes), 3),
+            }
+        ranked.append(station)
+    return ranked
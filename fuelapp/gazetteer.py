@@ -0,0 +1,119 @@
+import csv
+import logging
+import re
+
+import pandas as pd
+
+from .models import GeocodedLocation
+from .utils import normalize_location
+
+logger = logging.getLogger(__name__)
+
+# Census place names carry their legal description ("Tulsa city", "Honolulu CDP")
+PLACE_SUFFIX = re.compile(
+    r"\s+(city and borough|city|town|village|borough|cdp|municipality|township|plantation|"
+    r"(consolidated|metropolitan|metro|unified) government|urban county|corporation)"
+    r"(\s+\(balance\))?$",
+    re.IGNORECASE
+)
+COLUMN_ALIASES = {
+    'city': ('city', 'name', 'place'),
+    'state': ('state', 'usps', 'state_code'),
+    'latitude': ('latitude', 'lat', 'intptlat'),
+    'longitude': ('longitude', 'lon', 'lng', 'intptlong'),
+}
+
+
+def place_key(city, state):
+    return normalize_location(f"{city}, {state}")
+
+
+def load_gazetteer(path):
+    """Read a city/state gazetteer into ``{place_key: (latitude, longitude)}``.
+
+    Accepts the US Census Gazetteer places file (tab separated, ``USPS``,
+    ``NAME``, ``INTPTLAT``, ``INTPTLONG``) or any CSV with city, state,
+    latitude and longitude columns. When a name appears more than once the
+    first entry wins, which in the Census file is the incorporated place.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        dialect = csv.Sniffer().sniff(f.readline(), delimiters=',\t|')
+    df = pd.read_csv(path, sep=dialect.delimiter, dtype=str, encoding='utf-8-sig')
+    df.columns = [column.strip().lower() for column in df.columns]
+
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        match = next((alias for alias in aliases if alias in df.columns), None)
+        if match is None:
+            raise ValueError(f"Gazetteer {path} has no {field} column")
+        columns[match] = field
+    df = df[list(columns)].rename(columns=columns)
+
+    df['city'] = df['city'].fillna('').str.replace(PLACE_SUFFIX, '', regex=True)
+    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
+    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
+    df = df.dropna(subset=['latitude', 'longitude'])
+    df['key'] = [place_key(city, state) for city, state in zip(df['city'], df['state'].fillna(''))]
+    df = df.drop_duplicates('key', keep='first')
+    return dict(zip(df['key'], zip(df['latitude'], df['longitude'])))
+
+
+class GazetteerStats:
+    def __init__(self):
+        self.places = 0
+        self.cached = 0
+        self.resolved = 0
+
+    @property
+    def missed(self):
+        return self.places - self.cached - self.resolved
+
+    @property
+    def hit_rate(self):
+        return (self.cached + self.resolved) / self.places if self.places else 0.0
+
+    def __str__(self):
+        return (f"{self.places} places: {self.cached} cached, {self.resolved} from gazetteer, "
+                f"{self.missed} unresolved ({self.hit_rate:.1%} hit rate)")
+
+
+def resolve_places(places, gazetteer=None):
+    """Coordinates for ``(city, state)`` pairs without touching the network.
+
+    Each distinct place is looked up once: first in the GeocodedLocation
+    table, then in ``gazetteer`` (from ``load_gazetteer``). New gazetteer hits
+    are stored in the table so later imports and the route planner reuse
+    them. Returns ``({place_key: (latitude, longitude)}, GazetteerStats)``.
+    """
+    stats = GazetteerStats()
+    wanted = {}
+    for city, state in places:
+        key = place_key(city, state)
+        if key and key not in wanted:
+            wanted[key] = f"{city}, {state}"
+    stats.places = len(wanted)
+
+    coordinates = {}
+    keys = list(wanted)
+    for start in range(0, len(keys), 500):
+        rows = GeocodedLocation.objects.filter(query_key__in=keys[start:start + 500]).values_list(
+            'query_key', 'latitude', 'longitude'
+        )
+        for key, latitude, longitude in rows:
+            coordinates[key] = (latitude, longitude)
+    stats.cached = len(coordinates)
+
+    new_locations = []
+    for key, query in wanted.items():
+        if key in coordinates or not gazetteer or key not in gazetteer:
+            continue
+        latitude, longitude = gazetteer[key]
+        coordinates[key] = (latitude, longitude)
+        new_locations.append(GeocodedLocation(
+            query_key=key, query=query[:255], latitude=latitude, longitude=longitude, display_name=query[:500]
+        ))
+    GeocodedLocation.objects.bulk_create(new_locations, batch_size=500, ignore_conflicts=True)
+    stats.resolved = len(new_locations)
+
+    logger.info(f"Resolved station places offline: {stats}")
+    return coordinates, stats
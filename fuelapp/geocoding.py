@@ -0,0 +1,169 @@
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .metrics import cache_result
+from .models import GeocodedLocation
+from .upstream import UpstreamError, get_upstream
+from .utils import normalize_location
+
+logger = logging.getLogger(__name__)
+
+GeocodeResult = namedtuple('GeocodeResult', ['latitude', 'longitude', 'address'])
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache = LRUCache(settings.GEOCODE_LRU_SIZE)
+_warmed = False
+_warm_lock = threading.Lock()
+
+
+def warm_geocode_cache():
+    """Load the most recent persisted geocodes into this worker's LRU."""
+    global _warmed
+    with _warm_lock:
+        if _warmed:
+            return
+        rows = GeocodedLocation.objects.order_by('-created_at').values_list(
+            'query_key', 'latitude', 'longitude', 'display_name'
+        )[:settings.GEOCODE_LRU_SIZE]
+        for query_key, latitude, longitude, display_name in reversed(rows):
+            _cache.set(query_key, GeocodeResult(latitude, longitude, display_name))
+        _warmed = True
+
+
+def _lookup(key):
+    if not _warmed:
+        warm_geocode_cache()
+
+    result = _cache.get(key)
+    if result:
+        cache_result('geocode', 'memory')
+        return result
+
+    stored = GeocodedLocation.objects.filter(query_key=key).first()
+    if stored:
+        cache_result('geocode', 'database')
+        result = GeocodeResult(stored.latitude, stored.longitude, stored.display_name)
+        _cache.set(key, result)
+    return result
+
+
+def known_location(location):
+    """``GeocodeResult`` for ``location`` if it is already cached or stored, without asking Nominatim."""
+    key = normalize_location(location)
+    return _lookup(key) if key else None
+
+
+def _store(key, location, result):
+    try:
+        with transaction.atomic():
+            GeocodedLocation.objects.create(
+                query_key=key,
+                query=location[:255],
+                latitude=result.latitude,
+                longitude=result.longitude,
+                display_name=(result.address or '')[:500]
+            )
+    except IntegrityError:
+        # Another worker stored the same place first
+        pass
+    _cache.set(key, result)
+
+
+def provided_location(location, coords):
+    """``GeocodeResult`` for ``[latitude, longitude]`` the client already has, e.g. from a place suggestion."""
+    return GeocodeResult(coords[0], coords[1], location)
+
+
+def _search_params(location):
+    return {'q': location, 'format': 'json', 'limit': 1}
+
+
+def _parse_search(status_code, payload):
+    if status_code != 200 or not payload:
+        return None
+    match = payload[0]
+    return GeocodeResult(float(match['lat']), float(match['lon']), match.get('display_name', ''))
+
+
+def geocode(location):
+    """Resolve a place name to a ``GeocodeResult`` or ``None``.
+
+    Lookups go through the in-memory LRU, then the GeocodedLocation table,
+    and only reach Nominatim for names never seen before.
+    """
+    key = normalize_location(location)
+    if not key:
+        return None
+
+    result = _lookup(key)
+    if result:
+        return result
+
+    cache_result('geocode', 'miss')
+    try:
+        result = _parse_search(*get_upstream('nominatim').get_json('/search', _search_params(location)))
+    except UpstreamError as e:
+        logger.error(f"Geocoding request failed for {location}: {str(e)}")
+        return None
+
+    if result:
+        _store(key, location, result)
+    return result
+
+
+async def ageocode(location):
+    """Async ``geocode`` that queries Nominatim without blocking the event loop."""
+    key = normalize_location(location)
+    if not key:
+        return None
+
+    result = _cache.get(key)
+    if result:
+        cache_result('geocode', 'memory')
+        return result
+    result = await sync_to_async(_lookup)(key)
+    if result:
+        return result
+
+    cache_result('geocode', 'miss')
+    try:
+        result = _parse_search(*await get_upstream('nominatim').aget_json('/search', _search_params(location)))
+    except UpstreamError as e:
+        logger.error(f"Geocoding request failed for {location}: {str(e)}")
+        return None
+
+    if result:
+        await sync_to_async(_store)(key, location, result)
+    return result
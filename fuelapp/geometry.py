@@ -0,0 +1,143 @@
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.7613
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance in miles; accepts scalars or broadcastable arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def cumulative_miles(lats, lons):
+    """Mile marker of every vertex of a polyline, starting at 0."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    marks = np.zeros(len(lats))
+    if len(lats) > 1:
+        marks[1:] = np.cumsum(haversine_miles(lats[:-1], lons[:-1], lats[1:], lons[1:]))
+    return marks
+
+
+def _all_pairs(n_points, n_segments):
+    points = np.repeat(np.arange(n_points), n_segments)
+    segments = np.tile(np.arange(n_segments), n_points)
+    return np.vstack([segments, points])
+
+
+def distance_to_polyline(point_lats, point_lons, route_lats, route_lons, pairs=None, marks=None):
+    """Distance in miles from each point to a polyline and the mile marker of its foot.
+
+    ``pairs`` is an optional ``(2, k)`` array of ``(segment, point)`` indices to
+    evaluate, such as the output of ``StationIndex.query_segments``; without it
+    every point is measured against every segment (see ``project_pairs``).
+    Points that appear in no pair get ``inf`` for both results.
+
+    ``marks`` overrides the mile marker of each route vertex, which lets a
+    simplified line report positions along the original geometry.
+    """
+    point_lats = np.asarray(point_lats, dtype=np.float64)
+    point_lons = np.asarray(point_lons, dtype=np.float64)
+    route_lats = np.asarray(route_lats, dtype=np.float64)
+    route_lons = np.asarray(route_lons, dtype=np.float64)
+
+    n_points = len(point_lats)
+    distances = np.full(n_points, np.inf)
+    mile_markers = np.full(n_points, np.inf)
+    if n_points == 0 or len(route_lats) == 0:
+        return distances, mile_markers
+
+    if len(route_lats) == 1:
+        distances[:] = haversine_miles(point_lats, point_lons, route_lats[0], route_lons[0])
+        mile_markers[:] = 0.0
+        return distances, mile_markers
+
+    if pairs is None:
+        pairs = _all_pairs(n_points, len(route_lats) - 1)
+    seg, pt = np.asarray(pairs, dtype=np.int64)
+    if len(pt) == 0:
+        return distances, mile_markers
+
+    if marks is None:
+        marks = cumulative_miles(route_lats, route_lons)
+    pair_dist, pair_mark = project_pairs(point_lats, point_lons, route_lats, route_lons, marks, seg, pt)
+
+    best = closest_pairs(pt, pair_dist)
+    distances[pt[best]] = pair_dist[best]
+    mile_markers[pt[best]] = pair_mark[best]
+    return distances, mile_markers
+
+
+def project_pairs(point_lats, point_lons, route_lats, route_lons, marks, seg, pt):
+    """Distance and mile marker for each ``(seg[i], pt[i])`` pair.
+
+    The point is projected onto its segment in an equirectangular plane
+    centred on the point, and the distance to the foot of that projection is
+    measured along the great circle.
+    """
+    plat = point_lats[pt]
+    plon = point_lons[pt]
+    cos_lat = np.cos(np.radians(plat))
+
+    # Equirectangular plane centred on the point, longitude scaled by cos(lat)
+    ax = (route_lons[seg] - plon) * cos_lat
+    ay = route_lats[seg] - plat
+    dx = (route_lons[seg + 1] - plon) * cos_lat - ax
+    dy = route_lats[seg + 1] - plat - ay
+    length_sq = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(length_sq > 0, -(ax * dx + ay * dy) / length_sq, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+
+    foot_lat = route_lats[seg] + t * (route_lats[seg + 1] - route_lats[seg])
+    foot_lon = route_lons[seg] + t * (route_lons[seg + 1] - route_lons[seg])
+    pair_dist = haversine_miles(plat, plon, foot_lat, foot_lon)
+    pair_mark = marks[seg] + t * (marks[seg + 1] - marks[seg])
+    return pair_dist, pair_mark
+
+
+def closest_pairs(keys, pair_dist):
+    """Index of the shortest pair for each distinct key."""
+    order = np.lexsort((pair_dist, keys))
+    first = np.unique(keys[order], return_index=True)[1]
+    return order[first]
+
+
+def simplify_polyline(lats, lons, tolerance_miles):
+    """Douglas-Peucker simplification with a tolerance in miles.
+
+    Each vertex's offset from the chord that would replace it is measured
+    like a corridor distance (``project_pairs``: a plane centred on the
+    vertex, then great-circle miles to the foot), so dropped vertices are
+    within the tolerance at any longitude. Returns the sorted indices of the
+    vertices to keep; the first and last vertex are always kept.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    n = len(lats)
+    if n <= 2 or tolerance_miles <= 0:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    chord_marks = np.zeros(2)
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        inner = np.arange(first + 1, last)
+        offsets, _ = project_pairs(lats, lons, lats[[first, last]], lons[[first, last]], chord_marks,
+                                   np.zeros(len(inner), dtype=np.int64), inner)
+
+        split = int(np.argmax(offsets))
+        if offsets[split] > tolerance_miles:
+            split += first + 1
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return np.flatnonzero(keep)
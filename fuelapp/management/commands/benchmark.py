@@ -0,0 +1,221 @@
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+import django
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from fuelapp import geocoding, upstream
+from fuelapp.benchmark import (
+    PLACES, ROUTES, StageTimer, StubUpstreams, TimedRoutePlannerView, compare, derive_route_stages,
+    summarize, synthetic_feed
+)
+from fuelapp.management.commands import import_fuel_prices
+from fuelapp.models import GeocodedLocation, Route
+from fuelapp.station_index import get_station_index, reset_station_index
+from fuelapp.views import fuel_stations
+
+
+def render(response):
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+class TimedImport(import_fuel_prices.Command):
+    timer = None
+
+    def read_feed(self, *args):
+        with self.timer.stage('read'):
+            return super().read_feed(*args)
+
+    def locate(self, *args):
+        with self.timer.stage('geocode'):
+            return super().locate(*args)
+
+    def upsert(self, *args):
+        with self.timer.stage('upsert'):
+            return super().upsert(*args)
+
+
+class Command(BaseCommand):
+    help = ('Benchmark import_fuel_prices, /api/fuel-stations/ and the route planner stage by stage '
+            'against synthetic stations and local stub upstreams')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stations', default='10000,100000',
+                            help='Comma separated station table sizes, e.g. 10000,100000,1000000')
+        parser.add_argument('--routes', default=','.join(ROUTES),
+                            help=f"Comma separated routes from: {', '.join(ROUTES)}")
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per scenario')
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Milliseconds of simulated network latency per upstream call')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write JSON results to this file (default: stdout)')
+        parser.add_argument('--baseline', help='Earlier JSON results to compare against')
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help='Flag metrics slower than this multiple of the baseline')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['stations'].split(',') if size]
+        routes = [name for name in options['routes'].split(',') if name]
+        unknown = set(routes) - set(ROUTES)
+        if unknown:
+            raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}")
+
+        workdir = tempfile.mkdtemp(prefix='fuel-benchmark-')
+        stub = StubUpstreams(PLACES, latency=options['latency'] / 1000)
+        url = stub.start()
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'benchmark.sqlite3')
+        try:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=['testserver'],
+                STATION_DATA_DIR=os.path.join(workdir, 'station_data'),
+                STATION_GAZETTEER_FILE=None,
+                OSRM_ENDPOINT=url,
+                NOMINATIM_ENDPOINT=url,
+                # The stubs need no rate limiting
+                UPSTREAMS={name: {**config, 'min_interval': 0} for name, config in settings.UPSTREAMS.items()},
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                    'LOCATION': 'fuel-benchmark'}},
+            ):
+                upstream._clients.clear()
+                reset_station_index()
+                results = {
+                    f"stations={size}": self.run_size(size, routes, workdir, options)
+                    for size in sizes
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            upstream._clients.clear()
+            reset_station_index()
+            stub.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'repeat': options['repeat'],
+                'latency_ms': options['latency'],
+                'upstream_calls': dict(stub.calls),
+            },
+            'results': results,
+        }
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            report['regressions'] = compare(results, baseline.get('results', {}), options['threshold'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(f"Wrote benchmark results to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        for regression in report.get('regressions', []):
+            self.stderr.write(self.style.WARNING(
+                f"Regression {regression['metric']}: {regression['baseline_ms']} ms -> "
+                f"{regression['current_ms']} ms ({regression['ratio']}x)"
+            ))
+        if options['fail_on_regression'] and report.get('regressions'):
+            raise CommandError(f"{len(report['regressions'])} metrics regressed")
+
+    def run_size(self, size, routes, workdir, options):
+        self.stderr.write(f"Benchmarking {size} stations...")
+        feed = os.path.join(workdir, f"feed-{size}.csv")
+        gazetteer = synthetic_feed(feed, size, seed=options['seed'],
+                                   state_centroids=import_fuel_prices.Command.STATE_CENTROIDS)
+        results = {'import': self.bench_import(feed, gazetteer)}
+
+        timer = StageTimer()
+        for _ in range(options['repeat']):
+            reset_station_index()
+            with timer.stage('load'):
+                get_station_index()
+        results['station_index'] = timer.summary()
+
+        results['fuel_stations'] = self.bench_fuel_stations(options['repeat'])
+        for name in routes:
+            results[f"route:{name}"] = self.bench_route(*ROUTES[name], options['repeat'])
+        return results
+
+    def bench_import(self, feed, gazetteer):
+        results = {}
+        for run in ('initial', 'unchanged'):
+            timer = StageTimer()
+            command = TimedImport()
+            command.timer = timer
+            out = StringIO()
+            with timer.stage('total'):
+                call_command(command, feed, gazetteer=gazetteer, stdout=out)
+            if 'Failed to import' in out.getvalue():
+                raise CommandError(out.getvalue())
+            # Version bump, station columns and snapshot encoding
+            timer.add('publish', timer.samples['total'][0] - timer.samples['read'][0] - timer.samples['upsert'][0])
+            results[run] = timer.summary()
+        return results
+
+    def bench_fuel_stations(self, repeat):
+        factory = RequestFactory()
+        timer = StageTimer()
+        for _ in range(repeat):
+            with timer.stage('full_list_gzip'):
+                response = render(fuel_stations(factory.get('/api/fuel-stations/', HTTP_ACCEPT_ENCODING='gzip')))
+            with timer.stage('not_modified'):
+                render(fuel_stations(factory.get('/api/fuel-stations/', HTTP_ACCEPT_ENCODING='gzip',
+                                                HTTP_IF_NONE_MATCH=response['ETag'])))
+            with timer.stage('filtered_bounds'):
+                render(fuel_stations(factory.get('/api/fuel-stations/', {'bounds': '-100,30,-95,35', 'page_size': 500})))
+        return timer.summary()
+
+    def bench_route(self, start, end, repeat):
+        factory = RequestFactory()
+        body = json.dumps({'start_location': start, 'end_location': end})
+        results = {}
+
+        timer = StageTimer()
+        TimedRoutePlannerView.timer = timer
+        view = TimedRoutePlannerView.as_view()
+        for _ in range(repeat):
+            # Cold: nothing cached, every upstream is called
+            cache.clear()
+            geocoding._cache.clear()
+            GeocodedLocation.objects.all().delete()
+            Route.objects.update(response=None)
+            request = factory.post('/api/route/', body, content_type='application/json')
+            with timer.stage('total'):
+                response = render(view(request))
+            if response.status_code != 200:
+                raise CommandError(f"Route {start} -> {end} failed: {response.data}")
+        results['cold'] = derive_route_stages(timer.samples)
+
+        warm = []
+        for _ in range(repeat):
+            request = factory.post('/api/route/', body, content_type='application/json')
+            started = time.perf_counter()
+            render(view(request))
+            warm.append((time.perf_counter() - started) * 1000)
+        results['warm'] = {'total': summarize(warm)}
+        return results
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from fuelapp.road_graph import (
+    DEFAULT_HIGHWAYS, LANDMARKS, RoadGraph, build_graph_arrays, read_ways, save_graph_arrays
+)
+
+
+class Command(BaseCommand):
+    help = ('Build the road graph used by the local routing backend from a GeoJSON road extract, '
+            'e.g. `osmium tags-filter state.osm.pbf w/highway -o roads.pbf && '
+            'osmium export roads.pbf -o roads.geojson`')
+
+    def add_arguments(self, parser):
+        parser.add_argument('geojson', help='GeoJSON FeatureCollection of road LineStrings with OSM tags')
+        parser.add_argument('--output', default=settings.ROAD_GRAPH_FILE,
+                            help='Graph file to write (default: ROAD_GRAPH_FILE)')
+        parser.add_argument('--highways', default=','.join(DEFAULT_HIGHWAYS),
+                            help='Comma separated OSM highway classes to keep; empty keeps every road')
+        parser.add_argument('--landmarks', type=int, default=LANDMARKS,
+                            help='Landmarks precomputed for the A* heuristic')
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('Pass --output or set ROAD_GRAPH_FILE')
+        if not options['output'].endswith('.npz'):
+            raise CommandError('The graph file name must end in .npz')
+        highways = tuple(name for name in options['highways'].split(',') if name)
+
+        started = time.perf_counter()
+        ways = read_ways(options['geojson'], highways)
+        self.stdout.write(f"Read {len(ways)} ways in {time.perf_counter() - started:.1f}s")
+        try:
+            arrays = build_graph_arrays(ways, options['landmarks'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        save_graph_arrays(options['output'], arrays)
+
+        graph = RoadGraph(arrays)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['output']}: {len(graph)} nodes, {len(graph.edge_to)} directed edges, "
+            f"{len(arrays['landmark_nodes'])} landmarks in {time.perf_counter() - started:.1f}s"
+        ))
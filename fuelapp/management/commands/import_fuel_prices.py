@@ -1,12 +1,38 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from fuelapp.models import FuelStation
-from django.db.models import Avg, Min, Max
+from django.db import transaction
+from django.utils import timezone
+from fuelapp.models import FuelStation, Route
+from fuelapp.gazetteer import load_gazetteer, place_key, resolve_places
+from fuelapp.price_history import record_price_changes, record_state_rollup
+from fuelapp.utils import bump_station_data_version, get_station_data_version, new_station_data_version
+from fuelapp.station_columns import StationColumns, remove_stale_columns, write_station_columns
+from fuelapp.singleflight import remove_stale_leases
+from fuelapp.snapshots import write_station_snapshot
+from django.db.models import Avg, Count, Min, Max
+from decimal import Decimal
+import numpy as np
 import pandas as pd
-import random
 import os
+import time
+
+CSV_COLUMNS = {
+    'OPIS Truckstop ID': 'opis',
+    'Truckstop Name': 'truck_stop',
+    'Address': 'address',
+    'City': 'city',
+    'State': 'state',
+    'Rack ID': 'rack_id',
+    'Retail Price': 'retail_price',
+}
+DEFAULT_CSV = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'fuel-prices-for-be-assessment.csv'
+)
+
 
 class Command(BaseCommand):
-    help = 'Import fuel prices from CSV file'
+    help = 'Import fuel prices from CSV file, updating stations in place by OPIS ID'
     
     STATE_CENTROIDS = {
         'AL': (32.806671, -86.791130),
@@ -61,87 +87,220 @@ class Command(BaseCommand):
         'WY': (42.755966, -107.302490)
     }
 
-    def get_state_coordinates(self, state):
-        state = state.upper().strip()
-        base_lat, base_lon = self.STATE_CENTROIDS.get(state, (37.0902, -95.7129))
-        return {
-            'lat': round(base_lat + random.uniform(-1.0, 1.0), 6),
-            'lon': round(base_lon + random.uniform(-1.0, 1.0), 6)
-        }
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', nargs='?', default=DEFAULT_CSV)
+        parser.add_argument('--chunk-size', type=int, default=100000,
+                            help='CSV rows read per chunk')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows per bulk INSERT/UPDATE statement')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete stations whose OPIS ID is missing from the feed, '
+                                 'and duplicate rows left by older imports')
+        parser.add_argument('--gazetteer', default=settings.STATION_GAZETTEER_FILE,
+                            help='City/state gazetteer (Census Gaz_places file or city,state,lat,lon CSV) '
+                                 'used to place stations without network access')
+        parser.add_argument('--relocate', action='store_true',
+                            help='Also move existing stations to their resolved city coordinates')
+
+    def state_coordinates(self, states, rng):
+        """Jittered state-centroid coordinates, the fallback for cities that do not resolve."""
+        centroids = states.map(self.STATE_CENTROIDS)
+        fallback = (37.0902, -95.7129)
+        lat = np.array([c[0] if isinstance(c, tuple) else fallback[0] for c in centroids])
+        lon = np.array([c[1] if isinstance(c, tuple) else fallback[1] for c in centroids])
+        lat = np.round(lat + rng.uniform(-1.0, 1.0, len(lat)), 6)
+        lon = np.round(lon + rng.uniform(-1.0, 1.0, len(lon)), 6)
+        return lat, lon
+
+    def clean_chunk(self, chunk):
+        chunk = chunk.rename(columns=CSV_COLUMNS)[list(CSV_COLUMNS.values())]
+        for column in ('opis', 'truck_stop', 'address', 'city', 'state', 'rack_id'):
+            chunk[column] = chunk[column].fillna('').str.strip()
+        chunk['state'] = chunk['state'].str.upper().str[:2]
+        chunk['retail_price'] = pd.to_numeric(chunk['retail_price'], errors='coerce').round(3)
+        return chunk[(chunk['opis'] != '') & chunk['retail_price'].notna()]
+
+    def read_feed(self, csv_file, chunk_size):
+        """Stream the CSV and collapse it to one row per OPIS ID (lowest price wins).
+
+        Memory is bounded by the number of distinct stations, not feed length.
+        """
+        stations = None
+        total_rows = 0
+        for chunk in pd.read_csv(csv_file, dtype=str, chunksize=chunk_size):
+            total_rows += len(chunk)
+            chunk = self.clean_chunk(chunk)
+            if stations is not None:
+                chunk = pd.concat([stations, chunk], ignore_index=True)
+            stations = (chunk.sort_values('retail_price', kind='stable')
+                        .drop_duplicates('opis', keep='first'))
+            self.stdout.write(f"Read {total_rows} rows, {len(stations)} distinct stations...")
+
+        if stations is None:
+            stations = pd.DataFrame(columns=list(CSV_COLUMNS.values()))
+        return stations.set_index('opis'), total_rows
+
+    def locate(self, stations, gazetteer):
+        """Coordinates for each station, indexed by OPIS ID.
+
+        Cities are resolved offline from the GeocodedLocation cache and the
+        gazetteer; stations in unresolved cities fall back to a jittered
+        state centroid and are flagged with ``found=False``.
+        """
+        coordinates, stats = resolve_places(zip(stations['city'], stations['state']), gazetteer)
+        self.stdout.write(f"Offline geocoding: {stats}")
+
+        lat, lon = self.state_coordinates(stations['state'], np.random.default_rng())
+        found = np.zeros(len(stations), dtype=bool)
+        for i, (city, state) in enumerate(zip(stations['city'], stations['state'])):
+            point = coordinates.get(place_key(city, state))
+            if point:
+                lat[i], lon[i] = point
+                found[i] = True
+        return pd.DataFrame({'latitude': lat, 'longitude': lon, 'found': found}, index=stations.index)
+
+    def upsert(self, feed, batch_size, prune, gazetteer=None, relocate=False):
+        """Write new stations and changed prices; returns (created, updated, deleted).
+
+        With ``relocate`` existing stations whose city resolves are also moved
+        to the resolved coordinates.
+        """
+        now = timezone.now()
+        existing = pd.DataFrame(
+            list(FuelStation.objects.values_list('id', 'opis', 'retail_price', 'latitude', 'longitude')),
+            columns=['id', 'opis', 'old_price', 'old_latitude', 'old_longitude']
+        )
+        existing['old_price'] = existing['old_price'].astype(float)
+        new = feed[~feed.index.isin(existing['opis'])]
+        points = self.locate(feed if relocate else new, gazetteer)
+
+        matched = existing.join(feed['retail_price'], on='opis', how='inner')
+        changed = ~np.isclose(matched['old_price'], matched['retail_price'], rtol=0, atol=5e-4)
+        repriced = matched['id'][changed].tolist()
+        update_fields = ['retail_price', 'last_updated']
+        if relocate:
+            matched = matched.join(points, on='opis')
+            moved = matched['found'] & ~(
+                np.isclose(matched['old_latitude'], matched['latitude'], rtol=0, atol=1e-6)
+                & np.isclose(matched['old_longitude'], matched['longitude'], rtol=0, atol=1e-6)
+            )
+            changed |= moved
+            matched['latitude'] = matched['latitude'].where(moved, matched['old_latitude'])
+            matched['longitude'] = matched['longitude'].where(moved, matched['old_longitude'])
+            update_fields += ['latitude', 'longitude']
+        else:
+            matched['latitude'] = matched['old_latitude']
+            matched['longitude'] = matched['old_longitude']
+        matched = matched[changed]
+
+        to_update = [
+            FuelStation(id=pk, retail_price=Decimal(f"{price:.3f}"), latitude=latitude, longitude=longitude,
+                        last_updated=now)
+            for pk, price, latitude, longitude in zip(
+                matched['id'], matched['retail_price'], matched['latitude'], matched['longitude']
+            )
+        ]
+
+        new_points = points.loc[new.index]
+        to_create = [
+            FuelStation(
+                opis=opis,
+                truck_stop=row.truck_stop,
+                address=row.address,
+                city=row.city,
+                state=row.state,
+                rack_id=row.rack_id,
+                retail_price=Decimal(f"{row.retail_price:.3f}"),
+                latitude=latitude,
+                longitude=longitude
+            )
+            for opis, row, latitude, longitude in zip(
+                new.index, new.itertuples(), new_points['latitude'], new_points['longitude']
+            )
+        ]
+
+        with transaction.atomic():
+            FuelStation.objects.bulk_update(to_update, update_fields, batch_size=batch_size)
+            FuelStation.objects.bulk_create(to_create, batch_size=batch_size)
+            deleted = 0
+            if prune:
+                stale = existing['id'][~existing['opis'].isin(feed.index) | existing['opis'].duplicated()]
+                for start in range(0, len(stale), batch_size):
+                    ids = stale.iloc[start:start + batch_size].tolist()
+                    deleted += FuelStation.objects.filter(id__in=ids).delete()[1].get('fuelapp.FuelStation', 0)
+
+            history = record_price_changes(repriced, effective_at=now, batch_size=batch_size)
+            record_state_rollup(timezone.localdate(now))
+        self.stdout.write(f"Appended {history} price history rows")
+
+        return len(to_create), len(to_update), deleted
 
     def handle(self, *args, **options):
         try:
             self.stdout.write("Starting fuel station import...")
-            
-            FuelStation.objects.all().delete()
-            
-            csv_file = os.path.join(
-                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-                'fuel-prices-for-be-assessment.csv'
-            )
-            
+            started = time.monotonic()
+
+            csv_file = options['csv_file']
             if not os.path.exists(csv_file):
                 raise FileNotFoundError(f"CSV file not found at: {csv_file}")
-                
+
             self.stdout.write(f"Reading CSV file from: {csv_file}")
-            df = pd.read_csv(csv_file)
-            
-            df = df.sample(n=min(8000, len(df)), random_state=42)
-            
-            self.stdout.write(f"Total rows to import: {len(df)}")
-            for state in df['State'].unique():
-                count = len(df[df['State'] == state])
-                self.stdout.write(f"Stations in {state}: {count}")
-            
-            batch_size = 100
-            stations = []
-            
-            for index, row in df.iterrows():
-                try:
-                    state = str(row['State']).strip().upper()[:2]
-                    coords = self.get_state_coordinates(state)
-                    
-                    station = FuelStation(
-                        opis=str(row['OPIS Truckstop ID']),
-                        truck_stop=str(row['Truckstop Name']),
-                        address=str(row['Address']),
-                        city=str(row['City']),
-                        state=state,
-                        rack_id=str(row['Rack ID']),
-                        retail_price=float(row['Retail Price']),
-                        latitude=coords['lat'],
-                        longitude=coords['lon']
-                    )
-                    stations.append(station)
-                    
-                    if len(stations) >= batch_size:
-                        FuelStation.objects.bulk_create(stations)
-                        self.stdout.write(f"Imported {batch_size} stations...")
-                        stations = []
-                    
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.WARNING(f"Error on row {index}: {str(e)}")
-                    )
-                    continue
-            
-            if stations:
-                FuelStation.objects.bulk_create(stations)
-            
-            total_stations = FuelStation.objects.count()
+            feed, total_rows = self.read_feed(csv_file, options['chunk_size'])
+            self.stdout.write(f"Collapsed {total_rows} rows to {len(feed)} stations")
+
+            gazetteer = None
+            if options['gazetteer']:
+                gazetteer = load_gazetteer(options['gazetteer'])
+                self.stdout.write(f"Loaded {len(gazetteer)} places from {options['gazetteer']}")
+
+            created, updated, deleted = self.upsert(
+                feed, options['batch_size'], options['prune'], gazetteer, options['relocate']
+            )
+            elapsed = time.monotonic() - started
             self.stdout.write(
-                self.style.SUCCESS(f"Successfully imported {total_stations} fuel stations")
+                f"Created {created}, updated {updated}, deleted {deleted} "
+                f"in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/s)"
             )
-            
-            avg_price = FuelStation.objects.filter(retail_price__isnull=False).values_list('retail_price', flat=True).aggregate(Avg('retail_price'))
-            min_price = FuelStation.objects.filter(retail_price__isnull=False).values_list('retail_price', flat=True).aggregate(Min('retail_price'))
-            max_price = FuelStation.objects.filter(retail_price__isnull=False).values_list('retail_price', flat=True).aggregate(Max('retail_price'))
-            
-            self.stdout.write(f"Average price: ${avg_price['retail_price__avg']:.3f}")
-            self.stdout.write(f"Minimum price: ${min_price['retail_price__min']:.3f}")
-            self.stdout.write(f"Maximum price: ${max_price['retail_price__max']:.3f}")
-            
+
+            if created or updated or deleted:
+                # Columns are written before the version is published so workers always find them
+                version = new_station_data_version()
+                write_station_columns(version)
+                previous = get_station_data_version()
+
+                # Tell every worker to swap to the new columns and rebuild its index
+                bump_station_data_version(version)
+                remove_stale_columns({previous, version})
+                # Route leases are keyed on the station version; a lease older than the wait is over
+                remove_stale_leases(settings.ROUTE_LEASE_TIMEOUT)
+
+                # Stored route results were priced against the old data
+                Route.objects.exclude(lookup_key='').exclude(station_version=version).delete()
+
+                # Precompressed /api/fuel-stations/ payload for the new version
+                snapshot = write_station_snapshot()
+                self.stdout.write(f"Wrote station snapshot {snapshot.etag}")
+            else:
+                self.stdout.write("No price changes; station data version left as is")
+                version = get_station_data_version()
+                if StationColumns.load(version) is None:
+                    write_station_columns(version)
+
+            stats = FuelStation.objects.aggregate(
+                total=Count('id'),
+                avg=Avg('retail_price'),
+                min=Min('retail_price'),
+                max=Max('retail_price')
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f"Successfully imported fuel prices; {stats['total']} stations in total")
+            )
+            if stats['total']:
+                self.stdout.write(f"Average price: ${stats['avg']:.3f}")
+                self.stdout.write(f"Minimum price: ${stats['min']:.3f}")
+                self.stdout.write(f"Maximum price: ${stats['max']:.3f}")
+
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f"Failed to import fuel prices: {str(e)}")
-            )
\ No newline at end of file
+            )
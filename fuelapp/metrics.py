@@ -0,0 +1,272 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labelnames)
+        with self._lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): value for key, value in self.series.items()}
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labelnames)
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                # Per-bucket counts; the last slot is +Inf
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): [list(counts), total] for key, (counts, total) in self.series.items()}
+
+
+class Registry:
+    """Process-local metrics, merged across gunicorn workers through small JSON files."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def _get(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        return {
+            name: {
+                'kind': metric.kind,
+                'documentation': metric.documentation,
+                'labelnames': metric.labelnames,
+                'buckets': getattr(metric, 'buckets', None),
+                'series': metric.snapshot(),
+            }
+            for name, metric in list(self.metrics.items())
+        }
+
+    def flush(self, force=False):
+        """Write this worker's snapshot for the metrics endpoint, at most every ``METRICS_FLUSH_INTERVAL``."""
+        now = time.monotonic()
+        if not force and now - self._last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        try:
+            os.makedirs(_metrics_dir(), exist_ok=True)
+            path = os.path.join(_metrics_dir(), f"{os.getpid()}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {str(e)}")
+
+
+def _metrics_dir():
+    return os.path.join(settings.STATION_DATA_DIR, 'metrics')
+
+
+def _worker_snapshots():
+    """This process's live metrics plus the last flush of every other running worker."""
+    snapshots = [REGISTRY.snapshot()]
+    try:
+        names = os.listdir(_metrics_dir())
+    except FileNotFoundError:
+        return snapshots
+    for name in names:
+        pid, _, ext = name.partition('.')
+        if ext != 'json' or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        path = os.path.join(_metrics_dir(), name)
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            os.remove(path)
+            continue
+        except PermissionError:
+            pass
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, 'series': {}})
+            for key, value in metric['series'].items():
+                if metric['kind'] == 'counter':
+                    target['series'][key] = target['series'].get(key, 0) + value
+                else:
+                    counts, total = target['series'].get(key, [[0] * len(value[0]), 0.0])
+                    target['series'][key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+    return merged
+
+
+def _labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, json.loads(key))) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus():
+    """All workers' metrics in the Prometheus text exposition format."""
+    REGISTRY.flush(force=True)
+    lines = []
+    for name, metric in sorted(_merge(_worker_snapshots()).items()):
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key, value in sorted(metric['series'].items()):
+            if metric['kind'] == 'counter':
+                lines.append(f"{name}{_labels(metric['labelnames'], key)} {value}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(metric['labelnames'], key, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric['labelnames'], key)} {total}")
+            lines.append(f"{name}_count{_labels(metric['labelnames'], key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'fuel_stage_seconds', 'Time spent in each request processing stage.', ['stage'])
+REQUEST_SECONDS = REGISTRY.histogram(
+    'fuel_http_request_seconds', 'Request latency by view.', ['view', 'method', 'status'])
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    'fuel_upstream_request_seconds', 'Latency of each upstream HTTP attempt.', ['upstream', 'outcome'])
+UPSTREAM_FAILURES = REGISTRY.counter(
+    'fuel_upstream_failures_total', 'Upstream calls that failed after retries or were short-circuited.',
+    ['upstream', 'reason'])
+CACHE_LOOKUPS = REGISTRY.counter(
+    'fuel_cache_lookups_total', 'Cache lookups by cache and result.', ['cache', 'result'])
+ROUTING_RESULTS = REGISTRY.counter(
+    'fuel_routing_results_total', 'Route lookups by routing backend and outcome.', ['backend', 'result'])
+ROUTE_CACHE_OFFSET = REGISTRY.histogram(
+    'fuel_route_cache_offset_miles', 'Distance between a request and the cached route found under its key.',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+COALESCED = REGISTRY.counter(
+    'fuel_coalesced_requests_total', 'Requests answered by another in-flight computation.', ['scope'])
+
+# Stage timings of the request being handled, for the Server-Timing header
+_request_timings = contextvars.ContextVar('fuel_request_timings', default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block into ``fuel_stage_seconds`` and the current request's Server-Timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def cache_result(cache, result):
+    CACHE_LOOKUPS.inc(cache=cache, result=result)
+
+
+def _finish(request, response, timings, started):
+    elapsed = time.perf_counter() - started
+    match = getattr(request, 'resolver_match', None)
+    REQUEST_SECONDS.observe(
+        elapsed,
+        view=match.url_name if match and match.url_name else 'unmatched',
+        method=request.method,
+        status=response.status_code
+    )
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={elapsed * 1000:.1f}")
+    response['Server-Timing'] = ', '.join(entries)
+    REGISTRY.flush()
+    return response
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """Add a ``Server-Timing`` header and record request latency for every response."""
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings = {}
+            token = _request_timings.set(timings)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _request_timings.reset(token)
+            return _finish(request, response, timings, started)
+    else:
+        def middleware(request):
+            timings = {}
+            token = _request_timings.set(timings)
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _request_timings.reset(token)
+            return _finish(request, response, timings, started)
+    return middleware
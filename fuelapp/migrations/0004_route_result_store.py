@@ -0,0 +1,32 @@
+# Generated by Django 3.2.23 on 2026-10-17 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fuelapp', '0003_auto_20250204_0128'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='lookup_key',
+            field=models.CharField(blank=True, default='', max_length=511),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='response',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='station_version',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['lookup_key', 'station_version'], name='fuelapp_rou_lookup__686ee9_idx'),
+        ),
+    ]
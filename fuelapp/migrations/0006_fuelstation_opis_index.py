@@ -0,0 +1,18 @@
+# Generated by Django 3.2.23 on 2026-10-17 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fuelapp', '0005_geocodedlocation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fuelstation',
+            name='opis',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.23 on 2026-10-17 11:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fuelapp', '0006_fuelstation_opis_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FuelPriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=3, max_digits=5)),
+                ('effective_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatePriceDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(max_length=2)),
+                ('date', models.DateField()),
+                ('station_count', models.IntegerField()),
+                ('price_sum', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('price_min', models.DecimalField(decimal_places=3, max_digits=5)),
+                ('price_max', models.DecimalField(decimal_places=3, max_digits=5)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='statepricedaily',
+            constraint=models.UniqueConstraint(fields=('state', 'date'), name='unique_state_price_day'),
+        ),
+        migrations.AddField(
+            model_name='fuelpricehistory',
+            name='station',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='fuelapp.fuelstation'),
+        ),
+        migrations.AddIndex(
+            model_name='fuelpricehistory',
+            index=models.Index(fields=['station', 'effective_at'], name='fuelapp_fue_station_b98e2e_idx'),
+        ),
+    ]
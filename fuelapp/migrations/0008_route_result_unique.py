@@ -0,0 +1,33 @@
+# Generated by Django 3.2.23 on 2026-10-17 11:59
+
+from django.db import migrations, models
+
+
+def remove_duplicate_results(apps, schema_editor):
+    """Keep the newest stored result per (lookup_key, station_version)."""
+    Route = apps.get_model('fuelapp', 'Route')
+    seen = set()
+    duplicates = []
+    rows = Route.objects.exclude(lookup_key='').order_by('-created_at', '-id')
+    for pk, lookup_key, station_version in rows.values_list('pk', 'lookup_key', 'station_version').iterator():
+        if (lookup_key, station_version) in seen:
+            duplicates.append(pk)
+        else:
+            seen.add((lookup_key, station_version))
+    for start in range(0, len(duplicates), 500):
+        Route.objects.filter(pk__in=duplicates[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fuelapp', '0007_price_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_results, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='route',
+            constraint=models.UniqueConstraint(condition=models.Q(('lookup_key', ''), _negated=True), fields=('lookup_key', 'station_version'), name='unique_route_result'),
+        ),
+    ]
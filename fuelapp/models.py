@@ -3,7 +3,7 @@ from django.db import models
 # Create your models here.
 
 class FuelStation(models.Model):
-    opis = models.CharField(max_length=50)
+    opis = models.CharField(max_length=50, db_index=True)
     truck_stop = models.CharField(max_length=200)
     address = models.CharField(max_length=255)
     city = models.CharField(max_length=100)
@@ -30,10 +30,26 @@ class Route(models.Model):
     total_distance = models.FloatField()  # in miles
     total_cost = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    lookup_key = models.CharField(max_length=511, blank=True, default='')  # normalized "start|end"
+    station_version = models.CharField(max_length=32, blank=True, default='')
+    response = models.JSONField(null=True, blank=True)  # stored API payload, cleared when prices change
 
     def __str__(self):
         return f"Route from {self.start_location} to {self.end_location}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['lookup_key', 'station_version']),
+        ]
+        constraints = [
+            # One stored result per request and station data version
+            models.UniqueConstraint(
+                fields=['lookup_key', 'station_version'],
+                condition=~models.Q(lookup_key=''),
+                name='unique_route_result',
+            ),
+        ]
+
 class FuelStop(models.Model):
     route = models.ForeignKey(Route, related_name='fuel_stops', on_delete=models.CASCADE)
     fuel_station = models.ForeignKey(FuelStation, on_delete=models.CASCADE)
@@ -46,4 +62,49 @@ class FuelStop(models.Model):
         ordering = ['stop_number']
 
     def __str__(self):
-        return f"Stop {self.stop_number} at {self.fuel_station.name}"
+        return f"Stop {self.stop_number} at {self.fuel_station.truck_stop}"
+
+
+class GeocodedLocation(models.Model):
+    query_key = models.CharField(max_length=255, unique=True)  # normalize_location() of the query
+    query = models.CharField(max_length=255)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    display_name = models.CharField(max_length=500, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.query_key} ({self.latitude}, {self.longitude})"
+
+
+class FuelPriceHistory(models.Model):
+    """Append-only price log: one row each time a station's price changes."""
+    station = models.ForeignKey(FuelStation, related_name='price_history', on_delete=models.CASCADE)
+    price = models.DecimalField(max_digits=5, decimal_places=3)
+    effective_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.station_id} @ {self.effective_at:%Y-%m-%d %H:%M}: {self.price}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['station', 'effective_at']),
+        ]
+
+
+class StatePriceDaily(models.Model):
+    """Per-state price rollup taken at import time, one row per state and day."""
+    state = models.CharField(max_length=2)
+    date = models.DateField()
+    station_count = models.IntegerField()
+    price_sum = models.DecimalField(max_digits=14, decimal_places=3)
+    price_min = models.DecimalField(max_digits=5, decimal_places=3)
+    price_max = models.DecimalField(max_digits=5, decimal_places=3)
+
+    def __str__(self):
+        return f"{self.state} {self.date}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['state', 'date'], name='unique_state_price_day'),
+        ]
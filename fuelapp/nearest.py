@@ -0,0 +1,155 @@
+import heapq
+import logging
+import threading
+
+import numpy as np
+
+from .geometry import EARTH_RADIUS_MILES, haversine_miles
+from .station_index import get_station_index
+
+logger = logging.getLogger(__name__)
+
+LEAF_SIZE = 32
+
+
+def _unit_vectors(lat, lon):
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord_sq(radius_miles):
+    """Squared chord length on the unit sphere for a great-circle distance."""
+    angle = min(radius_miles / EARTH_RADIUS_MILES, np.pi)
+    return (2 * np.sin(angle / 2)) ** 2
+
+
+class NearestStationIndex:
+    """KD-tree over stations as 3D unit vectors.
+
+    Straight-line (chord) distance between unit vectors is monotone in
+    great-circle distance, so the tree gives exact haversine neighbours with
+    plain box pruning. Every node also records its cheapest price, which lets
+    "cheapest within radius" and ``max_price`` prune whole subtrees.
+    """
+
+    def __init__(self, station_index):
+        self.station_index = station_index
+        self.version = station_index.version
+        self.points = _unit_vectors(station_index.lat, station_index.lon)
+        self.price = station_index.price
+        self.states = station_index.states
+
+        self.order = np.arange(len(self.points))
+        self.node_start, self.node_end = [], []
+        self.node_children = []
+        self.node_min, self.node_max, self.node_min_price = [], [], []
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def _build(self, start, end):
+        node = len(self.node_start)
+        idx = self.order[start:end]
+        pts = self.points[idx]
+        self.node_start.append(start)
+        self.node_end.append(end)
+        self.node_min.append(pts.min(axis=0))
+        self.node_max.append(pts.max(axis=0))
+        self.node_min_price.append(self.price[idx].min())
+        self.node_children.append(None)
+
+        if end - start > LEAF_SIZE:
+            axis = int(np.argmax(self.node_max[node] - self.node_min[node]))
+            mid = (end - start) // 2
+            part = np.argpartition(pts[:, axis], mid)
+            self.order[start:end] = idx[part]
+            left = self._build(start, start + mid)
+            right = self._build(start + mid, end)
+            self.node_children[node] = (left, right)
+        return node
+
+    def _box_dist_sq(self, node, q):
+        gap = np.maximum(self.node_min[node] - q, 0) + np.maximum(q - self.node_max[node], 0)
+        return float(gap @ gap)
+
+    def _leaf_candidates(self, node, q, limit_sq, max_price, states):
+        idx = self.order[self.node_start[node]:self.node_end[node]]
+        diff = self.points[idx] - q
+        dist_sq = np.einsum('ij,ij->i', diff, diff)
+        mask = dist_sq <= limit_sq
+        if max_price is not None:
+            mask &= self.price[idx] <= max_price
+        if states:
+            mask &= np.isin(self.states[idx], states)
+        return idx[mask], dist_sq[mask]
+
+    def query(self, lat, lon, k=10, radius_miles=100, order='distance', max_price=None, states=None):
+        """Return up to ``k`` station indexes within ``radius_miles`` of the point.
+
+        ``order`` is ``'distance'`` for the closest stations or ``'price'`` for
+        the cheapest (ties broken by distance).
+        """
+        if not self.node_start or k <= 0:
+            return []
+        q = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+        states = [state.encode() for state in states] if states else None
+        radius_sq = _chord_sq(radius_miles)
+        cheapest_first = order == 'price'
+
+        # Best-first over nodes; result heap keeps the k best as negated keys
+        best = []
+        frontier = [(0.0, 0)]
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(best) == k and bound > -best[0][0][0]:
+                break
+            if max_price is not None and self.node_min_price[node] > max_price:
+                continue
+
+            children = self.node_children[node]
+            if children is None:
+                idx, dist_sq = self._leaf_candidates(node, q, radius_sq, max_price, states)
+                keys = (zip(self.price[idx], dist_sq) if cheapest_first else zip(dist_sq, self.price[idx]))
+                for i, key in zip(idx, keys):
+                    entry = (tuple(-x for x in key), int(i))
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+                continue
+
+            for child in children:
+                box_sq = self._box_dist_sq(child, q)
+                if box_sq > radius_sq:
+                    continue
+                child_bound = self.node_min_price[child] if cheapest_first else box_sq
+                heapq.heappush(frontier, (child_bound, child))
+
+        ranked = sorted(best, reverse=True)
+        return [i for _, i in ranked]
+
+    def nearest(self, lat, lon, **kwargs):
+        """Like ``query`` but returns station rows with a ``distance`` in miles."""
+        indices = self.query(lat, lon, **kwargs)
+        rows = self.station_index.rows
+        distances = haversine_miles(lat, lon, self.station_index.lat[indices], self.station_index.lon[indices])
+        return [{**rows[i], 'distance': round(float(d), 1)} for i, d in zip(indices, distances)]
+
+
+_nearest = None
+_nearest_lock = threading.Lock()
+
+
+def get_nearest_index():
+    """Return the KD-tree for the current station index, rebuilding it when the data changes."""
+    global _nearest
+    station_index = get_station_index()
+    nearest = _nearest
+    if nearest is not None and nearest.version == station_index.version:
+        return nearest
+
+    with _nearest_lock:
+        if _nearest is None or _nearest.version != station_index.version:
+            _nearest = NearestStationIndex(station_index)
+            logger.info(f"Built nearest-station KD-tree over {len(station_index)} stations")
+        return _nearest
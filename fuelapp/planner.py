@@ -0,0 +1,96 @@
+import numpy as np
+
+
+def _next_cheaper(prices):
+    """Index of the first later node with a strictly lower price (monotone stack)."""
+    n = len(prices)
+    result = np.full(n, n, dtype=np.int64)
+    stack = []
+    for i in range(n - 1, -1, -1):
+        while stack and prices[stack[-1]] >= prices[i]:
+            stack.pop()
+        if stack:
+            result[i] = stack[-1]
+        stack.append(i)
+    return result
+
+
+class _RangeArgmin:
+    """Sparse table answering "cheapest node in [lo, hi]" in O(1) after O(n log n) setup."""
+
+    def __init__(self, prices):
+        self.prices = prices
+        levels = [np.arange(len(prices))]
+        width = 1
+        while width * 2 <= len(prices):
+            prev = levels[-1]
+            left, right = prev[:-width], prev[width:]
+            levels.append(np.where(prices[right] < prices[left], right, left))
+            width *= 2
+        self.levels = levels
+
+    def query(self, lo, hi):
+        level = (hi - lo + 1).bit_length() - 1
+        left = self.levels[level][lo]
+        right = self.levels[level][hi - (1 << level) + 1]
+        return right if self.prices[right] < self.prices[left] else left
+
+
+def plan_fuel_stops(mile_markers, prices, total_distance, max_range, mpg):
+    """Minimum-cost refuelling schedule along a route.
+
+    ``mile_markers`` and ``prices`` describe candidate stations in any order.
+    The truck leaves the origin with an empty tank that holds ``max_range``
+    miles of fuel and fills up at the first corridor station, so the short
+    approach from the origin is billed there too. At each stop it buys just
+    enough to reach the next cheaper station when that is within range, and
+    otherwise fills the tank and moves on to the cheapest station in range.
+    This greedy is optimal for a fixed route and runs in O(n log n).
+
+    Returns a list of ``(station, gallons, cost)`` tuples in driving order,
+    where ``station`` indexes the input arrays, or ``None`` when a gap between
+    stations is longer than the tank range.
+    """
+    mile_markers = np.asarray(mile_markers, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    on_route = np.flatnonzero(mile_markers <= total_distance)
+    order = on_route[np.argsort(mile_markers[on_route], kind='stable')]
+    if len(order) == 0 or mile_markers[order[0]] > max_range:
+        return None
+
+    # The destination is appended as a free node so "next cheaper" can end there
+    miles = np.append(mile_markers[order], total_distance)
+    node_prices = np.append(prices[order], -np.inf)
+    destination = len(miles) - 1
+    capacity = max_range / mpg
+
+    next_cheaper = _next_cheaper(node_prices)
+    cheapest = _RangeArgmin(node_prices)
+
+    stops = []
+    owed = miles[0] / mpg
+    fuel = 0.0
+    i = 0
+    while i != destination:
+        j = int(next_cheaper[i])
+        if miles[j] - miles[i] <= max_range:
+            need = (miles[j] - miles[i]) / mpg
+            bought = max(need - fuel, 0.0)
+            fuel = max(fuel, need) - need
+            target = j
+        else:
+            hi = int(np.searchsorted(miles, miles[i] + max_range, side='right')) - 1
+            if hi <= i:
+                return None
+            target = int(cheapest.query(i + 1, hi))
+            bought = capacity - fuel
+            fuel = capacity - (miles[target] - miles[i]) / mpg
+
+        # A station at the destination buys nothing but still owes the approach
+        if bought > 0 or owed > 0:
+            gallons = bought + owed
+            owed = 0.0
+            stops.append((int(order[i]), gallons, gallons * node_prices[i]))
+        i = target
+
+    return stops
@@ -0,0 +1,109 @@
+import datetime
+import logging
+
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+from .models import FuelPriceHistory, FuelStation, StatePriceDaily
+
+logger = logging.getLogger(__name__)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def record_price_changes(station_ids, effective_at, batch_size=2000):
+    """Append the current price of ``station_ids`` to the history.
+
+    Stations that have no history yet (new ones, or every station the first
+    time this runs) are logged too, so each station's first row is its
+    starting price. Returns the number of rows written.
+    """
+    station_ids = list(station_ids)
+    rows = []
+    for start in range(0, len(station_ids), batch_size):
+        rows += FuelStation.objects.filter(id__in=station_ids[start:start + batch_size]).values_list(
+            'id', 'retail_price'
+        )
+    rows += FuelStation.objects.filter(price_history__isnull=True).values_list('id', 'retail_price')
+
+    history = {
+        station_id: FuelPriceHistory(station_id=station_id, price=price, effective_at=effective_at)
+        for station_id, price in rows
+    }
+    FuelPriceHistory.objects.bulk_create(history.values(), batch_size=batch_size)
+    return len(history)
+
+
+def record_state_rollup(day):
+    """Store today's per-state count/sum/min/max of current station prices."""
+    rollups = FuelStation.objects.values('state').annotate(
+        station_count=Count('id'),
+        price_sum=Sum('retail_price'),
+        price_min=Min('retail_price'),
+        price_max=Max('retail_price')
+    )
+    for rollup in rollups:
+        StatePriceDaily.objects.update_or_create(
+            state=rollup.pop('state'), date=day, defaults=rollup
+        )
+
+
+def station_price_on(station_id, day):
+    """Price a station was selling at by the end of ``day``, or ``None``."""
+    return FuelPriceHistory.objects.filter(
+        station_id=station_id, effective_at__lt=_day_start(day + datetime.timedelta(days=1))
+    ).order_by('-effective_at').values_list('price', flat=True).first()
+
+
+def station_price_series(station_id, start, end):
+    """Price changes for a station between two dates, including the price in effect at ``start``."""
+    since = _day_start(start)
+    opening = FuelPriceHistory.objects.filter(
+        station_id=station_id, effective_at__lt=since
+    ).order_by('-effective_at').values('price', 'effective_at')[:1]
+    changes = FuelPriceHistory.objects.filter(
+        station_id=station_id,
+        effective_at__gte=since,
+        effective_at__lt=_day_start(end + datetime.timedelta(days=1))
+    ).order_by('effective_at').values('price', 'effective_at')
+    return list(opening) + list(changes)
+
+
+def state_price_summary(state, days=30, end=None):
+    """Average, minimum and maximum price in ``state`` over the ``days`` days ending at ``end``.
+
+    Reads at most one rollup row per day. Days without an import carry the
+    previous day's prices forward, and the average is weighted by the
+    number of stations reporting each day.
+    """
+    end = end or timezone.localdate()
+    start = end - datetime.timedelta(days=days - 1)
+    rows = list(StatePriceDaily.objects.filter(state=state, date__range=(start, end)).order_by('date'))
+    if not rows or rows[0].date > start:
+        earlier = StatePriceDaily.objects.filter(state=state, date__lt=start).order_by('-date').first()
+        if earlier:
+            rows.insert(0, earlier)
+    if not rows:
+        return None
+
+    count = total = 0
+    low, high = None, None
+    for i, row in enumerate(rows):
+        following = rows[i + 1].date if i + 1 < len(rows) else end + datetime.timedelta(days=1)
+        covered = (following - max(row.date, start)).days
+        count += row.station_count * covered
+        total += row.price_sum * covered
+        low = row.price_min if low is None else min(low, row.price_min)
+        high = row.price_max if high is None else max(high, row.price_max)
+
+    return {
+        'state': state,
+        'start': start,
+        'end': end,
+        'average_price': round(total / count, 3) if count else None,
+        'min_price': low,
+        'max_price': high,
+        'days_reported': sum(1 for row in rows if row.date >= start),
+    }
@@ -0,0 +1,85 @@
+import polyline
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import stage
+
+COMPACT_MEDIA_TYPE = 'application/vnd.fuelapp.compact+json'
+
+
+def columns(rows):
+    """``[{"a": 1, "b": 2}, ...]`` as ``{"a": [1, ...], "b": [2, ...]}``; keys come from the first row."""
+    if not rows:
+        return {}
+    return {key: [row.get(key) for row in rows] for key in rows[0]}
+
+
+def compact_route(payload, precision=None):
+    """A route payload with the geometry as an encoded polyline and stations as columns.
+
+    ``route_geometry`` becomes ``route_polyline`` (Google encoded polyline,
+    latitude first) with its ``polyline_precision``; everything else is
+    unchanged. Error payloads pass through.
+    """
+    if not isinstance(payload, dict):
+        return payload
+    if 'results' in payload:
+        return {**payload, 'results': [compact_route(result, precision) for result in payload['results']]}
+
+    compact = dict(payload)
+    geometry = compact.pop('route_geometry', None)
+    if geometry is not None:
+        precision = settings.ROUTE_POLYLINE_PRECISION if precision is None else precision
+        compact['route_polyline'] = polyline.encode(geometry['coordinates'], precision, geojson=True)
+        compact['polyline_precision'] = precision
+    if isinstance(compact.get('stations'), list):
+        compact['stations'] = columns(compact['stations'])
+    return compact
+
+
+def polyline_precision(request):
+    """``?precision=`` of a compact request, clamped to 1-7 digits, or ``None`` for the default."""
+    try:
+        return min(max(int(request.GET['precision']), 1), 7)
+    except (KeyError, ValueError):
+        return None
+
+
+def wants_compact(request):
+    """Content negotiation for the plain Django route views: ``?format=compact`` or the Accept header."""
+    return request.GET.get('format') == 'compact' or COMPACT_MEDIA_TYPE in request.META.get('HTTP_ACCEPT', '')
+
+
+def route_json_response(request, data, status=200):
+    """``JsonResponse`` for the plain Django route views, compact when the client asked for it."""
+    with stage('render'):
+        if wants_compact(request):
+            response = JsonResponse(compact_route(data, polyline_precision(request)), status=status,
+                                    content_type=COMPACT_MEDIA_TYPE)
+        else:
+            response = JsonResponse(data, status=status)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` that reports serialization time as the ``render`` stage."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with stage('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class CompactRouteRenderer(TimedJSONRenderer):
+    """Route payloads through ``compact_route``; picked with ``?format=compact`` or its media type."""
+
+    media_type = COMPACT_MEDIA_TYPE
+    format = 'compact'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        request = (renderer_context or {}).get('request')
+        with stage('render'):
+            data = compact_route(data, polyline_precision(request) if request is not None else None)
+            return JSONRenderer.render(self, data, accepted_media_type, renderer_context)
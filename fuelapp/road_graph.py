@@ -0,0 +1,517 @@
+"""In-process road graph used to route without OSRM.
+
+``manage.py build_road_graph`` turns a GeoJSON road extract into a ``.npz``
+file; ``RoadGraph.route`` answers fastest-route queries on it with A* and
+landmark (ALT) lower bounds, returning the same JSON shape as OSRM's
+``/route`` service.
+"""
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .geometry import EARTH_RADIUS_MILES, haversine_miles
+
+logger = logging.getLogger(__name__)
+
+METERS_PER_MILE = 1609.344
+EARTH_RADIUS_METERS = EARTH_RADIUS_MILES * METERS_PER_MILE
+
+# Free-flow speeds (mph) by OSM highway class, used when a way has no maxspeed
+HIGHWAY_SPEEDS_MPH = {
+    'motorway': 65, 'motorway_link': 45,
+    'trunk': 55, 'trunk_link': 40,
+    'primary': 50, 'primary_link': 35,
+    'secondary': 45, 'secondary_link': 30,
+    'tertiary': 35, 'tertiary_link': 25,
+    'unclassified': 30, 'road': 30, 'residential': 25, 'service': 15, 'living_street': 10,
+}
+DEFAULT_HIGHWAYS = (
+    'motorway', 'motorway_link', 'trunk', 'trunk_link', 'primary', 'primary_link',
+    'secondary', 'secondary_link', 'tertiary', 'tertiary_link',
+)
+DEFAULT_SPEED_MPH = 30
+DENSIFY_MILES = 0.25  # longest gap between shape points, so snapping lands close to the road
+MAX_SNAP_MILES = 25  # endpoints farther than this from any road get no route
+SNAP_CELL_DEGREES = 0.05
+LANDMARKS = 8
+
+GRAPH_ARRAYS = (
+    'node_lat', 'node_lon', 'seg_from', 'seg_to', 'seg_meters', 'seg_seconds', 'seg_forward',
+    'seg_backward', 'shape_offsets', 'shape_lat', 'shape_lon', 'shape_along',
+)
+
+
+def parse_maxspeed(value):
+    """OSM ``maxspeed`` ("65 mph", "100", "100 km/h") in mph, or ``None``."""
+    match = re.match(r'\s*(\d+(?:\.\d+)?)\s*(mph|km/h|kmh|kph)?', str(value or ''))
+    if not match:
+        return None
+    speed = float(match.group(1))
+    return speed if match.group(2) == 'mph' else speed / 1.609344
+
+
+def way_directions(properties):
+    """``(forward, backward)`` travel allowed along the digitised direction of a way."""
+    oneway = str(properties.get('oneway', '')).lower()
+    if oneway in ('yes', 'true', '1'):
+        return True, False
+    if oneway in ('-1', 'reverse'):
+        return False, True
+    if oneway == 'no':
+        return True, True
+    # Motorways and roundabouts are one way unless tagged otherwise
+    if properties.get('highway') == 'motorway' or properties.get('junction') == 'roundabout':
+        return True, False
+    return True, True
+
+
+def _densify(coords, max_miles):
+    lats, lons = coords[:, 1], coords[:, 0]
+    gaps = haversine_miles(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    pieces = np.maximum(np.ceil(gaps / max_miles).astype(np.int64), 1)
+    if pieces.max() == 1:
+        return coords
+    parts = []
+    for i, n in enumerate(pieces):
+        t = np.arange(n)[:, None] / n
+        parts.append(coords[i] + (coords[i + 1] - coords[i]) * t)
+    parts.append(coords[-1:])
+    return np.concatenate(parts)
+
+
+def read_ways(path, highways=DEFAULT_HIGHWAYS):
+    """Road ways from a GeoJSON file as ``(coords, speed_mph, forward, backward)``.
+
+    Features are LineStrings or MultiLineStrings with OSM tags as properties,
+    as written by ``osmium export``. ``speed_mph`` overrides ``maxspeed``;
+    features with a ``highway`` tag outside ``highways`` are skipped.
+    """
+    with open(path) as f:
+        features = json.load(f).get('features', [])
+
+    ways = []
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        properties = feature.get('properties') or {}
+        highway = properties.get('highway')
+        if highway and highways and highway not in highways:
+            continue
+        if geometry.get('type') == 'LineString':
+            lines = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiLineString':
+            lines = geometry['coordinates']
+        else:
+            continue
+
+        speed = (parse_maxspeed(properties.get('speed_mph'))
+                 or parse_maxspeed(properties.get('maxspeed'))
+                 or HIGHWAY_SPEEDS_MPH.get(highway, DEFAULT_SPEED_MPH))
+        forward, backward = way_directions(properties)
+        for line in lines:
+            coords = np.asarray(line, dtype=np.float64)[:, :2]
+            if len(coords) < 2:
+                continue
+            # Drop repeated vertices so no piece has zero length
+            keep = np.ones(len(coords), dtype=bool)
+            keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+            coords = coords[keep]
+            if len(coords) >= 2:
+                ways.append((coords, speed, forward, backward))
+    return ways
+
+
+def build_graph_arrays(ways, landmarks=LANDMARKS):
+    """Turn ways into graph arrays: intersections become nodes, the road between them segments.
+
+    A vertex is a node when it ends a way or is shared by several ways
+    (matched on exact coordinates, as OSM ways share node positions).
+    """
+    if not ways:
+        raise ValueError('No road ways to build a graph from')
+
+    lengths = np.array([len(coords) for coords, *_ in ways])
+    starts = np.concatenate([[0], np.cumsum(lengths)])
+    coords = np.concatenate([coords for coords, *_ in ways])
+    fixed = np.round(coords * 1e7).astype(np.int64)
+    keys = (fixed[:, 1] + 900_000_000) * 3_600_000_001 + (fixed[:, 0] + 1_800_000_000)
+    unique_keys, vertex_of, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+    is_node = counts[vertex_of] > 1
+    is_node[starts[:-1]] = True
+    is_node[starts[1:] - 1] = True
+    node_vertices = np.unique(vertex_of[is_node])
+    node_id = np.full(len(unique_keys), -1, dtype=np.int64)
+    node_id[node_vertices] = np.arange(len(node_vertices))
+    first_seen = np.full(len(unique_keys), len(coords), dtype=np.int64)
+    np.minimum.at(first_seen, vertex_of, np.arange(len(coords)))
+    node_lat = coords[first_seen[node_vertices], 1]
+    node_lon = coords[first_seen[node_vertices], 0]
+
+    seg_from, seg_to, seg_meters, seg_seconds, seg_forward, seg_backward = [], [], [], [], [], []
+    shapes, alongs = [], []
+    for (way_coords, speed, forward, backward), start in zip(ways, starts[:-1]):
+        cuts = np.flatnonzero(is_node[start:start + len(way_coords)])
+        for a, b in zip(cuts[:-1], cuts[1:]):
+            shape = _densify(way_coords[a:b + 1], DENSIFY_MILES)
+            along = np.zeros(len(shape))
+            along[1:] = np.cumsum(haversine_miles(shape[:-1, 1], shape[:-1, 0], shape[1:, 1], shape[1:, 0]))
+            along *= METERS_PER_MILE
+            seg_from.append(node_id[vertex_of[start + a]])
+            seg_to.append(node_id[vertex_of[start + b]])
+            seg_meters.append(along[-1])
+            seg_seconds.append(along[-1] / (speed * METERS_PER_MILE / 3600))
+            seg_forward.append(forward)
+            seg_backward.append(backward)
+            shapes.append(shape)
+            alongs.append(along)
+
+    shape = np.concatenate(shapes)
+    arrays = {
+        'node_lat': node_lat,
+        'node_lon': node_lon,
+        'seg_from': np.array(seg_from, dtype=np.int32),
+        'seg_to': np.array(seg_to, dtype=np.int32),
+        'seg_meters': np.array(seg_meters),
+        'seg_seconds': np.array(seg_seconds),
+        'seg_forward': np.array(seg_forward, dtype=bool),
+        'seg_backward': np.array(seg_backward, dtype=bool),
+        'shape_offsets': np.concatenate([[0], np.cumsum([len(s) for s in shapes])]).astype(np.int64),
+        'shape_lat': shape[:, 1].copy(),
+        'shape_lon': shape[:, 0].copy(),
+        'shape_along': np.concatenate(alongs),
+    }
+    arrays.update(RoadGraph(arrays).landmark_arrays(landmarks))
+    return arrays
+
+
+def save_graph_arrays(path, arrays):
+    """Write graph arrays to ``path`` atomically, so serving workers never load a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _dijkstra(n_nodes, edge_start, edge_to, edge_cost, source):
+    dist = [math.inf] * n_nodes
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        for e in range(edge_start[node], edge_start[node + 1]):
+            nd = d + edge_cost[e]
+            other = edge_to[e]
+            if nd < dist[other]:
+                dist[other] = nd
+                heapq.heappush(heap, (nd, other))
+    return dist
+
+
+class RoadGraph:
+    """Directed road graph with fastest-route queries.
+
+    Segments are the roads between intersections and keep their full shape,
+    so a route's geometry is as detailed as the source data. Queries snap
+    each endpoint to the nearest shape point, then run A* on travel time.
+    The heuristic is the larger of straight-line distance at the network's
+    top speed and the landmark bounds ``d(L, t) - d(L, n)`` and
+    ``d(n, L) - d(t, L)``, both admissible, which keeps the search close to
+    the actual route instead of a circle around the start.
+    """
+
+    def __init__(self, arrays, path=None):
+        self.path = path
+        self.stamp = None
+        for name in GRAPH_ARRAYS:
+            setattr(self, name, np.asarray(arrays[name]))
+        self.n_nodes = len(self.node_lat)
+        self.max_speed = float(np.max(self.seg_meters / np.maximum(self.seg_seconds, 1e-9)))
+
+        # Directed edges: each segment forward and/or backward
+        segments = np.arange(len(self.seg_from))
+        fwd, bwd = self.seg_forward, self.seg_backward
+        src = np.concatenate([self.seg_from[fwd], self.seg_to[bwd]])
+        dst = np.concatenate([self.seg_to[fwd], self.seg_from[bwd]])
+        edge_seg = np.concatenate([segments[fwd], segments[bwd]])
+        edge_reverse = np.concatenate([np.zeros(fwd.sum(), dtype=bool), np.ones(bwd.sum(), dtype=bool)])
+        self._edges = (src, dst, self.seg_seconds[edge_seg])
+        order = np.argsort(src, kind='stable')
+        self.edge_start = np.searchsorted(src[order], np.arange(self.n_nodes + 1)).tolist()
+        self.edge_from = src[order].tolist()
+        self.edge_to = dst[order].tolist()
+        self.edge_cost = self.seg_seconds[edge_seg[order]].tolist()
+        self.edge_seg = edge_seg[order].tolist()
+        self.edge_reverse = edge_reverse[order].tolist()
+        self.node_lat_list = self.node_lat.tolist()
+        self.node_lon_list = self.node_lon.tolist()
+
+        self.shape_seg = np.repeat(segments, np.diff(self.shape_offsets))
+        cells = self._cells(self.shape_lat, self.shape_lon)
+        self._cell_order = np.argsort(cells, kind='stable')
+        self._sorted_cells = cells[self._cell_order]
+
+        self.landmark_count = 0
+        self.landmark_from = self.landmark_to = None
+        if 'landmark_from' in arrays and len(arrays['landmark_nodes']):
+            self.landmark_count = len(arrays['landmark_nodes'])
+            self.landmark_from = np.asarray(arrays['landmark_from'], dtype=np.float32)
+            self.landmark_to = np.asarray(arrays['landmark_to'], dtype=np.float32)
+
+    def __len__(self):
+        return self.n_nodes
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        graph = cls(arrays, path)
+        logger.info(f"Loaded road graph {path}: {graph.n_nodes} nodes, {len(graph.edge_to)} edges")
+        return graph
+
+    def landmark_arrays(self, count=LANDMARKS):
+        """Pick ``count`` landmarks around the network's edge and time every node to and from them."""
+        if count <= 0 or not self.n_nodes:
+            return {'landmark_nodes': np.zeros(0, dtype=np.int64),
+                    'landmark_from': np.zeros((0, self.n_nodes), dtype=np.float32),
+                    'landmark_to': np.zeros((0, self.n_nodes), dtype=np.float32)}
+
+        src, dst, cost = self._edges
+        order = np.argsort(dst, kind='stable')
+        reverse_start = np.searchsorted(dst[order], np.arange(self.n_nodes + 1)).tolist()
+        reverse_to = src[order].tolist()
+        reverse_cost = cost[order].tolist()
+
+        # Candidates are nodes in the main component around the centre of the network
+        lat0, lon0 = float(np.mean(self.node_lat)), float(np.mean(self.node_lon))
+        centre = int(np.argmin(haversine_miles(self.node_lat, self.node_lon, lat0, lon0)))
+        reach = np.isfinite(_dijkstra(self.n_nodes, self.edge_start, self.edge_to, self.edge_cost, centre))
+        reach &= np.isfinite(_dijkstra(self.n_nodes, reverse_start, reverse_to, reverse_cost, centre))
+
+        # The farthest candidate in each of ``count`` equal angular sectors
+        angle = np.arctan2(self.node_lat - lat0, (self.node_lon - lon0) * math.cos(math.radians(lat0)))
+        sector = ((angle + math.pi) / (2 * math.pi) * count).astype(np.int64) % count
+        spread = haversine_miles(self.node_lat, self.node_lon, lat0, lon0)
+        nodes = []
+        for i in range(count):
+            candidates = np.flatnonzero(reach & (sector == i))
+            if len(candidates):
+                nodes.append(int(candidates[np.argmax(spread[candidates])]))
+
+        landmark_from = np.array(
+            [_dijkstra(self.n_nodes, self.edge_start, self.edge_to, self.edge_cost, node) for node in nodes],
+            dtype=np.float32
+        ).reshape(len(nodes), self.n_nodes)
+        landmark_to = np.array(
+            [_dijkstra(self.n_nodes, reverse_start, reverse_to, reverse_cost, node) for node in nodes],
+            dtype=np.float32
+        ).reshape(len(nodes), self.n_nodes)
+        return {'landmark_nodes': np.array(nodes, dtype=np.int64),
+                'landmark_from': landmark_from, 'landmark_to': landmark_to}
+
+    def _cells(self, lat, lon):
+        row = np.floor(np.asarray(lat) / SNAP_CELL_DEGREES).astype(np.int64)
+        col = np.floor(np.asarray(lon) / SNAP_CELL_DEGREES).astype(np.int64)
+        return row * 100_000 + col
+
+    def snap(self, lat, lon):
+        """Index of the shape point nearest ``(lat, lon)`` and its distance in miles, or ``None``."""
+        row = math.floor(lat / SNAP_CELL_DEGREES)
+        col = math.floor(lon / SNAP_CELL_DEGREES)
+        candidates = np.concatenate([
+            self._cell_order[np.searchsorted(self._sorted_cells, r * 100_000 + col - 1, 'left'):
+                             np.searchsorted(self._sorted_cells, r * 100_000 + col + 1, 'right')]
+            for r in (row - 1, row, row + 1)
+        ])
+        # The 3x3 block is only guaranteed to hold the nearest point within one cell of the query
+        cell_miles = SNAP_CELL_DEGREES * EARTH_RADIUS_MILES * math.radians(1) * math.cos(math.radians(lat))
+        distances = haversine_miles(self.shape_lat[candidates], self.shape_lon[candidates], lat, lon)
+        if not len(candidates) or distances.min() > cell_miles:
+            candidates = np.arange(len(self.shape_lat))
+            distances = haversine_miles(self.shape_lat, self.shape_lon, lat, lon)
+        if not len(candidates):
+            return None
+        best = int(np.argmin(distances))
+        if distances[best] > MAX_SNAP_MILES:
+            return None
+        return int(candidates[best]), float(distances[best])
+
+    def _heuristic(self, end_lat, end_lon, targets):
+        """Lower bound on the seconds from every node to the end point, as a list indexed by node."""
+        seconds = haversine_miles(self.node_lat, self.node_lon, end_lat, end_lon) * (METERS_PER_MILE / self.max_speed)
+        if self.landmark_count:
+            landmark = np.full(self.n_nodes, np.inf, dtype=np.float32)
+            for node, (extra, _) in targets.items():
+                # fmax skips the nan of inf - inf (neither node reachable from a landmark)
+                bound = np.fmax(
+                    np.fmax.reduce(self.landmark_from[:, node:node + 1] - self.landmark_from, axis=0),
+                    np.fmax.reduce(self.landmark_to - self.landmark_to[:, node:node + 1], axis=0)
+                )
+                np.minimum(landmark, np.fmax(bound, 0) + np.float32(extra), out=landmark)
+            seconds = np.fmax(seconds, landmark)
+        return seconds.tolist()
+
+    def _segment_shape(self, seg, reverse=False, start=None, end=None):
+        """``(lons, lats)`` of ``seg`` from shape point ``start`` to ``end`` (default: its ends)."""
+        lo, hi = self.shape_offsets[seg], self.shape_offsets[seg + 1] - 1
+        start = (hi if reverse else lo) if start is None else start
+        end = (lo if reverse else hi) if end is None else end
+        if not reverse:
+            return self.shape_lon[start:end + 1], self.shape_lat[start:end + 1]
+        return self.shape_lon[end:start + 1][::-1], self.shape_lat[end:start + 1][::-1]
+
+    def route(self, start_lon, start_lat, end_lon, end_lat):
+        """Fastest route as an OSRM ``/route`` response, or ``None`` when there is none."""
+        start, end = self.snap(start_lat, start_lon), self.snap(end_lat, end_lon)
+        if start is None or end is None:
+            return None
+        start_point, end_point = start[0], end[0]
+        s_seg, e_seg = int(self.shape_seg[start_point]), int(self.shape_seg[end_point])
+        s_share = self.shape_along[start_point] / max(self.seg_meters[s_seg], 1e-9)
+        e_share = self.shape_along[end_point] / max(self.seg_meters[e_seg], 1e-9)
+
+        # Leave the start segment through either end node: node -> (seconds, reverse)
+        seeds = {}
+        if self.seg_forward[s_seg]:
+            seeds[int(self.seg_to[s_seg])] = (self.seg_seconds[s_seg] * (1 - s_share), False)
+        if self.seg_backward[s_seg]:
+            cost = self.seg_seconds[s_seg] * s_share
+            node = int(self.seg_from[s_seg])
+            if cost < seeds.get(node, (math.inf,))[0]:
+                seeds[node] = (cost, True)
+        # A point on an intersection can leave it along any road, whatever the segment's direction
+        if s_share <= 0:
+            seeds[int(self.seg_from[s_seg])] = (0.0, True)
+        elif s_share >= 1:
+            seeds[int(self.seg_to[s_seg])] = (0.0, False)
+        # ...and enter the end segment through either end node
+        targets = {}
+        if self.seg_forward[e_seg]:
+            targets[int(self.seg_from[e_seg])] = (self.seg_seconds[e_seg] * e_share, False)
+        if self.seg_backward[e_seg]:
+            cost = self.seg_seconds[e_seg] * (1 - e_share)
+            node = int(self.seg_to[e_seg])
+            if cost < targets.get(node, (math.inf,))[0]:
+                targets[node] = (cost, True)
+        if e_share <= 0:
+            targets[int(self.seg_from[e_seg])] = (0.0, False)
+        elif e_share >= 1:
+            targets[int(self.seg_to[e_seg])] = (0.0, True)
+
+        # Both points on one segment, in a direction it can be driven
+        best, best_node = math.inf, None
+        if s_seg == e_seg:
+            if self.seg_forward[s_seg] and e_share >= s_share:
+                best = self.seg_seconds[s_seg] * (e_share - s_share)
+            elif self.seg_backward[s_seg] and e_share <= s_share:
+                best = self.seg_seconds[s_seg] * (s_share - e_share)
+
+        h = self._heuristic(end_lat, end_lon, targets)
+        dist, parent, heap = {}, {}, []
+        for node, (cost, _) in seeds.items():
+            dist[node] = cost
+            parent[node] = -1
+            heap.append((cost + h[node], cost, node))
+        heapq.heapify(heap)
+        edge_start, edge_to, edge_cost = self.edge_start, self.edge_to, self.edge_cost
+        while heap:
+            f, g, node = heapq.heappop(heap)
+            if f >= best:
+                break
+            if g > dist[node]:
+                continue
+            target = targets.get(node)
+            if target is not None and g + target[0] < best:
+                best, best_node = g + target[0], node
+            for e in range(edge_start[node], edge_start[node + 1]):
+                other = edge_to[e]
+                ng = g + edge_cost[e]
+                if ng < dist.get(other, math.inf):
+                    dist[other] = ng
+                    parent[other] = e
+                    heapq.heappush(heap, (ng + h[other], ng, other))
+
+        if best == math.inf:
+            return None
+
+        if best_node is None:
+            pieces = [self._segment_shape(s_seg, e_share < s_share, start_point, end_point)]
+            meters = abs(self.shape_along[end_point] - self.shape_along[start_point])
+        else:
+            edges = []
+            node = best_node
+            while parent[node] != -1:
+                edges.append(parent[node])
+                node = self.edge_from[parent[node]]
+            edges.reverse()
+
+            leave_reverse = seeds[node][1]
+            enter_reverse = targets[best_node][1]
+            pieces = [self._segment_shape(s_seg, leave_reverse, start_point)]
+            pieces += [self._segment_shape(self.edge_seg[e], self.edge_reverse[e]) for e in edges]
+            pieces.append(self._segment_shape(e_seg, enter_reverse, None, end_point))
+            meters = (self.seg_meters[s_seg] * (s_share if leave_reverse else 1 - s_share)
+                      + sum(self.seg_meters[self.edge_seg[e]] for e in edges)
+                      + self.seg_meters[e_seg] * (1 - e_share if enter_reverse else e_share))
+
+        lons = np.concatenate([lons for lons, _ in pieces])
+        lats = np.concatenate([lats for _, lats in pieces])
+        # Consecutive pieces share their joining node
+        keep = np.ones(len(lons), dtype=bool)
+        keep[1:] = (lons[1:] != lons[:-1]) | (lats[1:] != lats[:-1])
+        coordinates = np.column_stack([lons[keep], lats[keep]]).tolist()
+        if len(coordinates) == 1:
+            coordinates.append(coordinates[0])
+
+        return {
+            'code': 'Ok',
+            'routes': [{
+                'geometry': {'type': 'LineString', 'coordinates': coordinates},
+                'distance': float(meters),
+                'duration': float(best),
+                'weight': float(best),
+                'weight_name': 'duration',
+            }],
+            'waypoints': [
+                {'location': [float(self.shape_lon[point]), float(self.shape_lat[point])],
+                 'distance': snap_miles * METERS_PER_MILE, 'name': ''}
+                for point, snap_miles in (start, end)
+            ],
+        }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_road_graph():
+    """Return the process-wide graph from ``ROAD_GRAPH_FILE``, reloading it when the file changes.
+
+    ``None`` when no graph file is configured or it cannot be read.
+    """
+    global _graph
+    path = settings.ROAD_GRAPH_FILE
+    if not path:
+        return None
+    try:
+        stamp = (path, os.stat(path).st_mtime_ns)
+    except OSError as e:
+        logger.error(f"Road graph unavailable: {str(e)}")
+        return None
+
+    graph = _graph
+    if graph is not None and graph.stamp == stamp:
+        return graph
+    with _graph_lock:
+        if _graph is None or _graph.stamp != stamp:
+            graph = RoadGraph.load(path)
+            graph.stamp = stamp
+            _graph = graph
+        return _graph
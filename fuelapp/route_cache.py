@@ -0,0 +1,180 @@
+"""Route cache keyed on quantized coordinates.
+
+Keys round both endpoints to a grid derived from
+``ROUTE_CACHE_TOLERANCE_MILES`` (see ``key_precision``), so requests a few
+meters apart (or geocodes that drift by an ulp) share one entry. Each entry
+keeps the coordinates it was computed for, and is only reused when the
+request is within the tolerance of them.
+
+Optionally a cached A -> B route also answers B -> A
+(``ROUTE_CACHE_REVERSE``), and any part of a recently computed route
+answers a trip between two points on it (``ROUTE_CACHE_SUBPATHS``): every
+part of a fastest route is itself a fastest route.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .geometry import cumulative_miles, distance_to_polyline, haversine_miles
+from .metrics import ROUTE_CACHE_OFFSET
+
+MILES_PER_DEGREE_LAT = 69.0
+
+
+def key_precision(tolerance_miles):
+    """Decimal places of the finest key grid whose cells are at least ``tolerance_miles`` tall.
+
+    With finer cells every entry sharing a request's key would already be
+    within tolerance, so the tolerance check could never reject anything;
+    at 0.25 miles this gives 2 places (cells about 0.7 miles tall).
+    """
+    if tolerance_miles <= 0:
+        return 6  # exact reuse only; about 0.1 m
+    return max(0, math.floor(math.log10(MILES_PER_DEGREE_LAT / tolerance_miles)))
+
+
+def route_cache_key(start_lon, start_lat, end_lon, end_lat):
+    precision = key_precision(settings.ROUTE_CACHE_TOLERANCE_MILES)
+    # + 0.0 folds -0.0 into 0.0 so both round to the same key
+    parts = [f"{round(value, precision) + 0.0:.{precision}f}" for value in (start_lon, start_lat, end_lon, end_lat)]
+    return f"route_{precision}_{'_'.join(parts)}"
+
+
+def _offset(query, coords):
+    """Larger of the start and end distances (miles) between a cached query and a request."""
+    (slon, slat, elon, elat), (qslon, qslat, qelon, qelat) = coords, query
+    return float(max(haversine_miles(slat, slon, qslat, qslon), haversine_miles(elat, elon, qelat, qelon)))
+
+
+def _usable(entry, coords):
+    if not entry:
+        return False
+    offset = _offset(entry['query'], coords)
+    ROUTE_CACHE_OFFSET.observe(offset)
+    return offset <= settings.ROUTE_CACHE_TOLERANCE_MILES
+
+
+def reverse_route(route_data):
+    """An A -> B route as B -> A: same roads, distance and duration, geometry reversed."""
+    route = route_data['routes'][0]
+    reversed_route = {key: value for key, value in route.items() if key != 'legs'}
+    reversed_route['geometry'] = {**route['geometry'], 'coordinates': route['geometry']['coordinates'][::-1]}
+    return {**route_data, 'routes': [reversed_route], 'waypoints': route_data.get('waypoints', [])[::-1]}
+
+
+class RecentRoutes:
+    """Geometry of the last ``size`` routes computed by this process, for sub-path lookups."""
+
+    def __init__(self, size):
+        self.size = size
+        self.routes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key, route_data):
+        route = route_data['routes'][0]
+        coordinates = np.asarray(route['geometry']['coordinates'], dtype=np.float64)
+        if len(coordinates) < 2:
+            return
+        lons, lats = coordinates[:, 0], coordinates[:, 1]
+        entry = {
+            'lats': lats,
+            'lons': lons,
+            'marks': cumulative_miles(lats, lons),
+            'bounds': (lats.min(), lats.max(), lons.min(), lons.max()),
+            'distance': route['distance'],
+            'duration': route['duration'],
+        }
+        with self._lock:
+            self.routes[key] = entry
+            self.routes.move_to_end(key)
+            while len(self.routes) > self.size:
+                self.routes.popitem(last=False)
+
+    def subpath(self, start_lon, start_lat, end_lon, end_lat, tolerance_miles):
+        """The stretch of a recent route running from near the start to near the end, or ``None``."""
+        margin = tolerance_miles / MILES_PER_DEGREE_LAT
+        lats = np.array([start_lat, end_lat])
+        lons = np.array([start_lon, end_lon])
+        with self._lock:
+            candidates = list(self.routes.values())
+        for entry in reversed(candidates):
+            south, north, west, east = entry['bounds']
+            pad = margin / max(np.cos(np.radians(max(abs(south), abs(north)))), 0.01)
+            if not (south - margin <= lats.min() and lats.max() <= north + margin
+                    and west - pad <= lons.min() and lons.max() <= east + pad):
+                continue
+            distances, markers = distance_to_polyline(lats, lons, entry['lats'], entry['lons'],
+                                                      marks=entry['marks'])
+            if distances.max() > tolerance_miles or markers[0] >= markers[1]:
+                continue
+            return self._slice(entry, *markers)
+        return None
+
+    def _slice(self, entry, start_mark, end_mark):
+        marks = entry['marks']
+        inner = (marks > start_mark) & (marks < end_mark)
+        lats = np.concatenate([[np.interp(start_mark, marks, entry['lats'])], entry['lats'][inner],
+                               [np.interp(end_mark, marks, entry['lats'])]])
+        lons = np.concatenate([[np.interp(start_mark, marks, entry['lons'])], entry['lons'][inner],
+                               [np.interp(end_mark, marks, entry['lons'])]])
+        # Distance and time pro rata along the route
+        share = (end_mark - start_mark) / marks[-1] if marks[-1] else 0.0
+        return {
+            'code': 'Ok',
+            'routes': [{
+                'geometry': {'type': 'LineString', 'coordinates': np.column_stack([lons, lats]).tolist()},
+                'distance': entry['distance'] * share,
+                'duration': entry['duration'] * share,
+            }],
+            'waypoints': [{'location': [float(lons[0]), float(lats[0])]},
+                          {'location': [float(lons[-1]), float(lats[-1])]}],
+        }
+
+
+recent_routes = RecentRoutes(settings.ROUTE_CACHE_SUBPATH_ROUTES)
+
+
+def get_cached_route(start_lon, start_lat, end_lon, end_lat):
+    """``(route_data, outcome)`` from the cache; ``outcome`` labels the lookup for metrics.
+
+    Outcomes are ``hit``, ``reverse`` and ``subpath`` for reuse, and
+    ``out_of_tolerance`` or ``miss`` when the route has to be computed.
+    """
+    coords = (start_lon, start_lat, end_lon, end_lat)
+    entry = cache.get(route_cache_key(*coords))
+    if _usable(entry, coords):
+        return entry['route'], 'hit'
+    outcome = 'out_of_tolerance' if entry else 'miss'
+
+    if settings.ROUTE_CACHE_REVERSE:
+        reverse_coords = (end_lon, end_lat, start_lon, start_lat)
+        reverse_entry = cache.get(route_cache_key(*reverse_coords))
+        if _usable(reverse_entry, reverse_coords):
+            return reverse_route(reverse_entry['route']), 'reverse'
+
+    if settings.ROUTE_CACHE_SUBPATHS:
+        route_data = recent_routes.subpath(*coords, settings.ROUTE_CACHE_TOLERANCE_MILES)
+        if route_data:
+            return route_data, 'subpath'
+    return None, outcome
+
+
+def get_stale_route(start_lon, start_lat, end_lon, end_lat):
+    """Last good route for this key, kept for ``UPSTREAM_STALE_TIMEOUT`` to ride out outages."""
+    coords = (start_lon, start_lat, end_lon, end_lat)
+    entry = cache.get(f"stale_{route_cache_key(*coords)}")
+    return entry['route'] if _usable(entry, coords) else None
+
+
+def store_route(start_lon, start_lat, end_lon, end_lat, route_data, timeout):
+    coords = (start_lon, start_lat, end_lon, end_lat)
+    key = route_cache_key(*coords)
+    entry = {'query': coords, 'route': route_data}
+    cache.set(key, entry, timeout)
+    cache.set(f"stale_{key}", entry, settings.UPSTREAM_STALE_TIMEOUT)
+    if settings.ROUTE_CACHE_SUBPATHS:
+        recent_routes.add(key, route_data)
@@ -0,0 +1,181 @@
+"""Routing backends, tried in ``ROUTING_BACKENDS`` order.
+
+Every backend returns an OSRM ``/route`` shaped response (``routes[0]``
+with a GeoJSON ``geometry``, ``distance`` in meters and ``duration`` in
+seconds), ``None`` when it has no route, or raises ``UpstreamError`` when
+it cannot answer at all.
+"""
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .metrics import ROUTING_RESULTS
+from .road_graph import get_road_graph
+from .upstream import UPSTREAM_EXECUTOR, UpstreamError, get_upstream
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingBackend:
+    name = None
+
+    def route(self, start_lon, start_lat, end_lon, end_lat):
+        raise NotImplementedError
+
+    def table(self, coordinates, sources, destinations):
+        """``(distances, durations)`` between ``(lon, lat)`` points, in meters and seconds.
+
+        Rows follow ``sources`` and columns ``destinations`` (indexes into
+        ``coordinates``); unreachable pairs are ``None``. Backends without
+        distance tables raise ``NotImplementedError``.
+        """
+        raise NotImplementedError
+
+    async def aroute(self, start_lon, start_lat, end_lon, end_lat):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            UPSTREAM_EXECUTOR, lambda: self.route(start_lon, start_lat, end_lon, end_lat)
+        )
+
+
+class OSRMBackend(RoutingBackend):
+    """The OSRM HTTP service at ``OSRM_ENDPOINT``."""
+
+    name = 'osrm'
+
+    def request(self, start_lon, start_lat, end_lon, end_lat):
+        path = f"/route/v1/driving/{start_lon},{start_lat};{end_lon},{end_lat}"
+        return path, {'overview': 'full', 'geometries': 'geojson'}
+
+    def check(self, status_code, route_data):
+        if status_code != 200:
+            logger.error(f"OSRM API error: Status {status_code}")
+            return None
+
+        if route_data.get('code') != 'Ok':
+            logger.error(f"OSRM route error: {route_data.get('message', 'Unknown error')}")
+            return None
+
+        if not route_data.get('routes') or not route_data['routes'][0].get('geometry'):
+            logger.error("OSRM response missing route geometry")
+            return None
+
+        return route_data
+
+    def route(self, start_lon, start_lat, end_lon, end_lat):
+        path, params = self.request(start_lon, start_lat, end_lon, end_lat)
+        return self.check(*get_upstream('osrm').get_json(path, params))
+
+    async def aroute(self, start_lon, start_lat, end_lon, end_lat):
+        path, params = self.request(start_lon, start_lat, end_lon, end_lat)
+        return self.check(*await get_upstream('osrm').aget_json(path, params))
+
+    def table(self, coordinates, sources, destinations):
+        path = "/table/v1/driving/" + ";".join(f"{lon},{lat}" for lon, lat in coordinates)
+        params = {
+            'sources': ';'.join(map(str, sources)),
+            'destinations': ';'.join(map(str, destinations)),
+            'annotations': 'distance,duration',
+        }
+        status_code, table_data = get_upstream('osrm').get_json(path, params)
+        if status_code != 200 or table_data.get('code') != 'Ok':
+            logger.error(f"OSRM table error: Status {status_code} {table_data.get('message', '')}")
+            return None
+        return table_data['distances'], table_data['durations']
+
+
+class LocalGraphBackend(RoutingBackend):
+    """In-process A* over the road graph in ``ROAD_GRAPH_FILE`` (see ``build_road_graph``)."""
+
+    name = 'local'
+
+    def route(self, start_lon, start_lat, end_lon, end_lat):
+        graph = get_road_graph()
+        if graph is None:
+            raise UpstreamError("local: no road graph loaded (set ROAD_GRAPH_FILE)")
+        return graph.route(start_lon, start_lat, end_lon, end_lat)
+
+
+BACKENDS = {
+    'osrm': OSRMBackend,
+    'local': LocalGraphBackend,
+}
+
+_backends = None
+_backends_lock = threading.Lock()
+
+
+def get_routing_backends():
+    """Backend instances for ``ROUTING_BACKENDS``: built-in names or dotted class paths."""
+    global _backends
+    names = tuple(settings.ROUTING_BACKENDS)
+    backends = _backends
+    if backends is not None and backends[0] == names:
+        return backends[1]
+    with _backends_lock:
+        if _backends is None or _backends[0] != names:
+            _backends = (names, [
+                BACKENDS[name]() if name in BACKENDS else import_string(name)() for name in names
+            ])
+        return _backends[1]
+
+
+def _record(backend, route_data):
+    ROUTING_RESULTS.inc(backend=backend.name, result='ok' if route_data else 'no_route')
+    return route_data
+
+
+def _failed(backend, error):
+    ROUTING_RESULTS.inc(backend=backend.name, result='error')
+    logger.warning(f"{backend.name} routing failed, trying the next backend: {str(error)}")
+
+
+def route_between(start_lon, start_lat, end_lon, end_lat):
+    """First route any backend finds; ``UpstreamError`` only when every backend failed."""
+    backends = get_routing_backends()
+    errors = []
+    for backend in backends:
+        try:
+            route_data = _record(backend, backend.route(start_lon, start_lat, end_lon, end_lat))
+        except UpstreamError as e:
+            _failed(backend, e)
+            errors.append(e)
+            continue
+        if route_data:
+            return route_data
+    if errors and len(errors) == len(backends):
+        raise errors[-1]
+    return None
+
+
+async def aroute_between(start_lon, start_lat, end_lon, end_lat):
+    """``route_between`` for the async views."""
+    backends = get_routing_backends()
+    errors = []
+    for backend in backends:
+        try:
+            route_data = _record(backend, await backend.aroute(start_lon, start_lat, end_lon, end_lat))
+        except UpstreamError as e:
+            _failed(backend, e)
+            errors.append(e)
+            continue
+        if route_data:
+            return route_data
+    if errors and len(errors) == len(backends):
+        raise errors[-1]
+    return None
+
+
+def table_between(coordinates, sources, destinations):
+    """Distance table from the first backend that has one; ``None`` when none can answer."""
+    for backend in get_routing_backends():
+        try:
+            return backend.table(coordinates, sources, destinations)
+        except NotImplementedError:
+            continue
+        except UpstreamError as e:
+            logger.warning(f"{backend.name} distance table failed, trying the next backend: {str(e)}")
+    return None
@@ -1,3 +1,6 @@
+import json
+
+from django.conf import settings
 from rest_framework import serializers
 from .models import FuelStation, Route, FuelStop
 
@@ -22,6 +25,121 @@ class RouteSerializer(serializers.ModelSerializer):
         model = Route
         fields = ['start_location', 'end_location', 'total_distance', 'total_cost', 'fuel_stops']
 
+def validate_coords(value):
+    # Validators run alongside the length checks, so the shape is not guaranteed yet
+    if len(value) != 2:
+        raise serializers.ValidationError("Expected [latitude, longitude]")
+    latitude, longitude = value
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise serializers.ValidationError("Expected [latitude, longitude]")
+    return value
+
 class RouteRequestSerializer(serializers.Serializer):
     start_location = serializers.CharField(max_length=255)
-    end_location = serializers.CharField(max_length=255) 
\ No newline at end of file
+    end_location = serializers.CharField(max_length=255)
+    # [latitude, longitude] of a picked place suggestion; skips geocoding that endpoint
+    start_coords = serializers.ListField(child=serializers.FloatField(), min_length=2, max_length=2,
+                                         required=False, validators=[validate_coords])
+    end_coords = serializers.ListField(child=serializers.FloatField(), min_length=2, max_length=2,
+                                       required=False, validators=[validate_coords])
+
+class BatchRouteRequestSerializer(serializers.Serializer):
+    """Lanes for ``/api/route/batch/``.
+
+    At most ``BATCH_MAX_LANES`` lanes, naming at most ``BATCH_MAX_NEW_PLACES``
+    places that were never geocoded before (checked by the view, which knows
+    the geocode cache); larger batches are rejected with a 400.
+    """
+    lanes = RouteRequestSerializer(many=True, allow_empty=False)
+    include_geometry = serializers.BooleanField(default=False)
+
+    def validate_lanes(self, value):
+        if len(value) > settings.BATCH_MAX_LANES:
+            raise serializers.ValidationError(f"At most {settings.BATCH_MAX_LANES} lanes per batch")
+        return value
+
+def parse_bounds(value):
+    """Accept ``{"north", "south", "east", "west", "buffer"}`` JSON or ``west,south,east,north``."""
+    try:
+        if value.lstrip().startswith('{'):
+            data = json.loads(value)
+            west, south, east, north = (float(data[k]) for k in ('west', 'south', 'east', 'north'))
+            buffer_miles = float(data.get('buffer', 0))
+        else:
+            west, south, east, north = (float(v) for v in value.split(','))
+            buffer_miles = 0.0
+    except (ValueError, KeyError, TypeError):
+        raise serializers.ValidationError("Expected JSON with north/south/east/west or 'west,south,east,north'")
+
+    if south > north or west > east:
+        raise serializers.ValidationError("Bounds are inverted")
+    return {
+        'west': west, 'south': south, 'east': east, 'north': north, 'buffer': max(buffer_miles, 0.0)
+    }
+
+
+class FuelStationQuerySerializer(serializers.Serializer):
+    """Query parameters accepted by ``/api/fuel-stations/``."""
+
+    FIELD_CHOICES = ['id', 'truck_stop', 'address', 'city', 'state', 'retail_price', 'latitude', 'longitude']
+
+    bounds = serializers.CharField(required=False)
+    price_min = serializers.DecimalField(max_digits=5, decimal_places=3, required=False)
+    price_max = serializers.DecimalField(max_digits=5, decimal_places=3, required=False)
+    state = serializers.CharField(required=False)
+    fields = serializers.CharField(required=False)
+
+    def validate_bounds(self, value):
+        return parse_bounds(value)
+
+    def validate_state(self, value):
+        return [s.strip().upper() for s in value.split(',') if s.strip()]
+
+    def validate_fields(self, value):
+        fields = [f.strip() for f in value.split(',') if f.strip()]
+        unknown = set(fields) - set(self.FIELD_CHOICES)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return fields
+
+
+class StationClusterQuerySerializer(serializers.Serializer):
+    zoom = serializers.IntegerField(min_value=0, max_value=22)
+    bbox = serializers.CharField(required=False)
+
+    def validate_bbox(self, value):
+        return parse_bounds(value)
+
+
+class NearestStationQuerySerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    k = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    radius = serializers.FloatField(min_value=0, max_value=1000, default=100)
+    order = serializers.ChoiceField(choices=['price', 'distance'], default='distance')
+    max_price = serializers.FloatField(required=False)
+    state = serializers.CharField(required=False)
+
+    def validate_state(self, value):
+        return [s.strip().upper() for s in value.split(',') if s.strip()]
+
+
+class PlaceSuggestionQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=255)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class StationPriceQuerySerializer(serializers.Serializer):
+    date = serializers.DateField(required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError("start must not be after end")
+        return data
+
+
+class StatePriceQuerySerializer(serializers.Serializer):
+    days = serializers.IntegerField(min_value=1, max_value=3660, default=30)
+    end = serializers.DateField(required=False)
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .metrics import COALESCED
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no cross-worker leases on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LEASE_POLL_INTERVAL = 0.05
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._tasks = weakref.WeakKeyDictionary()
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            COALESCED.inc(scope='process')
+            return future.result(timeout)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def start(self, key, executor, fn):
+        """Run ``fn`` in the background unless a call for ``key`` is already in flight."""
+        with self._lock:
+            if key in self._calls:
+                return False
+
+        def run():
+            try:
+                self.do(key, fn)
+            except Exception as e:
+                logger.warning(f"Background refresh of {key} failed: {str(e)}")
+
+        executor.submit(run)
+        return True
+
+    async def ado(self, key, coro_fn):
+        """``do`` for coroutines; calls are coalesced per event loop."""
+        tasks = self._tasks.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        else:
+            COALESCED.inc(scope='process')
+        # Shielded so a cancelled waiter does not cancel the shared computation
+        return await asyncio.shield(task)
+
+
+def _leases_dir():
+    return os.path.join(settings.STATION_DATA_DIR, 'locks')
+
+
+def remove_stale_leases(max_age):
+    """Delete lock files created more than ``max_age`` seconds ago.
+
+    Lock files are never reused after their route is computed, so this keeps
+    the directory from growing without bound. Removing a file a worker still
+    holds only lets one other worker compute the same route in parallel.
+    """
+    cutoff = time.time() - max_age
+    try:
+        shards = os.listdir(_leases_dir())
+    except FileNotFoundError:
+        return
+    for shard in shards:
+        shard_dir = os.path.join(_leases_dir(), shard)
+        try:
+            names = os.listdir(shard_dir)
+        except (NotADirectoryError, FileNotFoundError):
+            continue
+        for name in names:
+            path = os.path.join(shard_dir, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class FileLease:
+    """Cross-process exclusive lease on a key, backed by ``flock``.
+
+    Each key gets its own lock file under ``STATION_DATA_DIR/locks``, named
+    after the key's digest, so leases on different keys never wait on each
+    other. The kernel drops the lock if the holder dies, so a crashed worker
+    never leaves the lease stuck.
+    """
+
+    def __init__(self, key):
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        self.path = os.path.join(_leases_dir(), digest[:2], f"{digest}.lock")
+        self._fd = None
+
+    def acquire(self):
+        """Try to take the lease without blocking; returns whether it is held."""
+        if fcntl is None:
+            return True
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def coalesce(key, compute, lookup, wait=None):
+    """Compute a shared result once across threads and worker processes.
+
+    Threads in this process share one call through ``SingleFlight``. That
+    call then takes the ``FileLease`` for ``key``; if another worker holds
+    it, we wait up to ``wait`` seconds and use ``lookup()`` to pick up the
+    result the other worker stored. ``compute()`` only runs when there is
+    still nothing to look up (or the wait times out).
+    """
+    wait = settings.ROUTE_LEASE_TIMEOUT if wait is None else wait
+
+    def leader():
+        lease = FileLease(key)
+        deadline = time.monotonic() + wait
+        waited = False
+        try:
+            while not lease.acquire() and time.monotonic() < deadline:
+                waited = True
+                time.sleep(LEASE_POLL_INTERVAL)
+            if waited:
+                result = lookup()
+                if result is not None:
+                    COALESCED.inc(scope='worker')
+                    return result
+            return compute()
+        finally:
+            lease.release()
+
+    return route_flights.do(key, leader)
+
+
+async def acoalesce(key, acompute, alookup, wait=None):
+    """``coalesce`` for the async views; ``acompute``/``alookup`` are coroutine functions."""
+    wait = settings.ROUTE_LEASE_TIMEOUT if wait is None else wait
+
+    async def leader():
+        lease = FileLease(key)
+        deadline = time.monotonic() + wait
+        waited = False
+        try:
+            while not lease.acquire() and time.monotonic() < deadline:
+                waited = True
+                await asyncio.sleep(LEASE_POLL_INTERVAL)
+            if waited:
+                result = await alookup()
+                if result is not None:
+                    COALESCED.inc(scope='worker')
+                    return result
+            return await acompute()
+        finally:
+            lease.release()
+
+    return await route_flights.ado(key, leader)
+
+
+# Shared by route planning and OSRM refreshes in this process
+route_flights = SingleFlight()
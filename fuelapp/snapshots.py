@@ -0,0 +1,192 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from .station_index import get_station_index
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ENCODINGS = ('br', 'gzip')
+
+
+def _snapshot_dir():
+    return os.path.join(settings.STATION_DATA_DIR, 'snapshots')
+
+
+def _snapshot_path(version, encoding):
+    return os.path.join(_snapshot_dir(), f"stations-{version}.json.{encoding}")
+
+
+def _etag(version, digest):
+    return f'"{version}-{digest.hexdigest()[:16]}"'
+
+
+def _if_none_match(request, etag):
+    """Whether the ``If-None-Match`` list names ``etag`` or is ``*`` (weak comparison)."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return etags == ['*'] or any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in etags)
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        token, _, params = part.strip().partition(';')
+        if token and params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(token.lower())
+    return accepted
+
+
+class StationSnapshot:
+    """The full ``/api/fuel-stations/`` payload, encoded once per data version.
+
+    Identity, gzip and (when the ``brotli`` package is installed) brotli
+    encodings plus a strong ETag per encoding (``encoded_etag``), since the
+    encoded bodies are different bytes. A built snapshot holds its bodies until
+    ``save`` writes them out; a loaded one keeps only the file paths and
+    streams the body from disk, so the bytes sit once in the OS page cache
+    rather than in every worker's heap.
+    """
+
+    def __init__(self, version, etag, bodies=None, paths=None):
+        self.version = version
+        self.etag = etag
+        self.bodies = bodies or {}
+        self.paths = paths or {}
+
+    @classmethod
+    def build(cls, station_index, brotli_quality=9):
+        stations = sorted(station_index.rows, key=lambda s: s['retail_price'])
+        raw = json.dumps(stations, separators=(',', ':')).encode()
+        bodies = {'identity': raw, 'gzip': gzip.compress(raw, compresslevel=9)}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(raw, quality=brotli_quality)
+        return cls(station_index.version, _etag(station_index.version, hashlib.sha1(raw)), bodies=bodies)
+
+    @classmethod
+    def load(cls, version):
+        """Open a snapshot written by ``save``, or return ``None``."""
+        paths = {
+            encoding: _snapshot_path(version, encoding) for encoding in ('identity',) + ENCODINGS
+            if os.path.exists(_snapshot_path(version, encoding))
+        }
+        if 'identity' not in paths or 'gzip' not in paths:
+            return None
+        digest = hashlib.sha1()
+        try:
+            with open(paths['identity'], 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            return None
+        return cls(version, _etag(version, digest), paths=paths)
+
+    def save(self):
+        os.makedirs(_snapshot_dir(), exist_ok=True)
+        for encoding, body in self.bodies.items():
+            path = _snapshot_path(self.version, encoding)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+
+    def _body_response(self, encoding):
+        if encoding in self.bodies:
+            return HttpResponse(self.bodies[encoding], content_type='application/json')
+        response = FileResponse(open(self.paths[encoding], 'rb'), content_type='application/json')
+        del response['Content-Disposition']
+        return response
+
+    def encoded_etag(self, encoding):
+        return self.etag if encoding == 'identity' else f'{self.etag[:-1]}-{encoding}"'
+
+    def response(self, request):
+        accepted = _accepted_encodings(request)
+        available = self.bodies or self.paths
+        encoding = next((e for e in ENCODINGS if e in accepted and e in available), 'identity')
+        etag = self.encoded_etag(encoding)
+        if _if_none_match(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            try:
+                response = self._body_response(encoding)
+            except FileNotFoundError:
+                # A newer import removed this version's files since they were loaded
+                current = get_station_snapshot()
+                if current is self:
+                    raise
+                return current.response(request)
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+def remove_stale_snapshots(keep_version):
+    try:
+        names = os.listdir(_snapshot_dir())
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.startswith('stations-') and not name.startswith(f"stations-{keep_version}."):
+            try:
+                os.remove(os.path.join(_snapshot_dir(), name))
+            except OSError:
+                pass
+
+
+def write_station_snapshot():
+    """Encode the current station data and store it for every worker to load.
+
+    Runs offline from ``import_fuel_prices``, so it can afford maximum brotli
+    compression; a worker that has to build its own copy uses a faster level.
+    """
+    snapshot = StationSnapshot.build(get_station_index(), brotli_quality=11)
+    snapshot.save()
+    remove_stale_snapshots(snapshot.version)
+    return snapshot
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_station_snapshot():
+    global _snapshot
+    station_index = get_station_index()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == station_index.version:
+        return snapshot
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.version != station_index.version:
+            _snapshot = StationSnapshot.load(station_index.version) or _build_snapshot(station_index)
+            logger.info(f"Loaded station snapshot {_snapshot.etag}")
+        return _snapshot
+
+
+def _build_snapshot(station_index):
+    """Encode a missing snapshot and serve it from disk like an imported one."""
+    snapshot = StationSnapshot.build(station_index)
+    try:
+        snapshot.save()
+    except OSError as e:
+        logger.error(f"Could not write station snapshot; serving it from memory: {str(e)}")
+        return snapshot
+    return StationSnapshot.load(snapshot.version) or snapshot
@@ -0,0 +1,219 @@
+import logging
+import os
+import shutil
+import uuid
+
+import numpy as np
+from django.conf import settings
+
+from .models import FuelStation
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_COLUMNS = {
+    'id': np.int64,
+    'latitude': np.float64,
+    'longitude': np.float64,
+    'retail_price': np.float64,
+}
+STATE_DTYPE = 'S2'
+STRING_COLUMNS = ('truck_stop', 'address', 'city')
+GRID_DEGREES = 0.25  # spatial grid cell size (about 17 miles of latitude)
+GRID_COLUMNS = int(360 / GRID_DEGREES)
+GRID_ROWS = int(180 / GRID_DEGREES)
+GRID_FILES = ('order', 'cells', 'starts')
+
+
+def _columns_dir():
+    return os.path.join(settings.STATION_DATA_DIR, 'columns')
+
+
+def _version_dir(version):
+    return os.path.join(_columns_dir(), version)
+
+
+def _encode_strings(values):
+    """Pack strings into one UTF-8 buffer plus an ``n + 1`` offsets array."""
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def grid_position(lats, lons):
+    """Grid row and column of each point, clamped to the grid."""
+    rows = np.floor((np.asarray(lats, dtype=np.float64) + 90.0) / GRID_DEGREES).astype(np.int64)
+    cols = np.floor((np.asarray(lons, dtype=np.float64) + 180.0) / GRID_DEGREES).astype(np.int64)
+    return np.clip(rows, 0, GRID_ROWS - 1), np.clip(cols, 0, GRID_COLUMNS - 1)
+
+
+def build_grid(lats, lons):
+    """Stations bucketed by grid cell as ``(order, cells, starts)``.
+
+    ``order`` lists station positions cell by cell, ``cells`` the occupied
+    cell ids in ascending order and ``starts`` where each cell begins in
+    ``order`` (plus a final end offset).
+    """
+    rows, cols = grid_position(lats, lons)
+    cell_ids = rows * GRID_COLUMNS + cols
+    order = np.argsort(cell_ids, kind='stable')
+    cells, starts = np.unique(cell_ids[order], return_index=True)
+    return order, cells, np.append(starts, len(order)).astype(np.int64)
+
+
+class StationColumns:
+    """Station table as flat columns: NumPy arrays plus offsets-encoded strings.
+
+    Written once per data version by ``import_fuel_prices`` and opened by each
+    worker with ``np.load(mmap_mode='r')``, so the pages live in the OS page
+    cache and are shared by every process instead of copied into each heap.
+    That includes the spatial grid (``build_grid``) the station index queries.
+    """
+
+    def __init__(self, version, numeric, state, strings, grid=None):
+        self.version = version
+        self.numeric = numeric
+        self.state = state
+        self.strings = strings
+        self.grid = grid if grid is not None else build_grid(numeric['latitude'], numeric['longitude'])
+
+    def __len__(self):
+        return len(self.numeric['id'])
+
+    def __getitem__(self, name):
+        return self.numeric[name]
+
+    def string(self, name, i):
+        data, offsets = self.strings[name]
+        return bytes(data[offsets[i]:offsets[i + 1]]).decode()
+
+    def row(self, i):
+        """The station at position ``i`` as a ``STATION_FIELDS`` dict."""
+        return {
+            'id': int(self.numeric['id'][i]),
+            'truck_stop': self.string('truck_stop', i),
+            'address': self.string('address', i),
+            'city': self.string('city', i),
+            'state': self.state[i].decode(),
+            'retail_price': float(self.numeric['retail_price'][i]),
+            'latitude': float(self.numeric['latitude'][i]),
+            'longitude': float(self.numeric['longitude'][i]),
+        }
+
+    @classmethod
+    def from_database(cls, version):
+        stations = list(FuelStation.objects.filter(
+            latitude__isnull=False,
+            longitude__isnull=False,
+            retail_price__isnull=False
+        ).order_by('id').values_list(
+            'id', 'latitude', 'longitude', 'retail_price', 'state', *STRING_COLUMNS
+        ))
+        columns = list(zip(*stations)) or [()] * (5 + len(STRING_COLUMNS))
+        numeric = {
+            name: np.array(values, dtype=dtype)
+            for (name, dtype), values in zip(NUMERIC_COLUMNS.items(), columns[:4])
+        }
+        state = np.array([value.encode()[:2] for value in columns[4]], dtype=STATE_DTYPE)
+        strings = {name: _encode_strings(values) for name, values in zip(STRING_COLUMNS, columns[5:])}
+        return cls(version, numeric, state, strings)
+
+    @classmethod
+    def load(cls, version):
+        """Memory-map the columns written for ``version``, or return ``None``."""
+        path = _version_dir(version)
+        try:
+            numeric = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in NUMERIC_COLUMNS
+            }
+            state = np.load(os.path.join(path, 'state.npy'), mmap_mode='r')
+            strings = {
+                name: (np.load(os.path.join(path, f"{name}.data.npy"), mmap_mode='r'),
+                       np.load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode='r'))
+                for name in STRING_COLUMNS
+            }
+            grid = tuple(np.load(os.path.join(path, f"grid.{name}.npy"), mmap_mode='r') for name in GRID_FILES)
+        except (FileNotFoundError, ValueError):
+            return None
+        return cls(version, numeric, state, strings, grid)
+
+    def save(self):
+        """Write every column into a fresh directory and publish it by swapping a symlink.
+
+        ``columns/<version>`` is a symlink replaced atomically, so a worker
+        opening the columns finds either the old or the new directory, never
+        a missing one.
+        """
+        os.makedirs(_columns_dir(), exist_ok=True)
+        path = _version_dir(self.version)
+        data_path = f"{path}.{uuid.uuid4().hex[:12]}"
+        os.makedirs(data_path)
+
+        for name, values in self.numeric.items():
+            np.save(os.path.join(data_path, f"{name}.npy"), values)
+        np.save(os.path.join(data_path, 'state.npy'), self.state)
+        for name, (data, offsets) in self.strings.items():
+            np.save(os.path.join(data_path, f"{name}.data.npy"), data)
+            np.save(os.path.join(data_path, f"{name}.offsets.npy"), offsets)
+        for name, values in zip(GRID_FILES, self.grid):
+            np.save(os.path.join(data_path, f"grid.{name}.npy"), values)
+
+        previous = os.path.realpath(path) if os.path.islink(path) else None
+        if os.path.isdir(path) and previous is None:
+            shutil.rmtree(path, ignore_errors=True)  # directory from before the symlink layout
+        link_path = f"{data_path}.link"
+        os.symlink(os.path.basename(data_path), link_path)
+        os.replace(link_path, path)
+        # Workers that mapped the previous copy keep reading it until they unmap it
+        if previous and previous != os.path.realpath(path):
+            shutil.rmtree(previous, ignore_errors=True)
+
+
+class StationRows:
+    """Read-only sequence of station dicts decoded on access from ``StationColumns``."""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, i):
+        return self.columns.row(int(i))
+
+    def __iter__(self):
+        return (self.columns.row(i) for i in range(len(self.columns)))
+
+
+def remove_stale_columns(keep_versions):
+    """Delete column directories for other versions.
+
+    Workers that still map an old version keep reading it: unlinked files
+    stay alive until the last mapping is closed.
+    """
+    try:
+        names = os.listdir(_columns_dir())
+    except FileNotFoundError:
+        return
+    keep = set()
+    for version in keep_versions:
+        path = _version_dir(version)
+        keep.add(version)
+        if os.path.islink(path):
+            keep.add(os.path.basename(os.path.realpath(path)))
+    for name in names:
+        if name in keep:
+            continue
+        path = os.path.join(_columns_dir(), name)
+        if os.path.islink(path):
+            os.remove(path)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def write_station_columns(version):
+    """Snapshot the station table for ``version``; call before publishing the version."""
+    columns = StationColumns.from_database(version)
+    columns.save()
+    logger.info(f"Wrote {len(columns)} station columns for version {version}")
+    return columns
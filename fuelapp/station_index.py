@@ -0,0 +1,199 @@
+import logging
+import threading
+
+import numpy as np
+
+from .geometry import closest_pairs, distance_to_polyline, project_pairs
+from .station_columns import GRID_COLUMNS, StationColumns, StationRows, grid_position
+from .utils import get_station_data_version
+
+logger = logging.getLogger(__name__)
+
+MILES_PER_DEGREE_LAT = 69.0
+
+STATION_FIELDS = ('id', 'truck_stop', 'address', 'city', 'state',
+                  'retail_price', 'latitude', 'longitude')
+
+
+class StationIndex:
+    """Spatial index over every priced, located fuel station.
+
+    The station columns and their grid are shared memory maps, so building
+    an index allocates nothing per station in the worker.
+    """
+
+    def __init__(self, columns):
+        self.version = columns.version
+        self.columns = columns
+        self.rows = StationRows(columns)
+        self.ids = columns['id']
+        self.lat = columns['latitude']
+        self.lon = columns['longitude']
+        self.price = columns['retail_price']
+        self.states = columns.state
+        self.grid_order, self.grid_cells, self.grid_starts = columns.grid
+
+    def __len__(self):
+        return len(self.columns)
+
+    @classmethod
+    def load(cls, version):
+        """Index the memory-mapped columns for ``version``, falling back to the database."""
+        columns = StationColumns.load(version)
+        if columns is None:
+            logger.info(f"No station columns for version {version}; reading the database")
+            columns = StationColumns.from_database(version)
+            # Write them out so this and every other worker maps the file instead of a heap copy
+            try:
+                columns.save()
+            except OSError as e:
+                logger.error(f"Could not write station columns: {str(e)}")
+            columns = StationColumns.load(version) or columns
+        return cls(columns)
+
+    @classmethod
+    def from_database(cls, version):
+        return cls(StationColumns.from_database(version))
+
+    @staticmethod
+    def segment_boxes(lons, lats, buffer_miles):
+        """Bounding box of every segment grown by ``buffer_miles``, as ``(west, south, east, north)`` arrays.
+
+        Longitude padding is scaled for meridian convergence at the segment's
+        most poleward latitude.
+        """
+        lat_pad = buffer_miles / MILES_PER_DEGREE_LAT
+        seg_min_lat = np.minimum(lats[:-1], lats[1:]) - lat_pad
+        seg_max_lat = np.maximum(lats[:-1], lats[1:]) + lat_pad
+        widest_lat = np.minimum(np.maximum(np.abs(seg_min_lat), np.abs(seg_max_lat)), 89.0)
+        lon_pad = lat_pad / np.cos(np.radians(widest_lat))
+        return (
+            np.minimum(lons[:-1], lons[1:]) - lon_pad,
+            seg_min_lat,
+            np.maximum(lons[:-1], lons[1:]) + lon_pad,
+            seg_max_lat,
+        )
+
+    def query_boxes(self, boxes):
+        """``(box, station)`` index pairs for every station inside each ``(west, south, east, north)`` box.
+
+        Each box is expanded to the grid cells it overlaps, and the stations
+        of the occupied cells are filtered against the box.
+        """
+        west, south, east, north = boxes
+        if len(self.grid_cells) == 0 or len(west) == 0:
+            return np.empty((2, 0), dtype=np.int64)
+        row0, col0 = grid_position(south, west)
+        row1, col1 = grid_position(north, east)
+        widths = col1 - col0 + 1
+        counts = (row1 - row0 + 1) * widths
+
+        # Every (box, cell) pair, then the cells that hold stations
+        box = np.repeat(np.arange(len(west)), counts)
+        step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell = ((row0[box] + step // widths[box]) * GRID_COLUMNS + col0[box] + step % widths[box])
+        slot = np.minimum(np.searchsorted(self.grid_cells, cell), len(self.grid_cells) - 1)
+        occupied = self.grid_cells[slot] == cell
+        box, slot = box[occupied], slot[occupied]
+
+        # Every (box, station) pair of those cells, filtered to the box itself
+        starts = self.grid_starts[slot]
+        lengths = self.grid_starts[slot + 1] - starts
+        box = np.repeat(box, lengths)
+        position = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+        station = np.asarray(self.grid_order[position])
+        lat, lon = self.lat[station], self.lon[station]
+        inside = (lon >= west[box]) & (lon <= east[box]) & (lat >= south[box]) & (lat <= north[box])
+        return np.vstack([box[inside], station[inside]])
+
+    def query_segments(self, lons, lats, buffer_miles):
+        """Return ``(segment, station)`` index pairs for stations near each route segment.
+
+        The whole polyline is answered by a single bulk grid query over the
+        buffered segment boxes.
+        """
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        if len(self) == 0 or len(lons) < 2:
+            return np.empty((2, 0), dtype=np.int64)
+        return self.query_boxes(self.segment_boxes(lons, lats, buffer_miles))
+
+    def corridor_candidates(self, lons, lats, buffer_miles):
+        pairs = self.query_segments(lons, lats, buffer_miles)
+        return np.unique(pairs[1])
+
+    def corridor(self, lons, lats, buffer_miles, marks=None):
+        """Stations within ``buffer_miles`` of the polyline.
+
+        Returns ``(indices, distances, mile_markers)`` as arrays, with distances
+        measured along the great circle to the nearest point of the route.
+        ``marks`` is passed through to ``distance_to_polyline``.
+        """
+        pairs = self.query_segments(lons, lats, buffer_miles)
+        distances, mile_markers = distance_to_polyline(self.lat, self.lon, lats, lons, pairs, marks)
+        indices = np.flatnonzero(distances <= buffer_miles)
+        return indices, distances[indices], mile_markers[indices]
+
+    def corridor_batch(self, lines, buffer_miles):
+        """``corridor`` for many routes at once.
+
+        ``lines`` is a sequence of ``(lons, lats, marks)`` tuples. All segments
+        go through one grid query and one projection pass; the result is a list
+        of ``(indices, distances, mile_markers)`` in the same order.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+        if not lines or len(self) == 0:
+            return [empty for _ in lines]
+
+        lons = np.concatenate([np.asarray(line[0], dtype=np.float64) for line in lines])
+        lats = np.concatenate([np.asarray(line[1], dtype=np.float64) for line in lines])
+        marks = np.concatenate([np.asarray(line[2], dtype=np.float64) for line in lines])
+        sizes = np.array([len(line[0]) for line in lines])
+
+        # Segments joining the end of one route to the start of the next are not real
+        line_of_vertex = np.repeat(np.arange(len(lines)), sizes)
+        real = np.flatnonzero(line_of_vertex[:-1] == line_of_vertex[1:])
+        if len(real) == 0:
+            return [empty for _ in lines]
+
+        boxes = tuple(edge[real] for edge in self.segment_boxes(lons, lats, buffer_miles))
+        box_idx, pt = self.query_boxes(boxes)
+        seg = real[box_idx]
+        pair_dist, pair_mark = project_pairs(self.lat, self.lon, lats, lons, marks, seg, pt)
+
+        within = pair_dist <= buffer_miles
+        seg, pt, pair_dist, pair_mark = seg[within], pt[within], pair_dist[within], pair_mark[within]
+        line = line_of_vertex[seg]
+        best = closest_pairs(line * len(self) + pt, pair_dist)
+
+        results = []
+        best_line = line[best]
+        for i in range(len(lines)):
+            chosen = best[best_line == i]
+            results.append((pt[chosen], pair_dist[chosen], pair_mark[chosen]))
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_station_index():
+    """Return the process-wide station index, rebuilding it when the data version changes."""
+    global _index
+    version = get_station_data_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = StationIndex.load(version)
+            logger.info(f"Built station index with {len(_index)} stations (version {version})")
+        return _index
+
+
+def reset_station_index():
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,19 @@
+import numpy as np
+
+from fuelapp.station_columns import STATE_DTYPE, StationColumns, _encode_strings
+from fuelapp.station_index import StationIndex
+
+
+def synthetic_station_index(count, seed=0, south=29.0, north=37.0, west=-104.0, east=-94.0):
+    """A ``StationIndex`` over ``count`` random stations, built in memory without the database."""
+    rng = np.random.default_rng(seed)
+    numeric = {
+        'id': np.arange(1, count + 1, dtype=np.int64),
+        'latitude': rng.uniform(south, north, count),
+        'longitude': rng.uniform(west, east, count),
+        'retail_price': np.round(rng.uniform(2.5, 4.5, count), 3),
+    }
+    state = np.array([rng.choice([b'TX', b'OK', b'NM']) for _ in range(count)], dtype=STATE_DTYPE)
+    names = [f"Station {i}" for i in range(1, count + 1)]
+    strings = {name: _encode_strings(names) for name in ('truck_stop', 'address', 'city')}
+    return StationIndex(StationColumns(f'synthetic-{seed}', numeric, state, strings))
@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from fuelapp.autocomplete import PlaceIndex, _gazetteer
+from fuelapp.models import FuelStation, GeocodedLocation
+
+
+class PlaceIndexTests(TestCase):
+    def setUp(self):
+        for city in ('Tulsa', 'Tulsa', 'Tucson'):
+            FuelStation.objects.create(
+                opis='1', truck_stop='Stop', address='1 Main St', city=city,
+                state='OK' if city == 'Tulsa' else 'AZ', rack_id='1', retail_price='3.199'
+            )
+        GeocodedLocation.objects.create(query_key='tulsa, ok', query='Tulsa, OK', latitude=36.15, longitude=-95.99)
+        # A user's free-text query that went through geocoding
+        GeocodedLocation.objects.create(
+            query_key='tuesday street 12, springfield', query='Tuesday Street 12, Springfield',
+            latitude=39.8, longitude=-89.6
+        )
+        _gazetteer.cache_clear()
+        self.addCleanup(_gazetteer.cache_clear)
+
+    def test_suggests_station_places_only(self):
+        index = PlaceIndex.from_database('v')
+        suggestions = index.suggest('tu')
+        self.assertEqual([s['query'] for s in suggestions], ['tulsa, ok', 'tucson, az'])
+        self.assertEqual(suggestions[0]['stations'], 2)
+        self.assertEqual((suggestions[0]['latitude'], suggestions[0]['longitude']), (36.15, -95.99))
+        self.assertIsNone(suggestions[1]['latitude'])
+
+    def test_includes_gazetteer_places(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, 'places.csv')
+            with open(path, 'w') as f:
+                f.write("city,state,latitude,longitude\nTucson,AZ,32.22,-110.97\nTupelo,MS,34.26,-88.70\n")
+            with override_settings(STATION_GAZETTEER_FILE=path):
+                index = PlaceIndex.from_database('v')
+
+        suggestions = {s['query']: s for s in index.suggest('tu')}
+        self.assertEqual(set(suggestions), {'tulsa, ok', 'tucson, az', 'tupelo, ms'})
+        self.assertEqual(suggestions['tucson, az']['latitude'], 32.22)
+        self.assertEqual(suggestions['tupelo, ms']['stations'], 0)
+
+    def test_partial_state_names(self):
+        index = PlaceIndex.from_database('v')
+
+        def queries(text):
+            return [s['query'] for s in index.suggest(text)]
+
+        self.assertEqual(queries('Tulsa, Okla'), ['tulsa, ok'])
+        self.assertEqual(queries('Tucson, ari'), ['tucson, az'])
+        self.assertEqual(queries('Tucson, A'), ['tucson, az'])
+        self.assertEqual(queries('Okla'), ['tulsa, ok'])
+        self.assertEqual(queries('Arizo'), ['tucson, az'])
+        # Too short to stand for a state on its own
+        self.assertEqual(queries('Ok'), [])
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    """Smoke test of the whole route pipeline against the benchmark's stub upstreams.
+
+    The command builds and drops its own scratch database, so it runs in a
+    separate process rather than inside the test database.
+    """
+
+    def test_benchmark_runs_every_route(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            output = os.path.join(workdir, 'bench.json')
+            result = subprocess.run(
+                [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark',
+                 '--stations', '300', '--repeat', '1', '--output', output],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=600
+            )
+            self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+            with open(output) as f:
+                report = json.load(f)
+
+        results = report['results']['stations=300']
+        routes = [name for name in results if name.startswith('route:')]
+        self.assertTrue(routes, results.keys())
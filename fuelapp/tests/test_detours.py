@@ -0,0 +1,40 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from fuelapp.detours import METERS_PER_MILE, measure_detours
+
+
+class MeasureDetoursTests(SimpleTestCase):
+    def test_requests_only_the_directed_blocks(self):
+        count = 5
+        line = (np.linspace(-100.0, -95.0, 10), np.full(10, 35.0), np.linspace(0.0, 280.0, 10))
+        stations = [{'id': i, 'mile_marker': 50.0 * i, 'longitude': -99.5 + i, 'latitude': 35.1} for i in range(count)]
+        calls = []
+
+        def table(coordinates, sources, destinations):
+            calls.append((len(coordinates), list(sources), list(destinations)))
+            # There: 1 mile per station number; back: twice that
+            scale = 1 if sources[0] == 0 else 2
+            distances = [[METERS_PER_MILE * scale * (j if sources[0] == 0 else i) for j in range(len(destinations))]
+                         for i in range(len(sources))]
+            return distances, [[60.0 * scale] * len(destinations) for _ in sources]
+
+        with mock.patch('fuelapp.detours.table_between', side_effect=table):
+            detours = measure_detours(line, stations)
+
+        self.assertEqual(calls, [
+            (2 * count, list(range(count)), list(range(count, 2 * count))),
+            (2 * count, list(range(count, 2 * count)), list(range(count))),
+        ])
+        for i in range(count):
+            miles, minutes = detours[i]
+            self.assertAlmostEqual(miles, 3.0 * i)
+            self.assertAlmostEqual(minutes, 3.0)
+
+    def test_unavailable(self):
+        line = (np.array([-100.0, -99.0]), np.array([35.0, 35.0]), np.array([0.0, 56.0]))
+        stations = [{'id': 1, 'mile_marker': 10.0, 'longitude': -99.8, 'latitude': 35.1}]
+        with mock.patch('fuelapp.detours.table_between', return_value=None):
+            self.assertIsNone(measure_detours(line, stations))
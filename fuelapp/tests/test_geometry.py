@@ -0,0 +1,34 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from fuelapp.geometry import distance_to_polyline, haversine_miles, simplify_polyline
+
+TOLERANCE_MILES = 0.25
+
+
+def offset_vertex(lon, offset_miles):
+    """A 10 mile north-south line at ``lon`` with its middle vertex pushed ``offset_miles`` east."""
+    lats = np.array([35.0, 35.0725, 35.145])
+    lons = np.full(3, lon)
+    lons[1] += offset_miles / haversine_miles(35.0725, lon, 35.0725, lon + 1.0)
+    return lats, lons
+
+
+class SimplifyPolylineTests(SimpleTestCase):
+    def test_keeps_offsets_beyond_tolerance_at_any_longitude(self):
+        for lon in (0.0, -80.0, -120.0):
+            with self.subTest(lon=lon):
+                self.assertEqual(simplify_polyline(*offset_vertex(lon, 0.3), TOLERANCE_MILES).tolist(), [0, 1, 2])
+                self.assertEqual(simplify_polyline(*offset_vertex(lon, 0.1), TOLERANCE_MILES).tolist(), [0, 2])
+
+    def test_dropped_vertices_stay_within_tolerance(self):
+        rng = np.random.default_rng(3)
+        for lon in (-80.0, -120.0):
+            lats = 30.0 + np.cumsum(rng.uniform(0.0, 0.01, 2000))
+            lons = lon + np.cumsum(rng.uniform(-0.01, 0.01, 2000))
+            keep = simplify_polyline(lats, lons, TOLERANCE_MILES)
+            self.assertLess(len(keep), len(lats))
+
+            dropped = np.setdiff1d(np.arange(len(lats)), keep)
+            deviations, _ = distance_to_polyline(lats[dropped], lons[dropped], lats[keep], lons[keep])
+            self.assertLessEqual(deviations.max(), TOLERANCE_MILES + 1e-9, lon)
@@ -0,0 +1,52 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from fuelapp.geometry import haversine_miles
+from fuelapp.nearest import NearestStationIndex
+from fuelapp.tests.stations import synthetic_station_index
+
+
+class NearestStationIndexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stations = synthetic_station_index(5000, seed=3)
+        cls.index = NearestStationIndex(cls.stations)
+        rng = np.random.default_rng(11)
+        cls.points = list(zip(rng.uniform(29.0, 37.0, 20), rng.uniform(-104.0, -94.0, 20)))
+
+    def brute_force(self, lat, lon, k, radius_miles, order='distance', max_price=None, states=None):
+        distances = haversine_miles(lat, lon, self.stations.lat, self.stations.lon)
+        mask = distances <= radius_miles
+        if max_price is not None:
+            mask &= self.stations.price <= max_price
+        if states:
+            mask &= np.isin(self.stations.states, [state.encode() for state in states])
+        candidates = np.flatnonzero(mask)
+        if order == 'price':
+            ranked = candidates[np.lexsort((distances[candidates], self.stations.price[candidates]))]
+        else:
+            ranked = candidates[np.argsort(distances[candidates], kind='stable')]
+        return ranked[:k].tolist()
+
+    def test_closest_stations(self):
+        for lat, lon in self.points:
+            for k, radius in ((1, 500), (10, 50), (25, 15)):
+                self.assertEqual(self.index.query(lat, lon, k=k, radius_miles=radius),
+                                 self.brute_force(lat, lon, k, radius))
+
+    def test_cheapest_stations(self):
+        for lat, lon in self.points:
+            self.assertEqual(self.index.query(lat, lon, k=10, radius_miles=75, order='price'),
+                             self.brute_force(lat, lon, 10, 75, order='price'))
+
+    def test_price_and_state_filters(self):
+        for lat, lon in self.points:
+            self.assertEqual(
+                self.index.query(lat, lon, k=10, radius_miles=200, max_price=3.0, states=['TX', 'NM']),
+                self.brute_force(lat, lon, 10, 200, max_price=3.0, states=['TX', 'NM'])
+            )
+
+    def test_nothing_in_range(self):
+        self.assertEqual(self.index.query(45.0, -80.0, k=5, radius_miles=10), [])
+        self.assertEqual(self.index.query(33.0, -99.0, k=0), [])
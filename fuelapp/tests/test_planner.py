@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from fuelapp.planner import plan_fuel_stops
+
+
+def brute_force_cost(mile_markers, prices, total_distance, max_range):
+    """Cheapest schedule by DP over whole-mile fuel levels (1 mpg, integer miles), or ``None``."""
+    stations = sorted((m, p) for m, p in zip(mile_markers, prices) if m <= total_distance)
+    if not stations or stations[0][0] > max_range:
+        return None
+    miles = [m for m, _ in stations] + [total_distance]
+    # The approach to the first station is billed there
+    best = {0: stations[0][0] * stations[0][1]}
+    for k, (mile, price) in enumerate(stations):
+        leg = miles[k + 1] - mile
+        arrivals = {}
+        for fuel, cost in best.items():
+            for level in range(max(fuel, leg), max_range + 1):
+                total = cost + (level - fuel) * price
+                left = level - leg
+                if total < arrivals.get(left, float('inf')):
+                    arrivals[left] = total
+        if not arrivals:
+            return None
+        best = arrivals
+    return min(best.values())
+
+
+class PlanFuelStopsTests(SimpleTestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(4)
+        for _ in range(300):
+            total_distance = rng.randint(10, 60)
+            max_range = rng.randint(5, 20)
+            count = rng.randint(1, 12)
+            mile_markers = rng.sample(range(0, total_distance + 5), count)
+            prices = [rng.randint(1, 9) for _ in mile_markers]
+
+            plan = plan_fuel_stops(mile_markers, prices, total_distance, max_range, 1.0)
+            expected = brute_force_cost(mile_markers, prices, total_distance, max_range)
+            if expected is None:
+                self.assertIsNone(plan)
+                continue
+            self.assertIsNotNone(plan)
+            self.assertAlmostEqual(sum(cost for _, _, cost in plan), expected)
+            # Exactly the fuel for the trip is bought
+            self.assertAlmostEqual(sum(gallons for _, gallons, _ in plan), total_distance)
+
+    def test_stops_are_in_driving_order(self):
+        plan = plan_fuel_stops([300, 100, 200], [3.0, 4.0, 2.0], 500, 250, 10)
+        stops = [station for station, _, _ in plan]
+        self.assertEqual(stops, sorted(stops, key=lambda i: [300, 100, 200][i]))
+
+    def test_station_at_the_destination_bills_the_approach(self):
+        self.assertEqual(plan_fuel_stops([100], [3.0], 100, 500, 10), [(0, 10.0, 30.0)])
+        plan = plan_fuel_stops([100, 0], [3.0, 4.0], 100, 500, 10)
+        self.assertAlmostEqual(sum(gallons for _, gallons, _ in plan), 10.0)
+        self.assertAlmostEqual(sum(cost for _, _, cost in plan), 40.0)
+
+    def test_gap_longer_than_range_is_infeasible(self):
+        self.assertIsNone(plan_fuel_stops([50, 400], [3.0, 3.0], 500, 200, 10))
+        self.assertIsNone(plan_fuel_stops(np.array([]), np.array([]), 100, 500, 10))
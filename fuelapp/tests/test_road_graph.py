@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from fuelapp.road_graph import RoadGraph, _dijkstra, build_graph_arrays
+
+SPACING = 0.05  # degrees between grid intersections
+
+
+def grid_ways(size, seed):
+    """A ``size`` x ``size`` street grid with random speeds and some one-way blocks."""
+    rng = random.Random(seed)
+    ways = []
+    for row in range(size):
+        for col in range(size):
+            here = (-97.0 + col * SPACING, 35.0 + row * SPACING)
+            for there in ((here[0] + SPACING, here[1]), (here[0], here[1] + SPACING)):
+                if there[0] > -97.0 + (size - 1) * SPACING + 1e-9 or there[1] > 35.0 + (size - 1) * SPACING + 1e-9:
+                    continue
+                if rng.random() < 0.1:
+                    continue  # a missing block
+                # A bend in the middle of the block gives segments a shape
+                middle = ((here[0] + there[0]) / 2 + rng.uniform(-0.005, 0.005),
+                          (here[1] + there[1]) / 2 + rng.uniform(-0.005, 0.005))
+                coords = np.array([here, middle, there])
+                forward, backward = True, True
+                if rng.random() < 0.25:
+                    forward, backward = rng.choice([(True, False), (False, True)])
+                ways.append((coords, rng.uniform(20, 70), forward, backward))
+    return ways
+
+
+class RoadGraphRouteTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ways = grid_ways(10, seed=5)
+        cls.graph = RoadGraph(build_graph_arrays(ways, landmarks=4))
+        cls.plain = RoadGraph(build_graph_arrays(ways, landmarks=0))
+
+    def node_times(self, node):
+        graph = self.graph
+        return _dijkstra(graph.n_nodes, graph.edge_start, graph.edge_to, graph.edge_cost, node)
+
+    def test_routes_between_intersections_match_dijkstra(self):
+        graph = self.graph
+        rng = random.Random(1)
+        checked = 0
+        for _ in range(60):
+            start, end = rng.sample(range(graph.n_nodes), 2)
+            expected = self.node_times(start)[end]
+            route = graph.route(graph.node_lon[start], graph.node_lat[start],
+                                graph.node_lon[end], graph.node_lat[end])
+            if expected == float('inf'):
+                self.assertIsNone(route)
+                continue
+            checked += 1
+            self.assertAlmostEqual(route['routes'][0]['duration'], expected, places=4)
+            coordinates = route['routes'][0]['geometry']['coordinates']
+            self.assertEqual(coordinates[0], [graph.node_lon[start], graph.node_lat[start]])
+            self.assertEqual(coordinates[-1], [graph.node_lon[end], graph.node_lat[end]])
+        self.assertGreater(checked, 30)
+
+    def test_landmarks_do_not_change_routes(self):
+        rng = random.Random(2)
+        for _ in range(60):
+            lons = [rng.uniform(-97.0, -96.55) for _ in range(2)]
+            lats = [rng.uniform(35.0, 35.45) for _ in range(2)]
+            with_landmarks = self.graph.route(lons[0], lats[0], lons[1], lats[1])
+            without = self.plain.route(lons[0], lats[0], lons[1], lats[1])
+            if without is None:
+                self.assertIsNone(with_landmarks)
+                continue
+            self.assertAlmostEqual(with_landmarks['routes'][0]['duration'], without['routes'][0]['duration'],
+                                   places=4)
+
+    def test_far_away_points_do_not_snap(self):
+        self.assertIsNone(self.graph.route(-80.0, 45.0, -97.0, 35.0))
@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase, override_settings
+
+from fuelapp.geometry import haversine_miles
+from fuelapp.route_cache import MILES_PER_DEGREE_LAT, get_cached_route, key_precision, route_cache_key, store_route
+
+ROUTE = {'code': 'Ok', 'routes': [{'geometry': {'type': 'LineString', 'coordinates': [[-97.5, 35.4], [-95.9, 36.1]]},
+                                   'distance': 170000.0, 'duration': 6000.0}]}
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'route-cache-tests'}})
+class RouteCacheTests(SimpleTestCase):
+    def test_key_cells_are_at_least_the_tolerance(self):
+        for tolerance in (0.01, 0.05, 0.25, 1.0, 5.0):
+            precision = key_precision(tolerance)
+            self.assertGreaterEqual(MILES_PER_DEGREE_LAT / 10 ** precision, tolerance)
+            # One more place would make cells smaller than the tolerance
+            self.assertLess(MILES_PER_DEGREE_LAT / 10 ** (precision + 1), tolerance)
+
+    @override_settings(ROUTE_CACHE_TOLERANCE_MILES=0.25)
+    def test_tolerance_rejects_within_a_key(self):
+        store_route(-97.5149, 35.4701, -95.9901, 36.1501, ROUTE, 60)
+
+        nearby = (-97.5141, 35.4709, -95.9901, 36.1501)
+        self.assertEqual(get_cached_route(*nearby)[1], 'hit')
+
+        # Same key, but about 0.4 miles from the cached start
+        far = (-97.5101, 35.4740, -95.9901, 36.1501)
+        self.assertEqual(route_cache_key(*far), route_cache_key(-97.5149, 35.4701, -95.9901, 36.1501))
+        self.assertGreater(haversine_miles(35.4701, -97.5149, 35.4740, -97.5101), 0.25)
+        self.assertEqual(get_cached_route(*far), (None, 'out_of_tolerance'))
@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+
+from fuelapp.serializers import RouteRequestSerializer
+
+
+class RouteRequestSerializerTests(SimpleTestCase):
+    def validate(self, **coords):
+        serializer = RouteRequestSerializer(data={'start_location': 'Tulsa, OK', 'end_location': 'Dallas, TX', **coords})
+        return serializer.is_valid(), serializer.errors
+
+    def test_valid_coords(self):
+        self.assertEqual(self.validate(start_coords=[36.15, -95.99], end_coords=['32.78', '-96.8']), (True, {}))
+
+    def test_wrong_length(self):
+        for value in ([], [1], [1, 2, 3]):
+            with self.subTest(value=value):
+                valid, errors = self.validate(start_coords=value)
+                self.assertFalse(valid)
+                self.assertIn('start_coords', errors)
+
+    def test_not_numeric(self):
+        for value in (['north', -95.99], [36.15, None], 'Tulsa', [[36.15], -95.99]):
+            with self.subTest(value=value):
+                valid, errors = self.validate(end_coords=value)
+                self.assertFalse(valid)
+                self.assertIn('end_coords', errors)
+
+    def test_out_of_range(self):
+        valid, errors = self.validate(start_coords=[-95.99, 36.15 + 200])
+        self.assertFalse(valid)
+        self.assertIn('start_coords', errors)
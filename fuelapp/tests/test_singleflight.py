@@ -0,0 +1,118 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase, override_settings
+
+from fuelapp.singleflight import FileLease, SingleFlight, coalesce, remove_stale_leases
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return 'route'
+
+        with ThreadPoolExecutor(8) as executor:
+            futures = [executor.submit(flight.do, 'key', compute) for _ in range(8)]
+            # Give every thread time to join the call in flight
+            time.sleep(0.2)
+            release.set()
+            results = [future.result(5) for future in futures]
+
+        self.assertEqual(results, ['route'] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.do('key', lambda: 'fresh'), 'fresh')
+
+    def test_waiters_share_the_exception(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError('no route')
+
+        with ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(flight.do, 'key', fail) for _ in range(4)]
+            release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result(5)
+
+    def test_coroutines_share_one_task(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'route'
+
+        async def main():
+            return await asyncio.gather(*(flight.ado('key', compute) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ['route'] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+class CoalesceTests(SimpleTestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+        settings_override = override_settings(STATION_DATA_DIR=self.data_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_waits_for_the_worker_holding_the_lease(self):
+        other_worker = FileLease('route:key')
+        self.assertTrue(other_worker.acquire())
+        stored = {}
+
+        def finish():
+            stored['result'] = ('stored', 200)
+            other_worker.release()
+
+        timer = threading.Timer(0.1, finish)
+        timer.start()
+        result = coalesce('route:key', lambda: self.fail('computed twice'), lambda: stored.get('result'), wait=5)
+        timer.join()
+        self.assertEqual(result, ('stored', 200))
+
+    def test_computes_when_the_other_worker_stored_nothing(self):
+        other_worker = FileLease('route:key')
+        self.assertTrue(other_worker.acquire())
+        timer = threading.Timer(0.1, other_worker.release)
+        timer.start()
+        result = coalesce('route:key', lambda: ('computed', 200), lambda: None, wait=5)
+        timer.join()
+        self.assertEqual(result, ('computed', 200))
+
+    def test_distinct_keys_do_not_block_each_other(self):
+        held = [FileLease(f'route:key-{i}') for i in range(200)]
+        self.addCleanup(lambda: [lease.release() for lease in held])
+        self.assertTrue(all(lease.acquire() for lease in held))
+
+        started = time.monotonic()
+        result = coalesce('route:other', lambda: ('computed', 200), lambda: self.fail('waited'), wait=5)
+        self.assertEqual(result, ('computed', 200))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_remove_stale_leases(self):
+        old, new = FileLease('route:old'), FileLease('route:new')
+        for lease in (old, new):
+            lease.acquire()
+            lease.release()
+        os.utime(old.path, (time.time() - 60, time.time() - 60))
+
+        remove_stale_leases(30)
+        self.assertFalse(os.path.exists(old.path))
+        self.assertTrue(os.path.exists(new.path))
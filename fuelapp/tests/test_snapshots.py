@@ -0,0 +1,68 @@
+import gzip
+import json
+import tempfile
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from fuelapp.snapshots import StationSnapshot
+from fuelapp.tests.stations import synthetic_station_index
+
+
+class StationSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        data_dir = override_settings(STATION_DATA_DIR=workdir.name)
+        data_dir.enable()
+        self.addCleanup(data_dir.disable)
+
+        self.built = StationSnapshot.build(synthetic_station_index(50))
+        self.built.save()
+        self.snapshot = StationSnapshot.load(self.built.version)
+
+    def get(self, **headers):
+        response = self.snapshot.response(RequestFactory().get('/api/fuel-stations/', **headers))
+        self.addCleanup(response.close)
+        return response
+
+    def test_loaded_snapshot_streams_from_disk(self):
+        self.assertEqual(self.snapshot.bodies, {})
+        self.assertEqual(self.snapshot.etag, self.built.etag)
+
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Disposition', response)
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(body, self.built.bodies['identity'])
+        self.assertEqual(len(json.loads(body)), 50)
+
+    def test_identity_and_revalidation(self):
+        response = self.get()
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), self.built.bodies['identity'])
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=self.snapshot.etag).status_code, 304)
+
+    def test_etag_per_encoding(self):
+        identity, gzipped = self.get(), self.get(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotEqual(identity['ETag'], gzipped['ETag'])
+        self.assertEqual(gzipped['ETag'], self.snapshot.encoded_etag('gzip'))
+
+        # A tag for another encoding is a different representation
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=identity['ETag'], HTTP_ACCEPT_ENCODING='gzip').status_code, 200)
+        not_modified = self.get(HTTP_IF_NONE_MATCH=gzipped['ETag'], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], gzipped['ETag'])
+
+    def test_if_none_match_list(self):
+        etag = self.snapshot.etag
+        for header in (f'"other", {etag}', f'W/{etag}', '*'):
+            with self.subTest(header=header):
+                self.assertEqual(self.get(HTTP_IF_NONE_MATCH=header).status_code, 304)
+        for header in (f'"x{etag[1:]}', etag[1:-1], '"other"'):
+            with self.subTest(header=header):
+                self.assertEqual(self.get(HTTP_IF_NONE_MATCH=header).status_code, 200)
+
+    def test_missing_files(self):
+        self.assertIsNone(StationSnapshot.load('other-version'))
@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from fuelapp.station_columns import StationColumns, remove_stale_columns
+from fuelapp.tests.stations import synthetic_station_index
+
+
+class StationColumnsTests(SimpleTestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        data_dir = override_settings(STATION_DATA_DIR=self.workdir.name)
+        data_dir.enable()
+        self.addCleanup(data_dir.disable)
+        self.columns = synthetic_station_index(200).columns
+
+    def columns_dir(self):
+        return os.path.join(self.workdir.name, 'columns')
+
+    def test_round_trip_is_memory_mapped(self):
+        self.columns.save()
+        loaded = StationColumns.load(self.columns.version)
+        self.assertIsInstance(loaded['latitude'], np.memmap)
+        self.assertIsInstance(loaded.grid[0], np.memmap)
+        np.testing.assert_array_equal(loaded['id'], self.columns['id'])
+        for saved, built in zip(loaded.grid, self.columns.grid):
+            np.testing.assert_array_equal(saved, built)
+        self.assertEqual(loaded.row(5), self.columns.row(5))
+
+    def test_saving_again_swaps_the_version_link(self):
+        self.columns.save()
+        path = os.path.join(self.columns_dir(), self.columns.version)
+        mapped = StationColumns.load(self.columns.version)
+        first = os.path.realpath(path)
+
+        self.columns.save()
+        self.assertTrue(os.path.islink(path))
+        self.assertNotEqual(os.path.realpath(path), first)
+        self.assertFalse(os.path.exists(first))
+        # The earlier mapping still reads, and the version still loads
+        self.assertEqual(int(mapped['id'][-1]), 200)
+        self.assertIsNotNone(StationColumns.load(self.columns.version))
+
+    def test_remove_stale_columns_keeps_linked_directories(self):
+        self.columns.save()
+        other = StationColumns('other', self.columns.numeric, self.columns.state, self.columns.strings)
+        other.save()
+
+        remove_stale_columns({self.columns.version})
+        self.assertEqual(len(os.listdir(self.columns_dir())), 2)
+        self.assertIsNotNone(StationColumns.load(self.columns.version))
+        self.assertIsNone(StationColumns.load('other'))
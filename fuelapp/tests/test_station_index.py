@@ -0,0 +1,81 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from fuelapp.geometry import cumulative_miles, haversine_miles
+from fuelapp.tests.stations import synthetic_station_index
+
+BUFFER_MILES = 10.0
+TOLERANCE_MILES = 0.1
+
+
+def random_route(rng, vertices=30):
+    """A wandering polyline through the synthetic station area, as ``(lons, lats, marks)``."""
+    lats = 30.0 + np.cumsum(rng.uniform(-0.05, 0.25, vertices))
+    lons = -103.0 + np.cumsum(rng.uniform(-0.1, 0.3, vertices))
+    return lons, lats, cumulative_miles(lats, lons)
+
+
+def brute_force_distances(station_index, lons, lats, samples=400):
+    """Distance from every station to the route by dense sampling of each segment."""
+    t = np.linspace(0.0, 1.0, samples)
+    sample_lats = (lats[:-1, None] + t * (lats[1:, None] - lats[:-1, None])).ravel()
+    sample_lons = (lons[:-1, None] + t * (lons[1:, None] - lons[:-1, None])).ravel()
+    return np.array([
+        haversine_miles(lat, lon, sample_lats, sample_lons).min()
+        for lat, lon in zip(station_index.lat, station_index.lon)
+    ])
+
+
+class CorridorTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.index = synthetic_station_index(3000, seed=2)
+        rng = np.random.default_rng(7)
+        cls.routes = [random_route(rng) for _ in range(3)]
+
+    def test_corridor_matches_brute_force(self):
+        for lons, lats, marks in self.routes:
+            indices, distances, mile_markers = self.index.corridor(lons, lats, BUFFER_MILES, marks)
+            expected = brute_force_distances(self.index, lons, lats)
+
+            found = set(indices.tolist())
+            self.assertTrue(found)
+            self.assertTrue(set(np.flatnonzero(expected <= BUFFER_MILES - TOLERANCE_MILES)) <= found)
+            self.assertFalse(set(np.flatnonzero(expected > BUFFER_MILES + TOLERANCE_MILES)) & found)
+            np.testing.assert_allclose(distances, expected[indices], atol=TOLERANCE_MILES)
+            self.assertTrue(np.all((mile_markers >= 0) & (mile_markers <= marks[-1])))
+
+    def test_corridor_batch_matches_single_routes(self):
+        batch = self.index.corridor_batch(self.routes, BUFFER_MILES)
+        self.assertEqual(len(batch), len(self.routes))
+        for (lons, lats, marks), (indices, distances, mile_markers) in zip(self.routes, batch):
+            single = self.index.corridor(lons, lats, BUFFER_MILES, marks)
+            order = np.argsort(indices)
+            np.testing.assert_array_equal(indices[order], single[0])
+            np.testing.assert_allclose(distances[order], single[1])
+            np.testing.assert_allclose(mile_markers[order], single[2])
+
+    def test_route_outside_the_stations_finds_none(self):
+        lons, lats = np.array([-80.0, -79.5]), np.array([45.0, 45.2])
+        indices, _, _ = self.index.corridor(lons, lats, BUFFER_MILES, cumulative_miles(lats, lons))
+        self.assertEqual(len(indices), 0)
+        self.assertEqual(len(self.index.corridor_batch([], BUFFER_MILES)), 0)
+
+    def test_query_boxes_matches_brute_force(self):
+        rng = np.random.default_rng(11)
+        west = rng.uniform(-106.0, -94.0, 40)
+        south = rng.uniform(28.0, 37.0, 40)
+        # From inside one grid cell up to several degrees across
+        boxes = (west, south, west + rng.uniform(0.01, 4.0, 40), south + rng.uniform(0.01, 3.0, 40))
+
+        box, station = self.index.query_boxes(boxes)
+        found = set(zip(box.tolist(), station.tolist()))
+        lat, lon = self.index.lat, self.index.lon
+        expected = {
+            (i, j) for i in range(40)
+            for j in np.flatnonzero((lon >= boxes[0][i]) & (lon <= boxes[2][i])
+                                    & (lat >= boxes[1][i]) & (lat <= boxes[3][i])).tolist()
+        }
+        self.assertTrue(expected)
+        self.assertEqual(found, expected)
@@ -0,0 +1,45 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from fuelapp.upstream import CircuitBreaker, CircuitOpenError, UpstreamClient
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def open_client(self):
+        client = UpstreamClient('test', 'http://127.0.0.1:9', retries=0, failure_threshold=1, reset_timeout=0)
+        client.breaker.record_failure()
+        return client
+
+    def test_half_open_allows_a_single_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.acquire(), (True, True))
+        self.assertEqual(breaker.acquire(), (False, False))
+        breaker.record_success()
+        self.assertEqual(breaker.acquire(), (True, False))
+
+    def test_trial_raising_unexpected_error_frees_the_breaker(self):
+        client = self.open_client()
+        with mock.patch.object(client, '_get_json', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                client.get_json('/')
+        self.assertTrue(client.breaker.allow())
+
+    def test_cancelled_async_trial_frees_the_breaker(self):
+        client = self.open_client()
+
+        async def cancelled(path, params):
+            raise asyncio.CancelledError
+
+        with mock.patch.object(client, '_aget_json', cancelled):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(client.aget_json('/'))
+        self.assertTrue(client.breaker.allow())
+
+    def test_open_circuit_rejects_calls(self):
+        client = UpstreamClient('test', 'http://127.0.0.1:9', retries=0, failure_threshold=1, reset_timeout=60)
+        client.breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            client.get_json('/')
@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+
+from fuelapp.utils import normalize_location
+
+
+class NormalizeLocationTests(SimpleTestCase):
+    def test_spellings_of_one_place_share_a_key(self):
+        for location in ("Tulsa, Oklahoma", "tulsa ok", "Tulsa, OK, USA", "  TULSA,  Oklahoma  United States"):
+            self.assertEqual(normalize_location(location), "tulsa, ok")
+
+    def test_multi_word_states_match_before_single_words(self):
+        cases = {
+            "Charleston, West Virginia": "charleston, wv",
+            "Charleston West Virginia": "charleston, wv",
+            "charleston, west virginia, usa": "charleston, wv",
+            "Richmond, Virginia": "richmond, va",
+            "Richmond Virginia": "richmond, va",
+            "Santa Fe New Mexico US": "santa fe, nm",
+            "Washington District of Columbia": "washington, dc",
+            "Fargo, North Dakota": "fargo, nd",
+            "Kansas City, Kansas": "kansas city, ks",
+        }
+        for location, expected in cases.items():
+            self.assertEqual(normalize_location(location), expected, location)
+
+    def test_state_after_a_comma_separated_district(self):
+        self.assertEqual(normalize_location("Downtown, Charleston West Virginia"), "downtown, charleston, wv")
+
+    def test_places_without_a_state_are_kept(self):
+        self.assertEqual(normalize_location("Virginia"), "virginia")
+        self.assertEqual(normalize_location("Springfield"), "springfield")
@@ -0,0 +1,88 @@
+import json
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from fuelapp.geocoding import GeocodeResult
+from fuelapp.station_index import reset_station_index
+from fuelapp.views import BatchRoutePlannerView
+
+
+def straight_route(start_lon, start_lat, end_lon, end_lat):
+    return {'code': 'Ok', 'routes': [{
+        'geometry': {'type': 'LineString', 'coordinates': [[start_lon, start_lat], [end_lon, end_lat]]},
+        'distance': 150000.0, 'duration': 5400.0,
+    }]}
+
+
+class BatchRoutePlannerTests(TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        data_dir = override_settings(STATION_DATA_DIR=workdir.name)
+        data_dir.enable()
+        self.addCleanup(data_dir.disable)
+        reset_station_index()
+        self.addCleanup(reset_station_index)
+
+    def post(self, lanes):
+        return self.client.post('/api/route/batch/', json.dumps({'lanes': lanes}), content_type='application/json')
+
+    def test_failing_lane_does_not_fail_the_batch(self):
+        def route(start_lon, start_lat, end_lon, end_lat):
+            if start_lat > 40:
+                return {'code': 'Ok', 'routes': [{'geometry': {'coordinates': [[start_lon]]}, 'distance': 1.0}]}
+            return straight_route(start_lon, start_lat, end_lon, end_lat)
+
+        lanes = [
+            {'start_location': 'Tulsa, OK', 'end_location': 'Dallas, TX',
+             'start_coords': [36.15, -95.99], 'end_coords': [32.78, -96.80]},
+            {'start_location': 'Fargo, ND', 'end_location': 'Dallas, TX',
+             'start_coords': [46.88, -96.79], 'end_coords': [32.78, -96.80]},
+        ]
+        with mock.patch.object(BatchRoutePlannerView, 'get_osrm_route', side_effect=route), \
+                self.assertLogs('fuelapp.views', 'ERROR'):
+            response = self.post(lanes)
+
+        self.assertEqual(response.status_code, 200)
+        good, bad = response.json()['results']
+        self.assertNotIn('error', good)
+        self.assertEqual(bad['error'], "Internal server error")
+
+    @override_settings(BATCH_MAX_NEW_PLACES=2)
+    def test_too_many_new_places_are_rejected_before_geocoding(self):
+        lanes = [{'start_location': f'Town {i}, OK', 'end_location': 'Dallas, TX'} for i in range(2)]
+        with mock.patch.object(BatchRoutePlannerView, 'cached_geocode') as geocode:
+            response = self.post(lanes)
+        self.assertEqual(response.status_code, 400)
+        geocode.assert_not_called()
+
+        with mock.patch.object(BatchRoutePlannerView, 'cached_geocode',
+                               return_value=GeocodeResult(35.0, -97.0, '')) as geocode, \
+                mock.patch.object(BatchRoutePlannerView, 'get_osrm_route', side_effect=straight_route):
+            response = self.post(lanes[:1])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(geocode.call_count, 2)
+
+
+class MetricsEndpointTests(TestCase):
+    def test_anonymous_requests_are_refused(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer nope').status_code, 403)
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_staff_session(self):
+        user = User.objects.create_user('ops', password='unused')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .metrics import UPSTREAM_FAILURES, UPSTREAM_SECONDS
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - async callers fall back to the thread pool
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# Shared by WSGI views to overlap blocking upstream calls
+UPSTREAM_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.UPSTREAM_THREADS, thread_name_prefix='upstream'
+)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """An upstream service (OSRM, Nominatim) could not be reached."""
+
+
+class CircuitOpenError(UpstreamError):
+    """The upstream has failed repeatedly and calls are being short-circuited."""
+
+
+class CircuitBreaker:
+    """Fail fast after ``failure_threshold`` consecutive failures.
+
+    Once open, calls are rejected until ``reset_timeout`` seconds have passed;
+    then a single trial call is let through and its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def acquire(self):
+        """``(allowed, trial)``; a half-open ``trial`` call must finish with ``end_trial``."""
+        with self._lock:
+            if self.opened_at is None:
+                return True, False
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                return False, False
+            self._trial_running = True
+            return True, True
+
+    def allow(self):
+        return self.acquire()[0]
+
+    def end_trial(self):
+        """Free the half-open slot, also when the trial was cancelled or raised something unexpected."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """Pooled HTTP client for one upstream service.
+
+    Connections are kept alive in a per-host pool, transient failures are
+    retried with jittered exponential backoff, and a circuit breaker stops
+    calling an upstream that keeps failing.
+    """
+
+    def __init__(self, name, base_url, timeout=(3.05, 10), retries=2, backoff=0.25,
+                 pool_size=10, failure_threshold=5, reset_timeout=30, headers=None, min_interval=0):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.headers = headers or {}
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.min_interval = min_interval
+        self._next_request = 0.0
+        self._rate_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _url(self, path):
+        return path if path.startswith(('http://', 'https://')) else f"{self.base_url}{path}"
+
+    def _delay(self, attempt):
+        # Full jitter keeps retries from many workers from arriving in lockstep
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def _start(self):
+        """Ask the breaker for a call; returns whether it is the half-open trial."""
+        allowed, trial = self.breaker.acquire()
+        if not allowed:
+            UPSTREAM_FAILURES.inc(upstream=self.name, reason='circuit_open')
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        return trial
+
+    def _reserve(self):
+        """Seconds to wait so this process starts requests at least ``min_interval`` apart."""
+        if not self.min_interval:
+            return 0.0
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_request)
+            self._next_request = slot + self.min_interval
+            return slot - now
+
+    def _observe(self, started, outcome):
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream=self.name, outcome=outcome)
+
+    def _fail(self, error):
+        UPSTREAM_FAILURES.inc(upstream=self.name, reason='exhausted')
+        self.breaker.record_failure()
+        logger.warning(f"{self.name} upstream failed: {error}")
+        raise UpstreamError(f"{self.name}: {error}")
+
+    def get_json(self, path, params=None):
+        """GET ``path`` and return ``(status_code, decoded JSON)``."""
+        trial = self._start()
+        try:
+            return self._get_json(path, params)
+        finally:
+            if trial:
+                self.breaker.end_trial()
+
+    def _get_json(self, path, params):
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self._delay(attempt - 1))
+            wait = self._reserve()
+            if wait:
+                time.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = self.session.get(self._url(path), params=params, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                self._observe(started, 'error')
+                error = str(e)
+                continue
+            if response.status_code in RETRYABLE_STATUS:
+                self._observe(started, 'retryable_status')
+                error = f"HTTP {response.status_code}"
+                continue
+            try:
+                payload = response.json()
+            except ValueError as e:
+                self._observe(started, 'invalid')
+                error = f"invalid JSON: {e}"
+                continue
+            self._observe(started, 'ok')
+            self.breaker.record_success()
+            return response.status_code, payload
+        self._fail(error)
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            connect, read = self.timeout
+            client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size)
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def aget_json(self, path, params=None):
+        """Non-blocking ``get_json``; uses httpx when installed, else the thread pool."""
+        if httpx is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(UPSTREAM_EXECUTOR, lambda: self.get_json(path, params))
+
+        trial = self._start()
+        try:
+            return await self._aget_json(path, params)
+        finally:
+            if trial:
+                self.breaker.end_trial()
+
+    async def _aget_json(self, path, params):
+        client = self._async_client()
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self._delay(attempt - 1))
+            wait = self._reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = await client.get(self._url(path), params=params)
+            except httpx.HTTPError as e:
+                self._observe(started, 'error')
+                error = str(e)
+                continue
+            if response.status_code in RETRYABLE_STATUS:
+                self._observe(started, 'retryable_status')
+                error = f"HTTP {response.status_code}"
+                continue
+            try:
+                payload = response.json()
+            except ValueError as e:
+                self._observe(started, 'invalid')
+                error = f"invalid JSON: {e}"
+                continue
+            self._observe(started, 'ok')
+            self.breaker.record_success()
+            return response.status_code, payload
+        self._fail(error)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_upstream(name):
+    """Return the process-wide client for ``'osrm'`` or ``'nominatim'``."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                base_urls = {
+                    'osrm': settings.OSRM_ENDPOINT,
+                    'nominatim': settings.NOMINATIM_ENDPOINT,
+                }
+                client = UpstreamClient(name, base_urls[name], **settings.UPSTREAMS.get(name, {}))
+                _clients[name] = client
+    return client
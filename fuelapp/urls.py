@@ -3,14 +3,30 @@ from django.conf.urls.static import static
 from django.conf import settings
 from .views import (
     RoutePlannerView,
+    BatchRoutePlannerView,
     RoutePlannerTemplateView,
+    route_planner_async,
     fuel_stations,
-    calculate_station_route
+    fuel_station_clusters,
+    nearest_fuel_stations,
+    place_suggestions,
+    station_price_history,
+    state_price_history,
+    calculate_station_route,
+    metrics
 )
 
 urlpatterns = [
     path('', RoutePlannerTemplateView.as_view(), name='route_planner'),
     path('api/route/', RoutePlannerView.as_view(), name='route_api'),
+    path('api/route/async/', route_planner_async, name='route_async_api'),
+    path('api/route/batch/', BatchRoutePlannerView.as_view(), name='route_batch_api'),
     path('api/fuel-stations/', fuel_stations, name='fuel_stations_api'),
+    path('api/fuel-stations/clusters/', fuel_station_clusters, name='fuel_station_clusters_api'),
+    path('api/fuel-stations/nearest/', nearest_fuel_stations, name='nearest_fuel_stations_api'),
+    path('api/fuel-stations/<int:station_id>/prices/', station_price_history, name='station_price_history_api'),
+    path('api/fuel-prices/states/<str:state>/', state_price_history, name='state_price_history_api'),
+    path('api/places/autocomplete/', place_suggestions, name='place_suggestions_api'),
     path('api/station-route/', calculate_station_route, name='station-route'),
+    path('api/metrics/', metrics, name='metrics'),
 ]+ static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
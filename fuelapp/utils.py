@@ -0,0 +1,116 @@
+import os
+import re
+import time
+
+from django.conf import settings
+
+
+def _station_version_path():
+    return os.path.join(settings.STATION_DATA_DIR, 'station_data.version')
+
+
+def get_station_data_version():
+    """Return the token identifying the current contents of the station table.
+
+    The token lives in a small stamp file so that every worker process sees a
+    bump made by ``import_fuel_prices`` without querying the database.
+    """
+    try:
+        with open(_station_version_path()) as f:
+            return f.read().strip() or '0'
+    except FileNotFoundError:
+        return '0'
+
+
+def new_station_data_version():
+    return f"{time.time_ns():x}"
+
+
+def bump_station_data_version(version=None):
+    """Publish ``version`` (or a fresh token) as the current station data version."""
+    os.makedirs(settings.STATION_DATA_DIR, exist_ok=True)
+    version = version or new_station_data_version()
+    tmp_path = f"{_station_version_path()}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, _station_version_path())
+    return version
+
+
+US_STATES = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA',
+    'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE', 'district of columbia': 'DC',
+    'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID', 'illinois': 'IL',
+    'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS', 'kentucky': 'KY', 'louisiana': 'LA',
+    'maine': 'ME', 'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN',
+    'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV',
+    'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY',
+    'north carolina': 'NC', 'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR',
+    'pennsylvania': 'PA', 'rhode island': 'RI', 'south carolina': 'SC', 'south dakota': 'SD',
+    'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT', 'vermont': 'VT', 'virginia': 'VA',
+    'washington': 'WA', 'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY',
+}
+STATE_CODES = {code.lower() for code in US_STATES.values()}
+COUNTRY_SUFFIXES = ('united states of america', 'united states', 'usa', 'us')
+
+
+# Longest names first, so "west virginia" wins over "virginia"
+STATE_NAME_SIZES = sorted({len(name.split()) for name in US_STATES}, reverse=True)
+
+
+def _state_code(text):
+    if text in STATE_CODES:
+        return text
+    code = US_STATES.get(text)
+    return code.lower() if code else None
+
+
+def _split_state(text):
+    """``(place, state code)`` for text ending in a state, longest state name first, or ``None``."""
+    words = text.split()
+    for size in STATE_NAME_SIZES:
+        if len(words) > size:
+            code = _state_code(" ".join(words[-size:]))
+            if code:
+                return " ".join(words[:-size]), code
+    return None
+
+
+def normalize_location(location):
+    """Canonical form of a free-text US place name used for lookup keys.
+
+    Case, punctuation and whitespace are folded, a trailing country is
+    dropped and the state is reduced to its postal code, so "Tulsa, Oklahoma",
+    "tulsa ok" and "Tulsa, OK, USA" all map to "tulsa, ok".
+    """
+    text = re.sub(r"[^\w\s,]", " ", location.lower())
+    parts = [" ".join(part.split()) for part in text.split(",")]
+    parts = [part for part in parts if part]
+
+    for suffix in COUNTRY_SUFFIXES:
+        if len(parts) > 1 and parts[-1] == suffix:
+            parts.pop()
+            break
+        if parts and parts[-1].endswith(f" {suffix}") and len(parts[-1]) > len(suffix) + 3:
+            parts[-1] = parts[-1][:-len(suffix) - 1]
+            break
+
+    if len(parts) > 1 and _state_code(parts[-1]):
+        parts[-1] = _state_code(parts[-1])
+    elif parts:
+        # "City ST" / "City State" without a comma before the state
+        split = _split_state(parts[-1])
+        if split:
+            parts[-1:] = split
+
+    return ", ".join(parts)
+
+
+def _endpoint_key(location, coords=None):
+    key = normalize_location(location)
+    return f"{key}@{coords[0]:.5f},{coords[1]:.5f}" if coords else key
+
+
+def route_lookup_key(start, end, start_coords=None, end_coords=None):
+    """Key for stored routes; endpoints given as coordinates are keyed by them too."""
+    return f"{_endpoint_key(start, start_coords)}|{_endpoint_key(end, end_coords)}"
@@ -5,23 +5,53 @@ from rest_framework.decorators import api_view
 from rest_framework import status
 from django.views.generic import TemplateView
 from django.core.cache import cache
-from rest_framework.pagination import PageNumberPagination
-import requests
-from .models import FuelStation
-from .serializers import  RouteRequestSerializer
+from rest_framework.pagination import CursorPagination
+from .models import FuelStation, Route, FuelStop
+from .serializers import  (
+    RouteRequestSerializer, BatchRouteRequestSerializer, FuelStopSerializer, FuelStationQuerySerializer,
+    StationClusterQuerySerializer, NearestStationQuerySerializer, StationPriceQuerySerializer,
+    StatePriceQuerySerializer, PlaceSuggestionQuerySerializer
+)
+from .station_index import STATION_FIELDS, get_station_index
+from .clustering import get_station_clusters
+from .snapshots import get_station_snapshot
+from .nearest import get_nearest_index
+from .planner import plan_fuel_stops
+from .price_history import state_price_summary, station_price_on, station_price_series
+from .geocoding import ageocode, geocode, known_location, provided_location
+from .autocomplete import get_place_index
+from .upstream import UPSTREAM_EXECUTOR, UpstreamError
+from .routing import aroute_between, route_between
+from .detours import rank_by_detour
+from .route_cache import get_cached_route, get_stale_route, route_cache_key, store_route
+from .singleflight import acoalesce, coalesce, route_flights
+from .metrics import cache_result, render_prometheus, stage
+from .renderers import CompactRouteRenderer, TimedJSONRenderer, route_json_response
+from .utils import get_station_data_version, normalize_location, route_lookup_key
+from .geometry import cumulative_miles, simplify_polyline
 from django.conf import settings
-from geopy.geocoders import Nominatim
 import logging
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.decorators import method_decorator
+from django.utils.cache import patch_vary_headers
 from django.core.cache import cache
 from django.contrib.sessions.backends.base import UpdateError
-from shapely.geometry import LineString, Point
-from django.http import JsonResponse
+import numpy as np
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+import hmac
 import json
+import time
+from math import cos, radians
+import asyncio
+from asgiref.sync import sync_to_async
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
 
 CACHE_TIMEOUT = 300  # 5 minutes cache timeout, adjust as needed
+ROUTE_BUFFER_MILES = 10  # stations this close to the route are considered
 
 logger = logging.getLogger(__name__)
 class RoutePlannerTemplateView(TemplateView):
@@ -30,98 +60,301 @@ class RoutePlannerTemplateView(TemplateView):
     def get_context_data(self, **kwargs):
         return super().get_context_data(**kwargs)
 
-class FuelStationPagination(PageNumberPagination):
+class FuelStationPagination(CursorPagination):
     page_size = 100
     page_size_query_param = 'page_size'
-    max_page_size = 8000
+    max_page_size = 1000
+    ordering = ('retail_price', 'id')
+
+STATION_QUERY_PARAMS = ('bounds', 'price_min', 'price_max', 'state', 'fields', 'cursor', 'page_size')
 
 class RoutePlannerView(APIView):
+    # GeoJSON by default; ?format=compact or the compact media type for the encoded form
+    renderer_classes = [TimedJSONRenderer, CompactRouteRenderer]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
     def cached_geocode(self, location):
-        cache_key = f"geocode_{location.lower().replace(' ', '_')}"
-        cached_result = cache.get(cache_key)
-        
-        if cached_result:
-            return cached_result
-        
-        geolocator = Nominatim(user_agent="fuel_planner")
-        result = geolocator.geocode(location)
-        
-        if result:
-            cache.set(cache_key, result, CACHE_TIMEOUT)
-        
-        return result
+        return geocode(location)
+
+    def store_osrm_route(self, coords, route_data):
+        if route_data:
+            store_route(*coords, route_data, CACHE_TIMEOUT)
+        return route_data
+
+    def fetch_osrm_route(self, start_lon, start_lat, end_lon, end_lat):
+        route_data = route_between(start_lon, start_lat, end_lon, end_lat)
+        return self.store_osrm_route((start_lon, start_lat, end_lon, end_lat), route_data)
+
+    async def afetch_osrm_route(self, start_lon, start_lat, end_lon, end_lat):
+        route_data = await aroute_between(start_lon, start_lat, end_lon, end_lat)
+        return self.store_osrm_route((start_lon, start_lat, end_lon, end_lat), route_data)
+
+    def revalidate_osrm_route(self, *coords):
+        """Serve-stale helper: refresh an expired route once, in the background."""
+        route_flights.start(f"osrm:{route_cache_key(*coords)}", UPSTREAM_EXECUTOR,
+                            lambda: self.fetch_osrm_route(*coords))
+
+    def cached_osrm_route(self, coords):
+        """A cached (or, when expired, stale) route for ``coords``, recording the lookup outcome."""
+        cached_route, outcome = get_cached_route(*coords)
+        if cached_route:
+            cache_result('osrm_route', outcome)
+            return cached_route
+
+        # Expired: answer with the last good route while one refresh runs
+        stale_route = get_stale_route(*coords)
+        if stale_route:
+            cache_result('osrm_route', 'stale')
+            self.revalidate_osrm_route(*coords)
+            return stale_route
+
+        cache_result('osrm_route', outcome)
+        return None
 
     def get_osrm_route(self, start_lon, start_lat, end_lon, end_lat):
-        cache_key = f"route_{start_lon}_{start_lat}_{end_lon}_{end_lat}"
-        cached_route = cache.get(cache_key)
-        
+        coords = (start_lon, start_lat, end_lon, end_lat)
+        cached_route = self.cached_osrm_route(coords)
         if cached_route:
             return cached_route
-        
+
         try:
-            osrm_url = f"{settings.OSRM_ENDPOINT}/route/v1/driving/{start_lon},{start_lat};{end_lon},{end_lat}?overview=full&geometries=geojson"
-            response = requests.get(osrm_url, timeout=10)
-            route_data = response.json()
-            
-            if response.status_code != 200:
-                logger.error(f"OSRM API error: Status {response.status_code}")
-                return None
-                
-            if route_data.get('code') != 'Ok':
-                logger.error(f"OSRM route error: {route_data.get('message', 'Unknown error')}")
-                return None
-            
-            if not route_data.get('routes') or not route_data['routes'][0].get('geometry'):
-                logger.error("OSRM response missing route geometry")
-                return None
-                
-            cache.set(cache_key, route_data, CACHE_TIMEOUT)
-            return route_data
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"OSRM request failed: {str(e)}")
+            return route_flights.do(f"osrm:{route_cache_key(*coords)}", lambda: self.fetch_osrm_route(*coords))
+        except UpstreamError as e:
+            logger.error(f"Routing failed: {str(e)}")
             return None
-        except ValueError as e:
-            logger.error(f"Invalid OSRM response: {str(e)}")
+
+    async def aget_osrm_route(self, start_lon, start_lat, end_lon, end_lat):
+        coords = (start_lon, start_lat, end_lon, end_lat)
+        cached_route = self.cached_osrm_route(coords)
+        if cached_route:
+            return cached_route
+
+        try:
+            return await route_flights.ado(
+                f"osrm:{route_cache_key(*coords)}", lambda: self.afetch_osrm_route(*coords)
+            )
+        except UpstreamError as e:
+            logger.error(f"Routing failed: {str(e)}")
             return None
 
+    def locate_endpoint(self, location, coords=None):
+        return provided_location(location, coords) if coords else self.cached_geocode(location)
+
+    def geocode_endpoints(self, start, end, start_coords=None, end_coords=None):
+        """Geocode both endpoints concurrently on the shared thread pool.
+
+        Endpoints given as coordinates (picked place suggestions) are not geocoded.
+        """
+        if start_coords and end_coords:
+            return provided_location(start, start_coords), provided_location(end, end_coords)
+        start_future = UPSTREAM_EXECUTOR.submit(self.locate_endpoint, start, start_coords)
+        end_future = UPSTREAM_EXECUTOR.submit(self.locate_endpoint, end, end_coords)
+        return start_future.result(), end_future.result()
+
     def find_nearest_stations(self, lat, lon, radius=100, limit=10):  # Increased radius and limit
         try:
-            stations = FuelStation.objects.raw('''
-                SELECT *, 
-                       (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * 
-                        cos(radians(longitude) - radians(%s)) + sin(radians(%s)) * 
-                        sin(radians(latitude)))) * 0.621371 AS distance
-                FROM fuelapp_fuelstation
-                WHERE retail_price IS NOT NULL
-                  AND latitude BETWEEN %s - %s AND %s + %s
-                  AND longitude BETWEEN %s - %s AND %s + %s
-                ORDER BY retail_price ASC, distance ASC
-                LIMIT %s
-            ''', [
-                lat, lon, lat,
-                lat, radius/69, lat, radius/69,  # Convert radius to degrees
-                lon, radius/69, lon, radius/69,
-                limit
-            ])
-
-            return [{
-                'id': station.id,
-                'truck_stop': station.truck_stop,
-                'address': station.address,
-                'city': station.city,
-                'state': station.state,
-                'retail_price': float(station.retail_price),
-                'latitude': float(station.latitude),
-                'longitude': float(station.longitude),
-                'route_distance': round(float(station.distance), 1) if hasattr(station, 'distance') else None
-            } for station in stations]
+            stations = get_nearest_index().nearest(lat, lon, k=limit, radius_miles=radius, order='price')
+            for station in stations:
+                station['route_distance'] = station.pop('distance')
+            return stations
 
         except Exception as e:
             logger.error(f"Error finding stations: {str(e)}")
             return []
 
+    def get_stored_route(self, lookup_key, station_version):
+        with stage('stored_lookup'):
+            stored = Route.objects.filter(
+                lookup_key=lookup_key,
+                station_version=station_version,
+                response__isnull=False
+            ).order_by('-created_at').values_list('response', flat=True).first()
+        cache_result('route_result', 'hit' if stored else 'miss')
+        return stored
+
+    def stored_result(self, lookup_key, station_version):
+        stored = self.get_stored_route(lookup_key, station_version)
+        return (stored, 200) if stored else None
+
+    def plan_route(self, start, end, stations, total_distance, lookup_key='', station_version=''):
+        """Plan the cheapest refuelling schedule and persist it as Route/FuelStop rows.
+
+        When no schedule fits the tank range the route is stored without stops
+        and priced at the cheapest corridor price.
+        """
+        with stage('plan'):
+            plan = plan_fuel_stops(
+                [s['mile_marker'] for s in stations],
+                [s['retail_price'] for s in stations],
+                total_distance,
+                settings.MAX_FUEL_RANGE,
+                settings.FUEL_ECONOMY
+            ) or []
+
+        if plan:
+            total_cost = sum(cost for _, _, cost in plan)
+        else:
+            best_price = min((s['retail_price'] for s in stations), default=0)
+            total_cost = total_distance / settings.FUEL_ECONOMY * best_price
+
+        fields = {
+            'start_location': start,
+            'end_location': end,
+            'total_distance': round(total_distance, 1),
+            'total_cost': Decimal(f"{total_cost:.2f}"),
+        }
+        with stage('persist'), transaction.atomic():
+            if lookup_key:
+                # Recomputing a stored request replaces its row instead of adding another
+                route, created = Route.objects.update_or_create(
+                    lookup_key=lookup_key, station_version=station_version,
+                    defaults={**fields, 'response': None}
+                )
+                if not created:
+                    route.fuel_stops.all().delete()
+            else:
+                route = Route.objects.create(**fields)
+            fuel_stops = []
+            for stop_number, (idx, gallons, cost) in enumerate(plan, start=1):
+                station = stations[idx]
+                fuel_stops.append(FuelStop(
+                    route=route,
+                    fuel_station_id=station['id'],
+                    distance_from_start=station['mile_marker'],
+                    fuel_amount=round(gallons, 2),
+                    cost=Decimal(f"{cost:.2f}"),
+                    stop_number=stop_number
+                ))
+            FuelStop.objects.bulk_create(fuel_stops)
+
+            # One query for the stations the stop serializer nests
+            fuel_stations = FuelStation.objects.in_bulk([stop.fuel_station_id for stop in fuel_stops])
+            for stop in fuel_stops:
+                stop.fuel_station = fuel_stations[stop.fuel_station_id]
+
+        return route, fuel_stops
+
+    def corridor_line(self, route_data):
+        """Simplified (lons, lats, marks) of the OSRM geometry plus the road distance in miles."""
+        # Route coordinates are (lon, lat) pairs
+        coordinates = route_data['routes'][0]['geometry']['coordinates']
+
+        # Corridor math runs on a simplified line; mile markers still refer to the full geometry
+        route_lons, route_lats = np.asarray(coordinates, dtype=np.float64).T[:2]
+        keep = simplify_polyline(route_lats, route_lons, settings.ROUTE_SIMPLIFY_TOLERANCE_MILES)
+        total_distance = route_data['routes'][0]['distance'] / 1609.34  # meters to miles
+        marks = cumulative_miles(route_lats, route_lons)
+        if marks[-1] > 0:
+            marks *= total_distance / marks[-1]  # align mile markers with the road distance
+        logger.debug(f"Simplified route from {len(route_lats)} to {len(keep)} vertices")
+
+        return (route_lons[keep], route_lats[keep], marks[keep]), total_distance
+
+    def corridor_stations(self, station_index, indices, distances, mile_markers):
+        return [{
+            **station_index.rows[idx],
+            'route_distance': round(float(distance), 1),
+            'mile_marker': round(float(mile_marker), 1)
+        } for idx, distance, mile_marker in zip(indices, distances, mile_markers)]
+
+    def build_route_response(self, start, end, start_location, end_location, route_data,
+                             lookup_key='', station_version=''):
+        """Run the corridor search and fuel plan for a routed trip and return the API payload."""
+        with stage('simplify'):
+            line, total_distance = self.corridor_line(route_data)
+
+        # Only stations whose segment boxes touch the route are measured
+        with stage('corridor'):
+            station_index = get_station_index()
+            indices, distances, mile_markers = station_index.corridor(*line[:2], ROUTE_BUFFER_MILES, line[2])
+            valid_stations = self.corridor_stations(station_index, indices, distances, mile_markers)
+
+        valid_stations = self.rank_stations(start_location, end_location, line, valid_stations, station_version)
+
+        return self.route_payload(
+            start, end, start_location, end_location, route_data, total_distance,
+            valid_stations, lookup_key, station_version
+        )
+
+    def rank_stations(self, start_location, end_location, line, stations, station_version=''):
+        """Add the true detour and effective price of the cheapest stations (one routing table call)."""
+        coords = (start_location.longitude, start_location.latitude,
+                  end_location.longitude, end_location.latitude)
+        try:
+            with stage('detours'):
+                return rank_by_detour(coords, line, stations, station_version)
+        except Exception as e:
+            logger.error(f"Detour ranking failed: {str(e)}")
+            return stations
+
+    def route_payload(self, start, end, start_location, end_location, route_data, total_distance,
+                      valid_stations, lookup_key='', station_version=''):
+        # Remove duplicates and sort
+        unique_stations = {s['id']: s for s in valid_stations}.values()
+        # Measured stations by price plus detour cost, then the rest by pump price
+        sorted_stations = sorted(unique_stations, key=lambda x: (
+            'effective_price' not in x, x.get('effective_price', x['retail_price']), x['route_distance']
+        ))
+
+        # Prepare response data
+        total_fuel = total_distance / settings.FUEL_ECONOMY
+        best_price = min(s['retail_price'] for s in sorted_stations) if sorted_stations else 0
+
+        route, fuel_stops = self.plan_route(
+            start, end, valid_stations, total_distance, lookup_key, station_version
+        )
+
+        response_data = {
+            'start_location': start,
+            'end_location': end,
+            'start_coords': [start_location.latitude, start_location.longitude],
+            'end_coords': [end_location.latitude, end_location.longitude],
+            'total_distance': round(total_distance, 1),
+            'total_fuel_needed': round(total_fuel, 2),
+            'total_cost': float(route.total_cost),
+            'duration': route_data['routes'][0]['duration'] / 60,  # seconds to minutes
+            'route_geometry': route_data['routes'][0]['geometry'],
+            'stations': sorted_stations[:50],  # Top 50 by price/distance
+            'best_price': best_price,
+            'route_id': route.id,
+            'fuel_stops': FuelStopSerializer(fuel_stops, many=True).data,
+            'fuel_plan_feasible': bool(fuel_stops)
+        }
+        with stage('persist'):
+            Route.objects.filter(pk=route.pk).update(response=response_data)
+
+        return response_data
 
+    def compute_route(self, start, end, lookup_key='', station_version='', start_coords=None, end_coords=None):
+        """Geocode, route and plan one trip; returns ``(payload, status_code)``."""
+        with stage('geocode'):
+            start_location, end_location = self.geocode_endpoints(start, end, start_coords, end_coords)
+
+        if not start_location:
+            return {"error": f"Could not find location: {start}"}, 400
+        if not end_location:
+            return {"error": f"Could not find location: {end}"}, 400
+
+        with stage('route'):
+            route_data = self.get_osrm_route(
+                start_location.longitude, start_location.latitude,
+                end_location.longitude, end_location.latitude
+            )
+
+        if not route_data:
+            return {
+                "error": "Route calculation failed",
+                "details": "Could not calculate route between the specified locations"
+            }, 400
+
+        response_data = self.build_route_response(
+            start, end, start_location, end_location, route_data, lookup_key, station_version
+        )
+        return response_data, 200
 
     def post(self, request):
         try:
@@ -131,164 +364,325 @@ class RoutePlannerView(APIView):
 
             start = serializer.validated_data['start_location']
             end = serializer.validated_data['end_location']
+            start_coords = serializer.validated_data.get('start_coords')
+            end_coords = serializer.validated_data.get('end_coords')
+
+            # Finished results are shared by every worker through the Route table
+            lookup_key = route_lookup_key(start, end, start_coords, end_coords)
+            station_version = get_station_data_version()
+            stored = self.get_stored_route(lookup_key, station_version)
+            if stored:
+                return Response(stored)
+
+            # Identical requests in this process, and in other workers, wait for one computation
+            response_data, status_code = coalesce(
+                f"route:{lookup_key}:{station_version}",
+                lambda: self.compute_route(start, end, lookup_key, station_version, start_coords, end_coords),
+                lambda: self.stored_result(lookup_key, station_version)
+            )
+            return Response(response_data, status=status_code)
 
-            # Geocode locations
-            start_location = self.cached_geocode(start)
-            end_location = self.cached_geocode(end)
-            
-            if not start_location:
-                return Response({"error": f"Could not find location: {start}"}, status=400)
-            if not end_location:
-                return Response({"error": f"Could not find location: {end}"}, status=400)
+        except Exception as e:
+            logger.error(f"Route calculation error: {str(e)}", exc_info=True)
+            return Response({
+                "error": "Internal server error",
+                "details": str(e) if settings.DEBUG else None
+            }, status=500)
 
-            # Get route
-            route_data = self.get_osrm_route(
-                start_location.longitude, start_location.latitude,
-                end_location.longitude, end_location.latitude
-            )
-            
-            if not route_data:
-                return Response({
-                    "error": "Route calculation failed",
-                    "details": "Could not calculate route between the specified locations"
-                }, status=400)
-
-            # Extract route coordinates and create LineString
-            coordinates = route_data['routes'][0]['geometry']['coordinates']
-            route_line = LineString([(coord[0], coord[1]) for coord in coordinates])  # (lon, lat)
-
-            # Define search buffer (10 miles)
-            buffer_miles = 10
-            buffer_deg = buffer_miles / 69  # Approximate degrees
-
-            # Calculate expanded bounds for station query
-            min_lon, min_lat, max_lon, max_lat = route_line.bounds
-            expanded_bounds = (
-                max(min_lat - buffer_deg, -90),
-                max(min_lon - buffer_deg, -180),
-                min(max_lat + buffer_deg, 90),
-                min(max_lon + buffer_deg, 180)
-            )
+class BatchRoutePlannerView(RoutePlannerView):
+    """Plan many lanes in one request.
 
-            # Query stations within expanded bounds
-            stations = FuelStation.objects.filter(
-                latitude__range=(expanded_bounds[0], expanded_bounds[2]),
-                longitude__range=(expanded_bounds[1], expanded_bounds[3]),
-                retail_price__isnull=False
-            ).values('id', 'truck_stop', 'address', 'city', 'state', 
-                    'retail_price', 'latitude', 'longitude')
+    Geocodes are deduplicated across the batch, stored and cached routes are
+    reused, and the corridor search for every lane runs as one pass over the
+    shared station index. Each lane gets its own result or error.
+    """
 
-            # Calculate exact distance from each station to the route
-            valid_stations = []
-            for station in stations:
-                station_point = Point(station['longitude'], station['latitude'])
-                closest_distance = route_line.distance(station_point) * 69  # Approx miles
-
-                if closest_distance <= buffer_miles:
-                    station_data = {
-                        **station,
-                        'route_distance': round(closest_distance, 1),
-                        'retail_price': float(station['retail_price'])
-                    }
-                    valid_stations.append(station_data)
-
-            # Remove duplicates and sort
-            unique_stations = {s['id']: s for s in valid_stations}.values()
-            sorted_stations = sorted(unique_stations, key=lambda x: (x['retail_price'], x['route_distance']))
-
-            # Prepare response data
-            total_distance = route_data['routes'][0]['distance'] / 1609.34  # meters to miles
-            total_fuel = total_distance / settings.FUEL_ECONOMY
-            best_price = min(s['retail_price'] for s in sorted_stations) if sorted_stations else 0
-            total_cost = total_fuel * best_price
-
-            response_data = {
-                'start_location': start,
-                'end_location': end,
-                'start_coords': [start_location.latitude, start_location.longitude],
-                'end_coords': [end_location.latitude, end_location.longitude],
-                'total_distance': round(total_distance, 1),
-                'total_fuel_needed': round(total_fuel, 2),
-                'total_cost': round(total_cost, 2),
-                'duration': route_data['routes'][0]['duration'] / 60,  # seconds to minutes
-                'route_geometry': route_data['routes'][0]['geometry'],
-                'stations': sorted_stations[:50],  # Top 50 by price/distance
-                'best_price': best_price
-            }
-
-            return Response(response_data)
+    def lane_error(self, index, lane, message):
+        return {'index': index, **lane, 'error': message}
 
+    def post(self, request):
+        try:
+            return self.plan_batch(request)
         except Exception as e:
-            logger.error(f"Route calculation error: {str(e)}", exc_info=True)
+            logger.error(f"Batch route calculation error: {str(e)}", exc_info=True)
             return Response({
                 "error": "Internal server error",
                 "details": str(e) if settings.DEBUG else None
             }, status=500)
 
-@api_view(['GET'])
-def fuel_stations(request):
-    try:
-        cache_key = 'all_fuel_stations'
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return Response(cached_data)
-
-        stations = FuelStation.objects.filter(
-            latitude__isnull=False,
-            longitude__isnull=False,
-            retail_price__isnull=False,
-            city__isnull=False,
-            state__isnull=False
-        ).values(
-            'id', 'truck_stop', 'address', 'city', 
-            'state', 'retail_price', 'latitude', 'longitude'
-        ).order_by('retail_price')
-
-        def get_location_coordinates(station):
-            cache_key = f"station_location_{station['city']}_{station['state']}"
-            cached_coords = cache.get(cache_key)
-            
-            if cached_coords:
-                return cached_coords
+    def plan_batch(self, request):
+        started = time.perf_counter()
+        serializer = BatchRouteRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        lanes = serializer.validated_data['lanes']
+        include_geometry = serializer.validated_data['include_geometry']
+        station_version = get_station_data_version()
+        keys = [
+            route_lookup_key(lane['start_location'], lane['end_location'],
+                             lane.get('start_coords'), lane.get('end_coords'))
+            for lane in lanes
+        ]
+
+        payloads = dict(Route.objects.filter(
+            lookup_key__in=set(keys),
+            station_version=station_version,
+            response__isnull=False
+        ).order_by('created_at').values_list('lookup_key', 'response'))
+        errors = {}
+
+        # One representative lane per distinct lookup key still to compute
+        pending = {}
+        for i, key in enumerate(keys):
+            if key not in payloads:
+                pending.setdefault(key, i)
+
+        # Geocode each distinct place once; endpoints given as coordinates need none
+        places = {}
+        for i in pending.values():
+            for end in ('start', 'end'):
+                if not lanes[i].get(f'{end}_coords'):
+                    name = lanes[i][f'{end}_location']
+                    places.setdefault(normalize_location(name), name)
+        locations = {key: known_location(name) for key, name in places.items()}
+        new_places = [name for key, name in places.items() if not locations[key]]
+        if len(new_places) > settings.BATCH_MAX_NEW_PLACES:
+            return Response({
+                "error": f"At most {settings.BATCH_MAX_NEW_PLACES} places not geocoded before per batch",
+                "details": f"{len(new_places)} new places; send the rest in a later batch or as coordinates"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        # One at a time: misses go to Nominatim, which allows a single request per second
+        for key, name in places.items():
+            if not locations[key]:
+                locations[key] = self.cached_geocode(name)
+
+        def lane_location(lane, end):
+            if lane.get(f'{end}_coords'):
+                return provided_location(lane[f'{end}_location'], lane[f'{end}_coords'])
+            return locations[normalize_location(lane[f'{end}_location'])]
+
+        # Route each distinct coordinate pair once
+        by_coords = {}
+        for key, i in pending.items():
+            start_location = lane_location(lanes[i], 'start')
+            end_location = lane_location(lanes[i], 'end')
+            if not start_location or not end_location:
+                missing = lanes[i]['start_location'] if not start_location else lanes[i]['end_location']
+                errors[key] = f"Could not find location: {missing}"
+                continue
+            coords = (start_location.longitude, start_location.latitude,
+                      end_location.longitude, end_location.latitude)
+            by_coords.setdefault(coords, []).append((key, i, start_location, end_location))
+        route_results = UPSTREAM_EXECUTOR.map(lambda coords: self.get_osrm_route(*coords), by_coords)
+        routes = {coords: route for coords, route in zip(by_coords, route_results) if route}
+        for coords in by_coords.keys() - routes.keys():
+            for key, *_ in by_coords[coords]:
+                errors[key] = "Route calculation failed"
+
+        # From here on a lane that fails gets its own error, like an upstream failure
+        def lane_failed(coords, e):
+            logger.error(f"Batch lane {by_coords[coords][0][1]} failed: {str(e)}", exc_info=True)
+            routes.pop(coords, None)
+            for key, *_ in by_coords[coords]:
+                errors[key] = "Internal server error"
+
+        lines = {}
+        for coords, route_data in list(routes.items()):
+            try:
+                lines[coords] = self.corridor_line(route_data)
+            except Exception as e:
+                lane_failed(coords, e)
 
+        # Corridor search for every routed lane in a single pass
+        station_index = get_station_index()
+        try:
+            corridors = dict(zip(lines, station_index.corridor_batch(
+                [line for line, _ in lines.values()], ROUTE_BUFFER_MILES
+            )))
+        except Exception as e:
+            logger.warning(f"Batch corridor search failed, searching lanes one by one: {str(e)}")
+            corridors = {}
+            for coords, ((lons, lats, marks), _) in lines.items():
+                try:
+                    corridors[coords] = station_index.corridor(lons, lats, ROUTE_BUFFER_MILES, marks)
+                except Exception as e:
+                    lane_failed(coords, e)
+
+        # Detours of every routed lane, one table request each, concurrently
+        def lane_stations(coords):
+            _, _, start_location, end_location = by_coords[coords][0]
             try:
-                if station['latitude'] and station['longitude']:
-                    coords = {
-                        'latitude': float(station['latitude']),
-                        'longitude': float(station['longitude'])
-                    }
-                else:
-                    address = f"{station['address']}, {station['city']}, {station['state']}, USA"
-                    geolocator = Nominatim(user_agent="fuel_planner")
-                    location = geolocator.geocode(address)
-                    if location:
-                        coords = {
-                            'latitude': location.latitude,
-                            'longitude': location.longitude
-                        }
-                    else:
-                        return None
-                
-                cache.set(cache_key, coords, CACHE_TIMEOUT)
-                return coords
+                valid_stations = self.corridor_stations(station_index, *corridors[coords])
+                return self.rank_stations(start_location, end_location, lines[coords][0], valid_stations,
+                                          station_version)
             except Exception as e:
-                logger.error(f"Geocoding error for {station['city']}, {station['state']}: {str(e)}")
-                return None
-
-        data = []
-        for station in stations:
-            coords = get_location_coordinates(station)
-            if coords:
-                data.append({
-                    **station,
-                    'retail_price': float(station['retail_price']),
-                    'latitude': coords['latitude'],
-                    'longitude': coords['longitude']
-                })
-
-        cache.set(cache_key, data, CACHE_TIMEOUT)
-        return Response(data)
+                return e
+        stations = {}
+        for coords, result in zip(list(routes), UPSTREAM_EXECUTOR.map(lane_stations, list(routes))):
+            if isinstance(result, Exception):
+                lane_failed(coords, result)
+            else:
+                stations[coords] = result
+
+        for coords, route_data in routes.items():
+            total_distance = lines[coords][1]
+            valid_stations = stations[coords]
+            for key, i, start_location, end_location in by_coords[coords]:
+                try:
+                    payloads[key] = self.route_payload(
+                        lanes[i]['start_location'], lanes[i]['end_location'], start_location,
+                        end_location, route_data, total_distance, valid_stations, key, station_version
+                    )
+                except Exception as e:
+                    logger.error(f"Batch lane {i} failed: {str(e)}", exc_info=True)
+                    errors[key] = "Internal server error"
+
+        results = []
+        for i, (lane, key) in enumerate(zip(lanes, keys)):
+            if key in payloads:
+                payload = payloads[key]
+                if not include_geometry:
+                    payload = {k: v for k, v in payload.items() if k != 'route_geometry'}
+                results.append({'index': i, **payload})
+            else:
+                results.append(self.lane_error(i, lane, errors.get(key, "Route calculation failed")))
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Planned {len(lanes)} lanes in {elapsed:.2f}s")
+        return Response({
+            'lanes': len(lanes),
+            'elapsed_seconds': round(elapsed, 3),
+            'lanes_per_second': round(len(lanes) / elapsed, 1) if elapsed else None,
+            'results': results
+        })
+
+async def route_planner_async(request):
+    """Async variant of ``RoutePlannerView.post`` for ASGI deployments.
+
+    Both endpoints are geocoded concurrently and OSRM is called without
+    blocking the event loop; ORM work runs through ``sync_to_async``.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
+
+    try:
+        serializer = RouteRequestSerializer(data=json.loads(request.body))
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+
+        start = serializer.validated_data['start_location']
+        end = serializer.validated_data['end_location']
+        start_coords = serializer.validated_data.get('start_coords')
+        end_coords = serializer.validated_data.get('end_coords')
+        planner = RoutePlannerView()
+
+        lookup_key = route_lookup_key(start, end, start_coords, end_coords)
+        station_version = get_station_data_version()
+        stored = await sync_to_async(planner.get_stored_route)(lookup_key, station_version)
+        if stored:
+            return route_json_response(request, stored)
+
+        async def locate(location, coords):
+            return provided_location(location, coords) if coords else await ageocode(location)
+
+        async def compute():
+            with stage('geocode'):
+                start_location, end_location = await asyncio.gather(
+                    locate(start, start_coords), locate(end, end_coords)
+                )
+            if not start_location:
+                return {"error": f"Could not find location: {start}"}, 400
+            if not end_location:
+                return {"error": f"Could not find location: {end}"}, 400
+
+            with stage('route'):
+                route_data = await planner.aget_osrm_route(
+                    start_location.longitude, start_location.latitude,
+                    end_location.longitude, end_location.latitude
+                )
+            if not route_data:
+                return {
+                    "error": "Route calculation failed",
+                    "details": "Could not calculate route between the specified locations"
+                }, 400
+
+            response_data = await sync_to_async(planner.build_route_response)(
+                start, end, start_location, end_location, route_data, lookup_key, station_version
+            )
+            return response_data, 200
+
+        response_data, status_code = await acoalesce(
+            f"route:{lookup_key}:{station_version}",
+            compute,
+            sync_to_async(lambda: planner.stored_result(lookup_key, station_version))
+        )
+        return route_json_response(request, response_data, status_code)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+    except Exception as e:
+        logger.error(f"Route calculation error: {str(e)}", exc_info=True)
+        return JsonResponse({
+            "error": "Internal server error",
+            "details": str(e) if settings.DEBUG else None
+        }, status=500)
+
+# csrf_exempt is not coroutine-aware in Django 3.2, so set its marker directly
+route_planner_async.csrf_exempt = True
+
+def filtered_fuel_stations(request):
+    """Filtered, cursor-paginated station listing.
+
+    Bounding-box, price and state filters run in the database against the
+    FuelStation indexes, so a map pan only transfers the stations in view.
+    """
+    params = FuelStationQuerySerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    query = params.validated_data
+
+    stations = FuelStation.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False,
+        retail_price__isnull=False
+    )
+    bounds = query.get('bounds')
+    if bounds:
+        lat_pad = bounds['buffer'] / 69
+        lon_pad = lat_pad / max(cos(radians(max(abs(bounds['south']), abs(bounds['north'])))), 0.01)
+        stations = stations.filter(
+            latitude__range=(bounds['south'] - lat_pad, bounds['north'] + lat_pad),
+            longitude__range=(bounds['west'] - lon_pad, bounds['east'] + lon_pad)
+        )
+    if 'price_min' in query:
+        stations = stations.filter(retail_price__gte=query['price_min'])
+    if 'price_max' in query:
+        stations = stations.filter(retail_price__lte=query['price_max'])
+    if query.get('state'):
+        stations = stations.filter(state__in=query['state'])
+
+    with stage('station_query'):
+        paginator = FuelStationPagination()
+        page = paginator.paginate_queryset(stations.values(*STATION_FIELDS), request)
+        fields = query.get('fields') or STATION_FIELDS
+        data = [{
+            field: float(station[field]) if field == 'retail_price' else station[field]
+            for field in fields
+        } for station in page]
+    return paginator.get_paginated_response(data)
+
+@api_view(['GET'])
+def fuel_stations(request):
+    try:
+        if any(param in request.query_params for param in STATION_QUERY_PARAMS):
+            return filtered_fuel_stations(request)
+
+        # The full list is served from precompressed bytes with ETag revalidation
+        with stage('snapshot'):
+            response = get_station_snapshot().response(request)
+        cache_result('station_snapshot', 'not_modified' if response.status_code == 304 else 'sent')
+        return response
         
     except Exception as e:
         logger.error(f"Error fetching fuel stations: {str(e)}")
@@ -297,6 +691,122 @@ def fuel_stations(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['GET'])
+def nearest_fuel_stations(request):
+    """The k closest or k cheapest stations within a radius of a point."""
+    params = NearestStationQuerySerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    query = params.validated_data
+
+    try:
+        stations = get_nearest_index().nearest(
+            query['lat'], query['lon'],
+            k=query['k'],
+            radius_miles=query['radius'],
+            order=query['order'],
+            max_price=query.get('max_price'),
+            states=query.get('state')
+        )
+        return Response(stations)
+    except Exception as e:
+        logger.error(f"Error finding nearest stations: {str(e)}")
+        return Response(
+            {"error": "Could not find nearest stations"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+def place_suggestions(request):
+    """Typeahead for the start/end inputs: places starting with ``?q=``, most stations first.
+
+    Suggestions with coordinates can be sent back as ``start_coords`` /
+    ``end_coords`` so the route request skips geocoding.
+    """
+    params = PlaceSuggestionQuerySerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        return Response(get_place_index().suggest(params.validated_data['q'], params.validated_data['limit']))
+    except Exception as e:
+        logger.error(f"Error suggesting places: {str(e)}")
+        return Response(
+            {"error": "Could not suggest places"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+def station_price_history(request, station_id):
+    """A station's price on ``?date=`` or its price changes between ``?start=`` and ``?end=``."""
+    params = StationPriceQuerySerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    query = params.validated_data
+
+    try:
+        if not FuelStation.objects.filter(id=station_id).exists():
+            return Response({"error": "Station not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if 'date' in query:
+            return Response({
+                'station': station_id,
+                'date': query['date'],
+                'price': station_price_on(station_id, query['date'])
+            })
+
+        end = query.get('end') or timezone.localdate()
+        start = query.get('start') or end - timedelta(days=29)
+        return Response({
+            'station': station_id,
+            'start': start,
+            'end': end,
+            'prices': station_price_series(station_id, start, end)
+        })
+    except Exception as e:
+        logger.error(f"Error reading price history: {str(e)}")
+        return Response(
+            {"error": "Could not read price history"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+def state_price_history(request, state):
+    """Average/min/max price in a state over the last ``?days=`` days."""
+    params = StatePriceQuerySerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+    query = params.validated_data
+
+    try:
+        summary = state_price_summary(state.upper(), days=query['days'], end=query.get('end'))
+        if summary is None:
+            return Response({"error": "No price history for this state"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(summary)
+    except Exception as e:
+        logger.error(f"Error summarising state prices: {str(e)}")
+        return Response(
+            {"error": "Could not summarise state prices"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+def fuel_station_clusters(request):
+    """Zoom-aware station clusters with count and min/avg price for the map."""
+    params = StationClusterQuerySerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        clusters = get_station_clusters().query(params.validated_data['zoom'], params.validated_data.get('bbox'))
+        return Response({'zoom': params.validated_data['zoom'], 'clusters': clusters})
+    except Exception as e:
+        logger.error(f"Error clustering fuel stations: {str(e)}")
+        return Response(
+            {"error": "Could not cluster fuel stations"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @csrf_exempt
 def calculate_station_route(request):
     if request.method != 'POST':
@@ -310,25 +820,25 @@ def calculate_station_route(request):
         if not start_coords or not station_coords:
             return JsonResponse({'error': 'Missing coordinates'}, status=400)
 
-        # Convert coordinates to string format required by OSRM
         start_str = f"{start_coords[1]},{start_coords[0]}"
         station_str = f"{station_coords[1]},{station_coords[0]}"
+        stale_key = f"stale_station_route_{start_str}_{station_str}"
 
-        # Call OSRM service for route
-        osrm_url = f"{settings.OSRM_SERVER}/route/v1/driving/{start_str};{station_str}"
-        params = {
-            'overview': 'full',
-            'geometries': 'geojson',
-            'steps': 'true'
-        }
-        
-        response = requests.get(osrm_url, params=params)
-        route_data = response.json()
+        try:
+            with stage('route'):
+                route_data = route_between(start_coords[1], start_coords[0], station_coords[1], station_coords[0])
+        except UpstreamError as e:
+            logger.error(f"Routing failed: {str(e)}")
+            route_data = cache.get(stale_key)
+            cache_result('station_route', 'stale' if route_data else 'unavailable')
+            if not route_data:
+                return JsonResponse({'error': 'Routing service unavailable'}, status=503)
 
-        if response.status_code != 200:
+        if not route_data:
             return JsonResponse({'error': 'Route calculation failed'}, status=500)
+        cache.set(stale_key, route_data, settings.UPSTREAM_STALE_TIMEOUT)
 
-        return JsonResponse({
+        return route_json_response(request, {
             'route_geometry': route_data['routes'][0]['geometry'],
             'distance': route_data['routes'][0]['distance'],
             'duration': route_data['routes'][0]['duration']
@@ -339,6 +849,21 @@ def calculate_station_route(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def metrics_allowed(request):
+    """Staff sessions, or a scraper sending ``Authorization: Bearer <METRICS_TOKEN>``."""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        token.strip().encode(), settings.METRICS_TOKEN.encode()
+    )
+
+def metrics(request):
+    """Prometheus text exposition of the metrics of every worker."""
+    if not metrics_allowed(request):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def your_view_function(request):  # replace with actual function name
     try:
         # your code here